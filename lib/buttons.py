@@ -0,0 +1,59 @@
+# SPDX-License-Identifier: MIT
+
+import keypad
+
+# A class for reading buttons without missing presses, or spending time on them in a loop.
+#
+# Reading a DigitalInOut's value only sees whether a button is down at that moment, so a
+# press that starts and ends between two reads is missed, and every read costs time in the
+# loop. Instead, this has keypad.Keys scan the buttons in the background, debounce them and
+# queue up each press and release as it happens. Checking them is then just emptying that
+# queue into a reused Event, which costs very little when nothing has happened.
+#
+# pressed() says whether a button has been pressed since it was last asked, even if it has
+# been let go since, and held() says whether it is down now. Buttons are numbered in the
+# order their pins were given.
+
+
+class Buttons:
+    def __init__(self, *pins, value_when_pressed=False, pull=True, interval=0.02):
+        self._keys = keypad.Keys(pins, value_when_pressed=value_when_pressed, pull=pull, interval=interval)
+        self._event = keypad.Event()
+        self._held = bytearray(len(pins))
+        self._presses = bytearray(len(pins))
+
+    # Take any presses and releases from the queue
+    def update(self):
+        events = self._keys.events
+        event = self._event
+        while events.get_into(event):
+            button = event.key_number
+            if event.pressed:
+                self._held[button] = 1
+                if self._presses[button] < 255:
+                    self._presses[button] += 1
+            else:
+                self._held[button] = 0
+
+        if events.overflowed:
+            # Some events were lost, so start again from what is down now, which the
+            # scanner will report as new presses
+            events.clear()
+            for i in range(len(self._held)):
+                self._held[i] = 0
+            self._keys.reset()
+
+    # Has the button been pressed since this was last called for it?
+    def pressed(self, button=0):
+        self.update()
+        presses = self._presses[button]
+        self._presses[button] = 0
+        return presses > 0
+
+    # Is the button down now?
+    def held(self, button=0):
+        self.update()
+        return self._held[button] == 1
+
+    def deinit(self):
+        self._keys.deinit()
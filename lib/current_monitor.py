@@ -0,0 +1,100 @@
+# SPDX-License-Identifier: MIT
+
+from array import array
+
+# A class for watching the current of each motor from inside a control loop, and limiting
+# the throttles of any that draw too much or have stalled.
+#
+# The Motor 2040 reads each motor's current through a shared ADC and an analog mux, so
+# reading all four on every update would cost four mux changes and ADC reads per update.
+# Instead, update() reads just one channel per call, round-robin, then selects the next
+# one straight away so the mux has the whole update period to settle before it is read.
+# Each channel is therefore read once every len(addresses) updates.
+#
+# What each channel may do is held in scales, from 0.0 to 1.0, which the control loop
+# should clamp that motor's throttle to:
+#
+#   Overcurrent   A reading above limit scales the channel down in proportion, so the
+#                 next reading should be back around limit
+#   Stall         A reading above stall_current while the motor is moving slower than
+#                 stall_speed, for stall_reads readings in a row, cuts the channel to 0.0
+#                 and holds it there for hold_reads readings
+#
+# Once a channel is back within its limits, its scale climbs back towards 1.0 by recover
+# per reading. A stall is caught within stall_reads * len(addresses) updates, and an
+# overcurrent within len(addresses).
+
+
+class CurrentMonitor:
+    __slots__ = ("addr_pins", "analog_in", "addresses", "limit", "stall_current", "stall_speed", "stall_reads",
+                 "hold_reads", "recover", "amps_per_raw", "amps_offset", "currents", "scales", "trips", "stalls",
+                 "_channel", "_stall_counts", "_holds")
+
+    def __init__(self, addr_pins, analog_in, addresses, amps_per_raw, amps_offset, limit, stall_current=None,
+                 stall_speed=0.1, stall_reads=5, hold_reads=100, recover=0.02):
+        self.addr_pins = addr_pins
+        self.analog_in = analog_in
+        self.addresses = tuple(addresses)
+        self.limit = limit
+        self.stall_current = stall_current
+        self.stall_speed = stall_speed
+        self.stall_reads = stall_reads
+        self.hold_reads = hold_reads
+        self.recover = recover
+        self.amps_per_raw = amps_per_raw        # From a raw ADC reading to amps, such as from a BoardProfile
+        self.amps_offset = amps_offset
+
+        channels = len(self.addresses)
+        self.currents = array("f", [0.0] * channels)   # The latest reading of each channel, in amps
+        self.scales = array("f", [1.0] * channels)     # What to clamp each channel's throttle to
+        self.trips = array("l", [0] * channels)        # How many times each channel has been over the limit
+        self.stalls = array("l", [0] * channels)       # How many times each channel has been cut for stalling
+        self._stall_counts = array("l", [0] * channels)
+        self._holds = array("l", [0] * channels)
+        self._channel = 0
+        self._select(self.addresses[0])
+
+    def _select(self, address):
+        self.addr_pins[0].value = address & 0b001
+        self.addr_pins[1].value = address & 0b010
+        self.addr_pins[2].value = address & 0b100
+
+    # Read the next channel, using speeds (such as the velocities of the motors, one per
+    # channel) to tell whether it has stalled. Returns the channel that was read
+    def update(self, speeds=None):
+        i = self._channel
+        current = (self.analog_in.value * self.amps_per_raw) + self.amps_offset
+        if current < 0.0:
+            current = -current
+        self.currents[i] = current
+
+        # Move the mux on now, so it has settled by the next update
+        next_channel = i + 1
+        if next_channel >= len(self.addresses):
+            next_channel = 0
+        self._channel = next_channel
+        self._select(self.addresses[next_channel])
+
+        scale = self.scales[i]
+        stalling = (self.stall_current is not None and speeds is not None
+                    and current > self.stall_current and abs(speeds[i]) < self.stall_speed)
+        if stalling:
+            self._stall_counts[i] += 1
+            if self._stall_counts[i] >= self.stall_reads:
+                self._stall_counts[i] = 0
+                self._holds[i] = self.hold_reads
+                self.stalls[i] += 1
+                scale = 0.0
+        else:
+            self._stall_counts[i] = 0
+
+        if current > self.limit:
+            self.trips[i] += 1
+            scale = scale * self.limit / current
+        elif self._holds[i] > 0:
+            self._holds[i] -= 1
+        elif scale < 1.0:
+            scale = min(scale + self.recover, 1.0)
+
+        self.scales[i] = scale
+        return i
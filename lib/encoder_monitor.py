@@ -0,0 +1,102 @@
+# SPDX-License-Identifier: MIT
+
+import time
+from array import array
+
+# A class for watching an encoder and reporting how it has moved at a steady rate.
+#
+# Printing every change of an encoder's count means a fast shaft sends more text than the
+# USB serial can take, so the program spends its time waiting on it and falls behind.
+# Instead, poll() is called at a fixed rate (such as from a LoopTimer), and the changes it
+# sees are gathered into batches, each covering 1 / output_rate seconds. A batch is only
+# made if the count changed during it, and records:
+#
+#   TIME   the time at the end of the batch, in milliseconds since the monitor was created,
+#          read from time.monotonic_ns() so it does not drift if a poll() runs late
+#   COUNT  the count at the end of the batch
+#   DELTA  how far the count moved since the end of the last batch
+#   MIN    the lowest count seen during the batch
+#   MAX    the highest count seen during the batch
+#
+# Batches wait in a ring buffer of a fixed size until taken with get_into(). If they are
+# not taken fast enough, the oldest are dropped and counted, rather than using more memory.
+
+TIME = 0
+COUNT = 1
+DELTA = 2
+MIN = 3
+MAX = 4
+FIELDS = 5
+
+
+class EncoderMonitor:
+    __slots__ = ("encoder", "dropped", "_ticks_per_batch", "_start_ns", "_batch_ticks", "_count", "_batch_start",
+                 "_min", "_max", "_changed", "_records", "_capacity", "_head", "_used")
+
+    def __init__(self, encoder, poll_rate, output_rate=10, capacity=16):
+        self.encoder = encoder
+        self.dropped = 0
+        self._ticks_per_batch = max(poll_rate // output_rate, 1)
+        self._start_ns = time.monotonic_ns()
+        self._batch_ticks = 0
+        self._count = encoder.position
+        self._batch_start = self._count
+        self._min = self._count
+        self._max = self._count
+        self._changed = False
+        self._records = array("l", [0] * (capacity * FIELDS))
+        self._capacity = capacity
+        self._head = 0          # Where the next batch will be written
+        self._used = 0          # How many batches are waiting
+
+    # Read the encoder, closing the batch if it is time to
+    def poll(self):
+        count = self.encoder.position
+        if count != self._count:
+            self._count = count
+            self._changed = True
+            if count < self._min:
+                self._min = count
+            elif count > self._max:
+                self._max = count
+
+        self._batch_ticks += 1
+        if self._batch_ticks >= self._ticks_per_batch:
+            self._batch_ticks = 0
+            if self._changed:
+                self._close()
+
+    def _close(self):
+        if self._used == self._capacity:
+            self.dropped += 1
+        else:
+            self._used += 1
+
+        records = self._records
+        offset = self._head * FIELDS
+        records[offset + TIME] = (time.monotonic_ns() - self._start_ns) // 1000000
+        records[offset + COUNT] = self._count
+        records[offset + DELTA] = self._count - self._batch_start
+        records[offset + MIN] = self._min
+        records[offset + MAX] = self._max
+        self._head = (self._head + 1) % self._capacity
+
+        self._batch_start = self._count
+        self._min = self._count
+        self._max = self._count
+        self._changed = False
+
+    # Copy the oldest waiting batch into record (which needs FIELDS entries), returning
+    # whether there was one
+    def get_into(self, record):
+        if self._used == 0:
+            return False
+        offset = ((self._head - self._used) % self._capacity) * FIELDS
+        records = self._records
+        for i in range(FIELDS):
+            record[i] = records[offset + i]
+        self._used -= 1
+        return True
+
+    def __len__(self):
+        return self._used
@@ -0,0 +1,69 @@
+# SPDX-License-Identifier: MIT
+
+import time
+from array import array
+
+# A class for reading several encoders at as close to the same moment as possible.
+#
+# Reading each encoder then converting it before reading the next spreads the readings
+# out in time, so motors that are moving together look like they are not, which upsets
+# anything comparing them such as velocity control or odometry. Instead, capture() reads
+# every encoder's count back-to-back into a preallocated array, with one timestamp for
+# them all, and any conversion is done afterwards in a single pass over that array.
+#
+# The counts of the capture before are kept too, so the velocities can be found from the
+# time that actually passed between the two.
+
+_NS_TO_S = 1 / 1000000000
+
+
+class EncoderSnapshot:
+    __slots__ = ("encoders", "counts", "last_counts", "timestamp_ns", "last_timestamp_ns")
+
+    def __init__(self, encoders):
+        self.encoders = tuple(encoders)
+        self.counts = array("l", [0] * len(self.encoders))
+        self.last_counts = array("l", [0] * len(self.encoders))
+        self.timestamp_ns = 0
+        self.last_timestamp_ns = 0
+        self.capture()
+        self.capture()
+
+    # Read every encoder's count, returning the array they were read into
+    def capture(self):
+        counts = self.counts
+        last_counts = self.last_counts
+        encoders = self.encoders
+        for i in range(len(counts)):
+            last_counts[i] = counts[i]
+
+        self.last_timestamp_ns = self.timestamp_ns
+        self.timestamp_ns = time.monotonic_ns()
+        for i in range(len(counts)):
+            counts[i] = encoders[i].position
+        return counts
+
+    # The seconds between the last two captures
+    @property
+    def dt(self):
+        return (self.timestamp_ns - self.last_timestamp_ns) * _NS_TO_S
+
+    # Write each count multiplied by scale into out, such as to turn them into degrees
+    def scale(self, scale, out):
+        counts = self.counts
+        for i in range(len(counts)):
+            out[i] = counts[i] * scale
+        return out
+
+    # Write the rate each count changed at between the last two captures, multiplied by
+    # scale, into out, such as to turn them into revolutions per second
+    def rates(self, scale, out):
+        counts = self.counts
+        last_counts = self.last_counts
+        dt = self.timestamp_ns - self.last_timestamp_ns
+        if dt <= 0:
+            return out
+        scale /= dt * _NS_TO_S
+        for i in range(len(counts)):
+            out[i] = (counts[i] - last_counts[i]) * scale
+        return out
@@ -0,0 +1,187 @@
+# SPDX-License-Identifier: MIT
+
+from array import array
+
+# Integer versions of the control loop maths, for the FPU-less RP2040.
+#
+# Every float operation on the RP2040 is done in software, so a control loop that turns
+# encoder counts into degrees, runs a float PID and scales its output into a throttle
+# (which adafruit_motor then turns back into an integer duty cycle) spends much of its
+# time converting between the two. This keeps the whole path in integers instead:
+#
+#   - the PID works directly on encoder counts, so there is no counts to units conversion
+#   - its gains are converted once into scaled integers, folding in the unit conversion,
+#     the sample rate and the output scaling, so calculate() is only integer multiplies,
+#     adds and a shift
+#   - its output is a signed 16-bit duty cycle, written straight to the PWMs
+#   - the setpoints of a move are sampled into encoder counts once, as the move starts
+#
+# CircuitPython stores integers up to 30 bits without allocating, so the scaling is
+# chosen to keep the products within that for typical errors. Larger ones are still
+# correct, they just cost a long integer.
+
+SHIFT = 8               # The number of fractional bits in the scaled gains
+FULL_DUTY = 0xFFFF      # The duty cycle of full throttle
+_DT_TOLERANCE = 0.1     # The fraction dt may stray from the sample rate before the gains are refolded, as in pid.py
+
+SLOW_DECAY = 1          # The same values as adafruit_motor.motor
+FAST_DECAY = 0
+
+
+# Convert a float to a scaled integer with the given number of fractional bits
+def to_fixed(value, shift=SHIFT):
+    return int(round(value * (1 << shift)))
+
+
+# Convert a scaled integer back to a float
+def to_float(value, shift=SHIFT):
+    return value / (1 << shift)
+
+
+# A class for applying a constant scale factor to integers, such as to turn raw ADC
+# readings into millivolts, using one integer multiply and a shift
+class FixedScale:
+    __slots__ = ("_multiplier", "_shift", "_offset")
+
+    def __init__(self, scale, offset=0, shift=16):
+        self._multiplier = to_fixed(scale, shift)
+        self._offset = offset
+        self._shift = shift
+
+    def __call__(self, value):
+        return ((value * self._multiplier) >> self._shift) + self._offset
+
+
+# A class for handling Proportional, Integral & Derivative (PID) control calculations in
+# integers. It follows lib/pid.py's PID, with the gains given in the same float units.
+#
+# scale converts those units into the integer ones: it is the output integers per output
+# unit, multiplied by the input units per input integer. For position control on encoder
+# counts driving a duty cycle, that is (FULL_DUTY / SPEED_SCALE) * (360 / COUNTS_PER_REV).
+# The setpoint and values passed to calculate() are integers in the input units, and the
+# output limit is in the output integers. The time since the last update can be given to
+# calculate() in integer nanoseconds, and the gains are only refolded when it strays more
+# than _DT_TOLERANCE from the sample rate, such as after an overrun.
+class FixedPID:
+    __slots__ = ("setpoint", "_kp", "_ki", "_kd", "_scale", "_sample_rate", "_dt_min_ns", "_dt_max_ns", "_kp_q",
+                 "_ki_dt_q", "_kd_dt_q", "_integral", "_last_value", "_out_limit", "_int_limit", "_int_limit_q")
+
+    def __init__(self, kp, ki, kd, sample_rate, scale=1.0, output_limit=None, integral_limit=None):
+        self.setpoint = 0
+        self._kp = kp
+        self._ki = ki
+        self._kd = kd
+        self._scale = scale
+        self._sample_rate = sample_rate
+        self._integral = 0
+        self._last_value = 0
+        self._out_limit = output_limit
+        self._int_limit = integral_limit
+        self._precompute()
+
+    def _precompute(self):
+        self._kp_q = to_fixed(self._kp * self._scale)
+        self._ki_dt_q = to_fixed(self._ki * self._scale * self._sample_rate)
+        self._kd_dt_q = to_fixed((self._kd * self._scale) / self._sample_rate)
+        self._dt_min_ns = int(self._sample_rate * (1 - _DT_TOLERANCE) * 1000000000)
+        self._dt_max_ns = int(self._sample_rate * (1 + _DT_TOLERANCE) * 1000000000)
+
+        # The integral is kept with the gains' fractional bits, so shift its limit to match
+        limit = self._int_limit if self._int_limit is not None else self._out_limit
+        self._int_limit_q = (limit << SHIFT) if limit is not None else None
+
+    def set_gains(self, kp, ki, kd):
+        self._kp = kp
+        self._ki = ki
+        self._kd = kd
+        self._precompute()
+
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value):
+        self._sample_rate = value
+        self._precompute()
+
+    def reset(self, value=0):
+        self._integral = 0
+        self._last_value = value
+
+    def calculate(self, value, dt_ns=None):
+        if dt_ns is not None and not self._dt_min_ns <= dt_ns <= self._dt_max_ns:
+            self._sample_rate = dt_ns / 1000000000
+            self._precompute()
+
+        error = self.setpoint - value
+
+        # The integral is kept with the gain's fractional bits, so small errors still add up
+        integral = self._integral + (error * self._ki_dt_q)
+        limit = self._int_limit_q
+        if limit is not None:
+            if integral > limit:
+                integral = limit
+            elif integral < -limit:
+                integral = -limit
+        self._integral = integral
+
+        output = ((error * self._kp_q) + integral - ((value - self._last_value) * self._kd_dt_q)) >> SHIFT
+        self._last_value = value
+
+        limit = self._out_limit
+        if limit is not None:
+            if output > limit:
+                return limit
+            if output < -limit:
+                return -limit
+        return output
+
+
+# A class for following a lib/trajectory.py Profile in integers, such as encoder counts.
+# move() samples each of the profile's setpoints once, multiplied by scale and rounded, so
+# position() is only a lookup on each update
+class FixedProfile:
+    __slots__ = ("updates", "_table")
+
+    def __init__(self, profile=None, scale=1.0):
+        self.updates = 0
+        self._table = array("l", [0])
+        if profile is not None:
+            self.move(profile, scale)
+
+    # Sample the move the profile was last given
+    def move(self, profile, scale=1.0):
+        if len(self._table) < profile.updates + 1:
+            self._table = array("l", [0] * (profile.updates + 1))
+        for i in range(profile.updates + 1):
+            self._table[i] = round(profile.position(i) * scale)
+        self.updates = profile.updates
+
+    # The setpoint at an update of the move
+    def position(self, update):
+        if update > self.updates:
+            update = self.updates
+        return self._table[update]
+
+
+# Drive a motor's pair of PWMs from a signed duty cycle (-FULL_DUTY to +FULL_DUTY), the
+# same way adafruit_motor's DCMotor does for a throttle, but without any float maths
+def set_duty(pwm_p, pwm_n, duty, decay_mode=SLOW_DECAY):
+    if duty == 0:
+        pwm_p.duty_cycle = FULL_DUTY
+        pwm_n.duty_cycle = FULL_DUTY
+    elif decay_mode == SLOW_DECAY:
+        if duty < 0:
+            pwm_p.duty_cycle = FULL_DUTY + duty
+            pwm_n.duty_cycle = FULL_DUTY
+        else:
+            pwm_p.duty_cycle = FULL_DUTY
+            pwm_n.duty_cycle = FULL_DUTY - duty
+    else:
+        if duty < 0:
+            pwm_p.duty_cycle = 0
+            pwm_n.duty_cycle = -duty
+        else:
+            pwm_p.duty_cycle = duty
+            pwm_n.duty_cycle = 0
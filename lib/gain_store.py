@@ -0,0 +1,74 @@
+# SPDX-License-Identifier: MIT
+
+import struct
+
+# A class for keeping the PID gains found for each motor, so they survive a reset.
+#
+# Gains found by motor2040/autotune.py on one motor suit that motor only, and the examples
+# need them the next time they start. They are kept in microcontroller.nvm, a small area of
+# flash set aside for this, which unlike the CIRCUITPY drive can be written from code without
+# boot.py remounting it. Each loop (VELOCITY or POSITION) of each channel (motor) has a slot, which
+# is written on its own so saving one does not disturb the others.
+#
+# The store starts with a 4 byte marker, followed by each slot in turn: a byte that is 1 once
+# the slot has been saved, then the kp, ki and kd gains as 32-bit floats. If the marker is
+# missing, such as on a board that has never been tuned, every slot reads as unsaved.
+
+VELOCITY = 0
+POSITION = 1
+
+_MARKER = b"PIDG"
+_SLOT = "<B3f"
+_SLOT_SIZE = struct.calcsize(_SLOT)
+
+
+class GainStore:
+    __slots__ = ("nvm", "offset", "channels", "loops")
+
+    def __init__(self, nvm=None, offset=0, channels=4, loops=2):
+        if nvm is None:
+            import microcontroller
+            nvm = microcontroller.nvm
+        self.nvm = nvm
+        self.offset = offset            # Where in nvm the store starts, to share it with other uses
+        self.channels = channels
+        self.loops = loops
+        if nvm is not None and offset + self.size > len(nvm):
+            raise ValueError("offset out of range. Expected the store to fit within nvm")
+
+    # The bytes of nvm the store takes up
+    @property
+    def size(self):
+        return len(_MARKER) + (_SLOT_SIZE * self.channels * self.loops)
+
+    def _slot(self, loop, channel):
+        if not 0 <= loop < self.loops:
+            raise ValueError("loop out of range. Expected VELOCITY (0) or POSITION (1)")
+        if not 0 <= channel < self.channels:
+            raise ValueError("channel out of range. Expected 0 to " + str(self.channels - 1))
+        return self.offset + len(_MARKER) + (_SLOT_SIZE * ((loop * self.channels) + channel))
+
+    def _marked(self):
+        return self.nvm is not None and self.nvm[self.offset:self.offset + len(_MARKER)] == _MARKER
+
+    # The (kp, ki, kd) gains saved for a loop of a channel, or default if none have been
+    def load(self, loop, channel, default=None):
+        start = self._slot(loop, channel)
+        if not self._marked():
+            return default
+        saved, kp, ki, kd = struct.unpack(_SLOT, bytes(self.nvm[start:start + _SLOT_SIZE]))
+        return (kp, ki, kd) if saved == 1 else default
+
+    def save(self, loop, channel, gains):
+        start = self._slot(loop, channel)
+        if not self._marked():
+            self.clear()
+        kp, ki, kd = gains
+        self.nvm[start:start + _SLOT_SIZE] = struct.pack(_SLOT, 1, kp, ki, kd)
+
+    # Forget every saved gain
+    def clear(self):
+        if self.nvm is None:
+            raise RuntimeError("this board has no nvm to save to")
+        end = self.offset + self.size
+        self.nvm[self.offset:end] = _MARKER + bytes(end - self.offset - len(_MARKER))
@@ -0,0 +1,139 @@
+# SPDX-License-Identifier: MIT
+
+import math
+from array import array
+
+# The layouts of wheels a Kinematics can describe
+MECANUM = 0         # Four mecanum wheels, with their rollers making an X when seen from above
+DIFFERENTIAL = 1    # Wheels on the left and right, steered by driving the sides at different speeds
+
+
+# A class for converting between the velocity of a robot's body and the speeds of its wheels.
+#
+# The body velocity is (vx, vy, omega): forward and leftward speeds in the same units as
+# the wheel diameter per second, and the anticlockwise turning speed in radians per second.
+# Wheel speeds are in revolutions per second, to match what the velocity examples control.
+#
+# Both directions are a matrix multiply, so the matrices are worked out once here, with the
+# wheel circumference and robot size already folded in. inverse() is then three multiply-adds
+# per wheel, written straight into an array such as a MultiPID's setpoints. For these layouts
+# the inverse matrix's columns are at right angles to each other, so the forward matrix (the
+# least squares fit of the body velocity to the wheel speeds) is each column divided by its
+# squared length.
+#
+# wheels gives the motor index of each wheel, in the order front left, front right, rear left,
+# rear right. For DIFFERENTIAL, any even number of wheels can be given, alternating left, right.
+class Kinematics:
+    __slots__ = ("mode", "wheels", "channels", "_inverse", "_forward")
+
+    def __init__(self, mode, wheels, wheel_diameter, track_width, wheelbase=0.0):
+        if mode not in (MECANUM, DIFFERENTIAL):
+            raise ValueError("mode out of range. Expected MECANUM or DIFFERENTIAL")
+        if mode == MECANUM and len(wheels) != 4:
+            raise ValueError("MECANUM needs four wheels")
+        if mode == DIFFERENTIAL and (len(wheels) == 0 or len(wheels) % 2 != 0):
+            raise ValueError("DIFFERENTIAL needs an even number of wheels")
+        self.mode = mode
+        self.wheels = tuple(wheels)
+        self.channels = max(wheels) + 1
+
+        # The (vx, vy, omega) weights of each wheel, before scaling to revolutions
+        if mode == MECANUM:
+            k = (track_width + wheelbase) / 2
+            rows = ((1, -1, -k), (1, 1, k), (1, 1, -k), (1, -1, k))
+        else:
+            k = track_width / 2
+            rows = [(1, 0, k) if i % 2 else (1, 0, -k) for i in range(len(wheels))]
+
+        revs_per_distance = 1 / (math.pi * wheel_diameter)
+        self._inverse = array("f", [0.0] * (self.channels * 3))
+        for row, wheel in zip(rows, wheels):
+            for j in range(3):
+                self._inverse[wheel * 3 + j] = row[j] * revs_per_distance
+
+        self._forward = array("f", [0.0] * (3 * self.channels))
+        for j in range(3):
+            length_sq = sum(self._inverse[i * 3 + j] ** 2 for i in range(self.channels))
+            if length_sq > 0:
+                for i in range(self.channels):
+                    self._forward[j * self.channels + i] = self._inverse[i * 3 + j] / length_sq
+
+    # Write the speed of each wheel for a body velocity into out, and return it
+    def inverse(self, vx, vy, omega, out):
+        m = self._inverse
+        for wheel in self.wheels:
+            i = wheel * 3
+            out[wheel] = (m[i] * vx) + (m[i + 1] * vy) + (m[i + 2] * omega)
+        return out
+
+    # Write the body velocity (vx, vy, omega) that best fits the wheel speeds into out, and
+    # return it. The same works for turning wheel revolutions into a body movement
+    def forward(self, wheel_values, out):
+        m = self._forward
+        n = self.channels
+        for j in range(3):
+            total = 0.0
+            offset = j * n
+            for i in range(n):
+                total += m[offset + i] * wheel_values[i]
+            out[j] = total
+        return out
+
+
+# A class for tracking where a robot is, by adding up the movements of its wheels.
+#
+# update() takes an EncoderSnapshot and turns the change in counts since its last capture
+# into a movement of the body, using the forward matrix of a Kinematics with the counts
+# per revolution folded in. The movement is then rotated onto the floor using the heading
+# halfway through it, which is more accurate than the heading at either end when turning.
+# Everything is held in preallocated arrays and plain attributes, so nothing is created on
+# each update.
+class Odometry:
+    __slots__ = ("x", "y", "heading", "velocity", "_forward", "_channels", "_move")
+
+    def __init__(self, kinematics, counts_per_rev):
+        self.x = 0.0
+        self.y = 0.0
+        self.heading = 0.0
+        self.velocity = array("f", [0.0] * 3)   # The body's (vx, vy, omega) over the last update
+        self._channels = kinematics.channels
+        self._forward = array("f", [value / counts_per_rev for value in kinematics._forward])
+        self._move = array("f", [0.0] * 3)
+
+    def reset(self, x=0.0, y=0.0, heading=0.0):
+        self.x = x
+        self.y = y
+        self.heading = heading
+        for j in range(3):
+            self.velocity[j] = 0.0
+
+    # Move the pose on by the wheel movements between the snapshot's last two captures
+    def update(self, snapshot):
+        counts = snapshot.counts
+        last_counts = snapshot.last_counts
+        m = self._forward
+        n = self._channels
+        move = self._move
+        for j in range(3):
+            total = 0.0
+            offset = j * n
+            for i in range(n):
+                total += m[offset + i] * (counts[i] - last_counts[i])
+            move[j] = total
+
+        dx = move[0]
+        dy = move[1]
+        dheading = move[2]
+        mid = self.heading + (dheading / 2)
+        cos_mid = math.cos(mid)
+        sin_mid = math.sin(mid)
+        self.x += (dx * cos_mid) - (dy * sin_mid)
+        self.y += (dx * sin_mid) + (dy * cos_mid)
+        self.heading += dheading
+
+        dt = snapshot.dt
+        if dt > 0:
+            velocity = self.velocity
+            velocity[0] = dx / dt
+            velocity[1] = dy / dt
+            velocity[2] = dheading / dt
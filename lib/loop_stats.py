@@ -0,0 +1,67 @@
+# SPDX-License-Identifier: MIT
+
+from array import array
+
+# A class for finding out whether a loop really keeps up with its update rate.
+#
+# Each update's busy time (from waking up to starting to wait for the next update) is
+# counted into a histogram of fixed buckets, each a fraction of the update period wide,
+# with one more bucket for updates that took the whole period or longer. Recording is
+# an integer divide and an array increment, so it can be left running in a real loop,
+# and the summary is only worked out when report() is called.
+#
+# Give one to a LoopTimer to have every update recorded, or call record() directly with
+# the nanoseconds an update took.
+
+_BAR_WIDTH = 40
+
+
+class LoopStats:
+    __slots__ = ("period_ns", "bucket_ns", "counts", "updates", "overruns", "worst_ns", "total_ns")
+
+    def __init__(self, updates, buckets=10):
+        self.period_ns = 1000000000 // updates
+        self.bucket_ns = self.period_ns // buckets
+        self.counts = array("l", [0] * (buckets + 1))     # The last bucket is for updates of a period or longer
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.updates = 0
+        self.overruns = 0       # How many updates took the whole period or longer
+        self.worst_ns = 0       # The longest an update has taken
+        self.total_ns = 0
+
+    # Record the nanoseconds one update took
+    def record(self, busy_ns):
+        bucket = busy_ns // self.bucket_ns
+        last = len(self.counts) - 1
+        if bucket >= last:
+            bucket = last
+            if busy_ns >= self.period_ns:
+                self.overruns += 1
+        self.counts[bucket] += 1
+        if busy_ns > self.worst_ns:
+            self.worst_ns = busy_ns
+        self.total_ns += busy_ns
+        self.updates += 1
+
+    @property
+    def mean_ns(self):
+        return self.total_ns // self.updates if self.updates else 0
+
+    # Print a summary and the histogram, with times in microseconds and each bucket
+    # labelled by the percentage of the period it covers
+    def report(self, name="Loop"):
+        print(name, ": updates = ", self.updates, ", overruns = ", self.overruns, ", mean = ", self.mean_ns // 1000,
+              "us, worst = ", self.worst_ns // 1000, "us, period = ", self.period_ns // 1000, "us", sep="")
+        most = max(self.counts)
+        last = len(self.counts) - 1
+        for i in range(len(self.counts)):
+            if i < last:
+                label = "{:3d}-{:3d}%".format(i * 100 // last, (i + 1) * 100 // last)
+            else:
+                label = "  >=100%"
+            bar = "#" * (self.counts[i] * _BAR_WIDTH // most) if most else ""
+            print(label, "{:8d}".format(self.counts[i]), bar)
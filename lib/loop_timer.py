@@ -0,0 +1,75 @@
+# SPDX-License-Identifier: MIT
+
+import time
+
+# A class for running a control loop at a fixed rate without drifting.
+#
+# Sleeping for the full update period at the end of each loop makes the real period
+# compute time + sleep time, so the loop runs slow and its timing jitters with whatever
+# was printed. Instead, this keeps a deadline for each update on a fixed grid taken from
+# time.monotonic_ns(), sleeps only for whatever slack is left before it, and reports the
+# time that actually passed since the last update so it can be given to the controllers,
+# as seconds from wait() and as integer nanoseconds in dt_ns.
+#
+# If an update finishes after its deadline, it is counted as an overrun and the next
+# update starts straight away. If a whole period or more is missed, the grid is moved
+# on rather than running a burst of late updates to catch up.
+#
+# If given a LoopStats, the busy time of each update is recorded into it as well. If given
+# a SlackCollector, it is offered the slack before each sleep, to collect garbage in.
+
+_NS_TO_S = 1 / 1000000000
+
+
+class LoopTimer:
+    __slots__ = ("period_ns", "stats", "collector", "ticks", "overruns", "slack_ns", "dt_ns", "_deadline", "_last")
+
+    def __init__(self, updates, stats=None, collector=None):
+        self.period_ns = 1000000000 // updates
+        self.stats = stats
+        self.collector = collector
+        self.restart()
+
+    def restart(self):
+        self.ticks = 0
+        self.overruns = 0
+        self.slack_ns = 0
+        self.dt_ns = self.period_ns
+        self._last = time.monotonic_ns()
+        self._deadline = self._last + self.period_ns
+
+    # The time.monotonic_ns() of the start of the current update, to save reading it again
+    @property
+    def now_ns(self):
+        return self._last
+
+    # How long is left before the next deadline, in nanoseconds (negative if it has passed)
+    def remaining_ns(self):
+        return self._deadline - time.monotonic_ns()
+
+    # Wait for the next deadline and return the seconds that passed since the last one
+    def wait(self):
+        now = time.monotonic_ns()
+        if self.stats is not None:
+            self.stats.record(now - self._last)
+        slack = self._deadline - now
+        self.slack_ns = slack
+        if self.collector is not None and slack > 0 and self.collector.tick(slack):
+            now = time.monotonic_ns()
+            slack = self._deadline - now
+        if slack > 0:
+            time.sleep(slack * _NS_TO_S)
+            now = time.monotonic_ns()
+            self._deadline += self.period_ns
+        else:
+            self.overruns += 1
+            if slack <= -self.period_ns:
+                self._deadline = now + self.period_ns
+            else:
+                self._deadline += self.period_ns
+
+        self.dt_ns = now - self._last
+        dt = self.dt_ns * _NS_TO_S
+        self._last = now
+        self.ticks += 1
+        return dt
@@ -0,0 +1,76 @@
+# SPDX-License-Identifier: MIT
+
+import struct
+from array import array
+from telemetry import FrameRing
+
+# A class for recording every update of a control loop, so it can be replayed on a computer.
+#
+# Telemetry only sends every few updates, and only the values worth plotting, which is not
+# enough to tell whether a change of gains or loop rate made things better or worse. A trace
+# records, for every update, the time, each encoder's count, each setpoint and each throttle,
+# which is everything tools/trace_replay.py needs to feed the same counts back through the
+# velocity PID on a computer and diff the throttles it gives against those recorded. Two
+# traces can also be diffed against each other, such as from before and after a change.
+#
+# To keep the cost per update down, the counts are packed as 32-bit ints, the setpoints as
+# 32-bit floats, the throttles as 16-bit ints (scaled from -1.0 to 1.0) and the time as the
+# microseconds since the first record (wrapping after about 71 minutes), so four motors take
+# 49 bytes per update. Records are sent through the same ring as Telemetry, so a record is
+# only dropped if the computer cannot keep up, which the 16-bit sequence number shows. Unlike
+# Telemetry, there is no text to fall back to, so usb_cdc.data must be enabled in boot.py.
+#
+# Each record is two sync bytes (different to Telemetry's, so the two cannot be mistaken),
+# a byte giving the number of channels, the sequence number and the time, then the counts,
+# setpoints and throttles of each channel in turn, all little-endian.
+
+SYNC = b"\xa5\x5b"
+THROTTLE_SCALE = 32767
+_RECORD_START = "<2sBHI"
+_RECORD_START_SIZE = struct.calcsize(_RECORD_START)
+
+
+class LoopTrace(FrameRing):
+    def __init__(self, channels, capacity=64, stream=None):
+        if not 0 < channels < 256:
+            raise ValueError("channels out of range. Expected 1 to 255")
+
+        self.channels = channels
+        self.counts = array("l", [0] * channels)        # Set these then call log() to log them
+        self.setpoints = array("f", [0.0] * channels)
+        self.throttles = array("f", [0.0] * channels)
+        self._start_ns = None
+        super().__init__(_RECORD_START_SIZE + (10 * channels), capacity, stream)
+        if self._stream is None:
+            raise RuntimeError("usb_cdc.data is not enabled. Add usb_cdc.enable(console=True, data=True) to boot.py")
+
+    # Log one update, from the time its counts were read (from time.monotonic_ns()) and the
+    # contents of counts, setpoints and throttles (or the arrays given)
+    def log(self, now_ns, counts=None, setpoints=None, throttles=None):
+        if counts is None:
+            counts = self.counts
+        if setpoints is None:
+            setpoints = self.setpoints
+        if throttles is None:
+            throttles = self.throttles
+        if self._start_ns is None:
+            self._start_ns = now_ns
+
+        buffer = self._buffer
+        channels = self.channels
+        offset = self._reserve()
+        time_us = ((now_ns - self._start_ns) // 1000) & 0xFFFFFFFF
+        struct.pack_into(_RECORD_START, buffer, offset, SYNC, channels, self._sequence, time_us)
+        offset += _RECORD_START_SIZE
+        for i in range(channels):
+            struct.pack_into("<l", buffer, offset, counts[i])
+            offset += 4
+        for i in range(channels):
+            struct.pack_into("<f", buffer, offset, setpoints[i])
+            offset += 4
+        for i in range(channels):
+            throttle = max(min(throttles[i], 1.0), -1.0)
+            struct.pack_into("<h", buffer, offset, int(throttle * THROTTLE_SCALE))
+            offset += 2
+
+        self._sequence = (self._sequence + 1) & 0xFFFF
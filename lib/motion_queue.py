@@ -0,0 +1,276 @@
+# SPDX-License-Identifier: MIT
+
+import struct
+from array import array
+
+# A class for following a stream of timed moves on several axes at once, such as ones sent
+# from a computer, rather than picking targets inside the control loop.
+#
+# Each segment gives how long it should take and where every axis should be at its end, and
+# optionally how fast each should be going there. push() adds them to a ring buffer of fixed
+# capacity, allocated once, and update() is called every update to move along the segment at
+# its head, filling positions and velocities with the setpoints to give the per-axis
+# controllers (the velocities can be fed forward, so the controllers only correct errors).
+#
+# Each segment is followed as a cubic from the position and velocity the last one ended at,
+# to its own end position and velocity, so the setpoints never jump. Where a segment does not
+# give its end velocities, they are found by looking ahead to the segment queued after it, so
+# consecutive segments blend into one another without stopping at each joint. The velocity
+# at a joint is the harmonic mean of the average speeds of the segments either side, or zero
+# where an axis turns back, which keeps each axis from overshooting its waypoints. This is
+# worked out as each segment starts, so the segment after must already be queued by then:
+# a segment that starts with nothing behind it slows to a stop at its end (counted in
+# underruns). Time left over at the end of a segment carries into the next, so a stream of
+# segments keeps time however they line up with the updates.
+#
+# MotionLink reads segments sent by tools/motion_stream.py into a queue, in the slack at the
+# end of each update. Each frame is two sync bytes, a byte giving the number of axes, a byte
+# of flags, a 16-bit sequence number, the duration, then the end position and velocity of
+# each axis, all little-endian 32-bit floats. A frame is only read while the queue has space
+# for it, so a full queue leaves the rest waiting in the USB serial, which holds up the
+# computer sending them rather than losing any.
+
+SYNC = b"\xa5\x5c"
+FLAG_VELOCITIES = 0x01      # The frame's velocities are to be used, rather than found by looking ahead
+FLAG_CLEAR = 0x02           # Drop any queued segments (and stop where it is) before queueing this one
+_FRAME_START = "<2sBBHf"
+
+
+class MotionQueue:
+    __slots__ = ("axes", "capacity", "positions", "velocities", "underruns", "completed", "_durations", "_ends",
+                 "_end_velocities", "_given", "_head", "_count", "_elapsed", "_duration", "_coefficients",
+                 "_active")
+
+    def __init__(self, axes, capacity=16, positions=None):
+        if capacity < 2:
+            raise ValueError("capacity out of range. Expected at least 2, to look ahead")
+        self.axes = axes
+        self.capacity = capacity
+        self.positions = array("f", [0.0] * axes)     # The position setpoint of each axis, after each update
+        self.velocities = array("f", [0.0] * axes)    # The velocity setpoint of each axis, per second
+        self.underruns = 0          # How many segments started with nothing queued after them to blend into
+        self.completed = 0          # How many segments have been followed to their end
+
+        self._durations = array("f", [0.0] * capacity)
+        self._ends = array("f", [0.0] * (capacity * axes))
+        self._end_velocities = array("f", [0.0] * (capacity * axes))
+        self._given = bytearray(capacity)
+        self._coefficients = array("f", [0.0] * (4 * axes))
+        self.reset(positions)
+
+    # Drop any queued segments, and hold each axis at the positions given (or where it is)
+    def reset(self, positions=None):
+        if positions is not None:
+            for i in range(self.axes):
+                self.positions[i] = positions[i]
+        for i in range(self.axes):
+            self.velocities[i] = 0.0
+        self._head = 0
+        self._count = 0
+        self._elapsed = 0.0
+        self._duration = 0.0
+        self._active = False
+
+    # How many segments are queued, including the one being followed
+    def __len__(self):
+        return self._count
+
+    # How many more segments can be queued
+    @property
+    def free(self):
+        return self.capacity - self._count
+
+    # Whether a segment is being followed
+    @property
+    def active(self):
+        return self._active
+
+    # Queue a segment, taking duration seconds to reach the positions given, at the velocities
+    # given (or None to blend into the next segment). Returns False if the queue is full
+    def push(self, duration, positions, velocities=None):
+        if duration <= 0:
+            raise ValueError("duration out of range. Expected more than 0")
+        if self._count >= self.capacity:
+            return False
+
+        slot = (self._head + self._count) % self.capacity
+        self._durations[slot] = duration
+        start = slot * self.axes
+        for i in range(self.axes):
+            self._ends[start + i] = positions[i]
+            self._end_velocities[start + i] = velocities[i] if velocities is not None else 0.0
+        self._given[slot] = velocities is not None
+        self._count += 1
+        return True
+
+    def _start(self):
+        # Fit a cubic to each axis of the segment at the head, from where the last one ended
+        slot = self._head
+        duration = self._durations[slot]
+        start = slot * self.axes
+        following = self._count > 1
+        if not following:
+            self.underruns += 1
+        after = ((slot + 1) % self.capacity) * self.axes
+        after_duration = self._durations[(slot + 1) % self.capacity]
+
+        coefficients = self._coefficients
+        for i in range(self.axes):
+            p0 = self.positions[i]
+            v0 = self.velocities[i] * duration
+            p1 = self._ends[start + i]
+            if self._given[slot]:
+                v1 = self._end_velocities[start + i]
+            elif following:
+                v1 = _blend((p1 - p0) / duration, (self._ends[after + i] - p1) / after_duration)
+            else:
+                v1 = 0.0
+            v1 *= duration
+            self._end_velocities[start + i] = v1 / duration
+
+            j = i * 4
+            coefficients[j] = p0
+            coefficients[j + 1] = v0
+            coefficients[j + 2] = (3.0 * (p1 - p0)) - (2.0 * v0) - v1
+            coefficients[j + 3] = (2.0 * (p0 - p1)) + v0 + v1
+
+        self._duration = duration
+        self._active = True
+
+    def _finish(self):
+        # Land exactly on the end of the segment at the head, and drop it
+        start = self._head * self.axes
+        for i in range(self.axes):
+            self.positions[i] = self._ends[start + i]
+            self.velocities[i] = self._end_velocities[start + i]
+        self._head = (self._head + 1) % self.capacity
+        self._count -= 1
+        self.completed += 1
+        self._active = False
+
+    # Move along the queued segments by dt seconds, updating positions and velocities.
+    # Returns whether a segment is being followed
+    def update(self, dt):
+        if not self._active:
+            if self._count == 0:
+                for i in range(self.axes):
+                    self.velocities[i] = 0.0
+                return False
+            self._start()
+            self._elapsed = 0.0
+        else:
+            self._elapsed += dt
+
+        # Carry any time past the end of this segment into the next ones
+        while self._elapsed >= self._duration:
+            self._elapsed -= self._duration
+            self._finish()
+            if self._count == 0:
+                self._elapsed = 0.0
+                for i in range(self.axes):
+                    self.velocities[i] = 0.0
+                return False
+            self._start()
+
+        u = self._elapsed / self._duration
+        coefficients = self._coefficients
+        for i in range(self.axes):
+            j = i * 4
+            b = coefficients[j + 1]
+            c = coefficients[j + 2]
+            d = coefficients[j + 3]
+            self.positions[i] = coefficients[j] + (u * (b + (u * (c + (u * d)))))
+            self.velocities[i] = (b + (u * ((2.0 * c) + (3.0 * u * d)))) / self._duration
+        return True
+
+
+def _blend(before, after):
+    # The velocity at the joint between two segments, from the average velocity of each
+    if before * after <= 0.0:
+        return 0.0
+    return (2.0 * before * after) / (before + after)
+
+
+class MotionLink:
+    __slots__ = ("queue", "received", "lost", "rejected", "skipped_bytes", "_stream", "_format", "_frame", "_view",
+                 "_filled", "_positions", "_velocities", "_last_sequence")
+
+    def __init__(self, queue, stream=None):
+        self.queue = queue
+        self.received = 0           # How many segments have been queued
+        self.lost = 0               # How many were missed, going by the gaps in their sequence numbers
+        self.rejected = 0           # How many were for a different number of axes, or had no duration
+        self.skipped_bytes = 0      # How many bytes were skipped looking for the start of a frame
+
+        self._stream = stream if stream is not None else _default_stream()
+        self._format = _FRAME_START + ("%df" % (2 * queue.axes))
+        self._frame = bytearray(struct.calcsize(self._format))
+        self._view = memoryview(self._frame)
+        self._filled = 0
+        self._positions = array("f", [0.0] * queue.axes)
+        self._velocities = array("f", [0.0] * queue.axes)
+        self._last_sequence = None
+
+    # Queue as many of the segments waiting in the stream as there is space for, without waiting.
+    # Returns how many were queued
+    def poll(self):
+        queued = 0
+        frame = self._frame
+        size = len(frame)
+        while self.queue.free > 0:
+            waiting = self._stream.in_waiting
+            if waiting == 0:
+                break
+            wanted = min(waiting, size - self._filled)
+            read = self._stream.readinto(self._view[self._filled:self._filled + wanted])
+            if not read:
+                break
+            self._filled += read
+            if self._filled < size:
+                continue
+
+            if frame[0] != SYNC[0] or frame[1] != SYNC[1]:
+                self._resync()
+                continue
+            if self._queue_frame():
+                queued += 1
+            self._filled = 0
+        return queued
+
+    def _resync(self):
+        # Drop bytes up to the next place a frame could start
+        start = self._frame.find(SYNC, 1)
+        if start < 0:
+            start = self._filled - 1 if self._frame[self._filled - 1] == SYNC[0] else self._filled
+        self._frame[0:self._filled - start] = self._frame[start:self._filled]
+        self._filled -= start
+        self.skipped_bytes += start
+
+    def _queue_frame(self):
+        _, axes, flags, sequence, duration = struct.unpack_from(_FRAME_START, self._frame)
+        if self._last_sequence is not None:
+            self.lost += (sequence - self._last_sequence - 1) & 0xFFFF
+        self._last_sequence = sequence
+        if axes != self.queue.axes or not duration > 0:
+            self.rejected += 1
+            return False
+
+        values = struct.unpack_from(self._format, self._frame)
+        for i in range(axes):
+            self._positions[i] = values[5 + i]
+            self._velocities[i] = values[5 + axes + i]
+        if flags & FLAG_CLEAR:
+            self.queue.reset()
+        self.queue.push(duration, self._positions, self._velocities if flags & FLAG_VELOCITIES else None)
+        self.received += 1
+        return True
+
+
+def _default_stream():
+    # The USB serial data channel, which must be enabled in boot.py, as binary sent to the
+    # console could be taken as a Ctrl-C
+    import usb_cdc
+    if usb_cdc.data is None:
+        raise RuntimeError("usb_cdc.data is not enabled. Add usb_cdc.enable(console=True, data=True) to boot.py")
+    usb_cdc.data.timeout = 0
+    return usb_cdc.data
@@ -0,0 +1,55 @@
+# SPDX-License-Identifier: MIT
+
+from loop_timer import LoopTimer
+
+# A class for playing a sequence of throttles on a set of motors, from a table.
+#
+# Each step of the table is the time to spend on it in seconds, followed by the throttle
+# to give each motor (0 to stop, or None to spin freely), such as:
+#
+#   SEQUENCE = (
+#       (1.0, (0.5, -0.5)),     # Forward slow
+#       (1.0, (0, 0)),          # Stop
+#   )
+#
+# Rather than sleeping for each step then checking whether to stop, the steps are timed
+# on a LoopTimer that ticks updates times a second, and stop() is checked on every tick,
+# so the sequence ends within a tick of it returning True. The steps are counted in
+# ticks, so their timing does not drift however long the sequence runs.
+
+
+class MotorSequence:
+    def __init__(self, motors, steps, updates=200):
+        self.motors = motors
+        self.steps = []
+        self.index = 0          # The step being played
+        self.updates = updates
+
+        for duration, throttles in steps:
+            if len(throttles) != len(motors):
+                raise ValueError("each step needs one throttle per motor")
+            self.steps.append((max(round(duration * updates), 1), tuple(throttles)))
+
+        self._timer = LoopTimer(updates)
+
+    # Set the motors to the throttles of a step
+    def apply(self, index):
+        self.index = index
+        throttles = self.steps[index][1]
+        for i in range(len(self.motors)):
+            self.motors[i].throttle = throttles[i]
+
+    # Play the steps until stop() returns True (or once through, if not repeating).
+    # Returns True if it was stopped, or False if it reached the end
+    def play(self, stop, repeat=True):
+        timer = self._timer
+        timer.restart()
+        while True:
+            for index in range(len(self.steps)):
+                self.apply(index)
+                for _ in range(self.steps[index][0]):
+                    timer.wait()
+                    if stop():
+                        return True
+            if not repeat:
+                return False
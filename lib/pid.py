@@ -0,0 +1,312 @@
+# SPDX-License-Identifier: MIT
+
+from array import array
+
+# A class for handling Proportional, Integral & Derivative (PID) control calculations.
+#
+# The RP2040 has no floating point unit, so every float operation is done in software.
+# To keep calculate() cheap, the sample rate is folded into the integral and derivative
+# gains whenever a gain or the sample rate changes, rather than on every call. A measured
+# dt passed to calculate() only redoes this when it strays more than _DT_TOLERANCE from the
+# rate last folded in (such as after an overrun), so the jitter of a loop's measured period
+# does not bring the divisions back on every update. The integral is stored already
+# multiplied by its gain, which lets it be clamped directly against the output limits
+# (anti-windup) and keeps the output free of bumps when the integral gain is changed
+# mid-run. Unset limits are stored as infinity so the clamps need no extra checks.
+
+_INF = float("inf")
+_DT_TOLERANCE = 0.1         # The fraction dt may stray from the sample rate before the gains are refolded
+
+
+class PID:
+    __slots__ = ("setpoint", "_kp", "_ki", "_kd", "_sample_rate", "_dt_min", "_dt_max", "_ki_dt", "_kd_dt",
+                 "_integral", "_last_value", "_out_min", "_out_max", "_int_limit", "_int_min", "_int_max")
+
+    def __init__(self, kp, ki, kd, sample_rate, output_limit=None, integral_limit=None):
+        self.setpoint = 0
+        self._kp = kp
+        self._ki = ki
+        self._kd = kd
+        self._sample_rate = sample_rate
+        self._integral = 0.0
+        self._last_value = 0
+        self._out_min = -_INF
+        self._out_max = _INF
+        self._int_limit = None
+        self._int_min = -_INF
+        self._int_max = _INF
+        self.output_limit = output_limit
+        self.integral_limit = integral_limit
+        self._precompute()
+
+    def _precompute(self):
+        self._ki_dt = self._ki * self._sample_rate
+        self._kd_dt = self._kd / self._sample_rate
+        self._dt_min = self._sample_rate * (1 - _DT_TOLERANCE)
+        self._dt_max = self._sample_rate * (1 + _DT_TOLERANCE)
+
+    @property
+    def kp(self):
+        return self._kp
+
+    @kp.setter
+    def kp(self, value):
+        self._kp = value
+
+    @property
+    def ki(self):
+        return self._ki
+
+    @ki.setter
+    def ki(self, value):
+        self._ki = value
+        self._precompute()
+
+    @property
+    def kd(self):
+        return self._kd
+
+    @kd.setter
+    def kd(self, value):
+        self._kd = value
+        self._precompute()
+
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value):
+        self._sample_rate = value
+        self._precompute()
+
+    # The output is clamped to +/- this value (None for no limit)
+    @property
+    def output_limit(self):
+        return None if self._out_max == _INF else self._out_max
+
+    @output_limit.setter
+    def output_limit(self, value):
+        if value is None:
+            self._out_min = -_INF
+            self._out_max = _INF
+        else:
+            self._out_min = -abs(value)
+            self._out_max = abs(value)
+        self._update_integral_limits()
+
+    # The integral term is clamped to +/- this value (None to use the output limit)
+    @property
+    def integral_limit(self):
+        return self._int_limit
+
+    @integral_limit.setter
+    def integral_limit(self, value):
+        self._int_limit = None if value is None else abs(value)
+        self._update_integral_limits()
+
+    def _update_integral_limits(self):
+        limit = self._int_limit
+        if limit is None or limit > self._out_max:
+            limit = self._out_max
+        self._int_min = -limit
+        self._int_max = limit
+
+    def reset(self, value=0):
+        self._integral = 0.0
+        self._last_value = value
+
+    # Calculate the output for a new value. If dt is given, it is used as the time since
+    # the last value, for when the loop measures its real period rather than assuming it
+    def calculate(self, value, dt=None):
+        if dt is not None and not self._dt_min <= dt <= self._dt_max:
+            self._sample_rate = dt
+            self._precompute()
+
+        error = self.setpoint - value
+
+        integral = self._integral + (error * self._ki_dt)
+        if integral > self._int_max:
+            integral = self._int_max
+        elif integral < self._int_min:
+            integral = self._int_min
+        self._integral = integral
+
+        output = (error * self._kp) + integral - ((value - self._last_value) * self._kd_dt)
+        self._last_value = value
+
+        if output > self._out_max:
+            return self._out_max
+        if output < self._out_min:
+            return self._out_min
+        return output
+
+
+# A class for running the same PID calculations on several channels at once, such as
+# the four motors of a Motor 2040.
+#
+# The state of every channel is kept in contiguous float arrays rather than in separate
+# PID objects, so calculate() handles all channels in a single pass with one method call,
+# and writes its results into a preallocated outputs array rather than creating a list.
+# calculate_channel() does the same for one channel, so a loop that reads, calculates and
+# writes each channel in turn can do so in one pass rather than three.
+class MultiPID:
+    __slots__ = ("channels", "setpoints", "outputs", "_kp", "_ki", "_kd", "_ki_dt", "_kd_dt",
+                 "_integrals", "_last_values", "_sample_rate", "_dt_min", "_dt_max", "_out_min", "_out_max",
+                 "_int_limit", "_int_min", "_int_max")
+
+    def __init__(self, channels, kp, ki, kd, sample_rate, output_limit=None, integral_limit=None):
+        self.channels = channels
+        self.setpoints = array("f", [0.0] * channels)
+        self.outputs = array("f", [0.0] * channels)
+        self._kp = array("f", [kp] * channels)
+        self._ki = array("f", [ki] * channels)
+        self._kd = array("f", [kd] * channels)
+        self._ki_dt = array("f", [0.0] * channels)
+        self._kd_dt = array("f", [0.0] * channels)
+        self._integrals = array("f", [0.0] * channels)
+        self._last_values = array("f", [0.0] * channels)
+        self._sample_rate = sample_rate
+        self._out_min = -_INF
+        self._out_max = _INF
+        self._int_limit = None
+        self._int_min = -_INF
+        self._int_max = _INF
+        self.output_limit = output_limit
+        self.integral_limit = integral_limit
+        self._precompute()
+
+    def _precompute(self):
+        rate = self._sample_rate
+        for i in range(self.channels):
+            self._ki_dt[i] = self._ki[i] * rate
+            self._kd_dt[i] = self._kd[i] / rate
+        self._dt_min = rate * (1 - _DT_TOLERANCE)
+        self._dt_max = rate * (1 + _DT_TOLERANCE)
+
+    # Get the (kp, ki, kd) gains of a channel
+    def gains(self, channel):
+        return (self._kp[channel], self._ki[channel], self._kd[channel])
+
+    # Set the gains of a channel, or of every channel if none is given
+    def set_gains(self, kp, ki, kd, channel=None):
+        channels = range(self.channels) if channel is None else (channel,)
+        for i in channels:
+            self._kp[i] = kp
+            self._ki[i] = ki
+            self._kd[i] = kd
+        self._precompute()
+
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value):
+        self._sample_rate = value
+        self._precompute()
+
+    # The outputs are clamped to +/- this value (None for no limit)
+    @property
+    def output_limit(self):
+        return None if self._out_max == _INF else self._out_max
+
+    @output_limit.setter
+    def output_limit(self, value):
+        if value is None:
+            self._out_min = -_INF
+            self._out_max = _INF
+        else:
+            self._out_min = -abs(value)
+            self._out_max = abs(value)
+        self._update_integral_limits()
+
+    # The integral terms are clamped to +/- this value (None to use the output limit)
+    @property
+    def integral_limit(self):
+        return self._int_limit
+
+    @integral_limit.setter
+    def integral_limit(self, value):
+        self._int_limit = None if value is None else abs(value)
+        self._update_integral_limits()
+
+    def _update_integral_limits(self):
+        limit = self._int_limit
+        if limit is None or limit > self._out_max:
+            limit = self._out_max
+        self._int_min = -limit
+        self._int_max = limit
+
+    def reset(self):
+        for i in range(self.channels):
+            self._integrals[i] = 0.0
+            self._last_values[i] = 0.0
+
+    # Calculate the outputs of every channel from an array (or list) of new values, and
+    # return the outputs array. If dt is given, it is used as the time since the last values
+    def calculate(self, values, dt=None):
+        if dt is not None and not self._dt_min <= dt <= self._dt_max:
+            self._sample_rate = dt
+            self._precompute()
+
+        # Look everything up once, rather than once per channel
+        setpoints = self.setpoints
+        outputs = self.outputs
+        kp = self._kp
+        ki_dt = self._ki_dt
+        kd_dt = self._kd_dt
+        integrals = self._integrals
+        last_values = self._last_values
+        out_min = self._out_min
+        out_max = self._out_max
+        int_min = self._int_min
+        int_max = self._int_max
+
+        for i in range(self.channels):
+            value = values[i]
+            error = setpoints[i] - value
+
+            integral = integrals[i] + (error * ki_dt[i])
+            if integral > int_max:
+                integral = int_max
+            elif integral < int_min:
+                integral = int_min
+            integrals[i] = integral
+
+            output = (error * kp[i]) + integral - ((value - last_values[i]) * kd_dt[i])
+            last_values[i] = value
+
+            if output > out_max:
+                output = out_max
+            elif output < out_min:
+                output = out_min
+            outputs[i] = output
+
+        return outputs
+
+    # Calculate the output of one channel from its new value, the same as calculate() does
+    # for every channel, and return it. If dt is given, it is used as the time since the last value
+    def calculate_channel(self, channel, value, dt=None):
+        if dt is not None and not self._dt_min <= dt <= self._dt_max:
+            self._sample_rate = dt
+            self._precompute()
+
+        error = self.setpoints[channel] - value
+
+        integral = self._integrals[channel] + (error * self._ki_dt[channel])
+        if integral > self._int_max:
+            integral = self._int_max
+        elif integral < self._int_min:
+            integral = self._int_min
+        self._integrals[channel] = integral
+
+        output = (error * self._kp[channel]) + integral - ((value - self._last_values[channel]) * self._kd_dt[channel])
+        self._last_values[channel] = value
+
+        if output > self._out_max:
+            output = self._out_max
+        elif output < self._out_min:
+            output = self._out_min
+        self.outputs[channel] = output
+        return output
@@ -0,0 +1,137 @@
+# SPDX-License-Identifier: MIT
+
+import board
+
+# Descriptions of the boards and motors the examples run on, so each is written down once.
+#
+# The examples used to each carry their own copies of their board's pins and analog gains,
+# and of the motor's gear ratio and speed scale, which had drifted apart. Instead, they
+# look up a BoardProfile and a MotorProfile by name here. Each profile also works out the
+# combined conversion factors once when created, such as from a raw ADC reading straight to
+# amps, or from an encoder count straight to degrees, so a loop converting a reading does a
+# single multiply (and add) rather than a chain of divisions.
+#
+# Pins are held by name and only looked up on the board when asked for, so this file can
+# be imported on any board, even one without all of the pins named.
+#
+# To add your own board or motor, add a profile to BOARDS or MOTORS below.
+
+# The decay modes, matching adafruit_motor.motor
+FAST_DECAY = 0
+SLOW_DECAY = 1
+
+_ADC_STEPS = 65536
+
+
+class MotorProfile:
+    __slots__ = ("name", "gear_ratio", "encoder_counts", "speed_scale", "frequency", "decay_mode", "counts_per_rev",
+                 "revs_per_count", "degrees_per_count", "counts_per_degree")
+
+    def __init__(self, name, gear_ratio, speed_scale, encoder_counts=12, frequency=25000, decay_mode=SLOW_DECAY):
+        self.name = name
+        self.gear_ratio = gear_ratio            # The gear ratio of the motor
+        self.encoder_counts = encoder_counts    # The counts per revolution of the motor's own shaft
+        self.speed_scale = speed_scale          # The speed of the output shaft at full throttle, in revolutions per second
+        self.frequency = frequency              # The PWM frequency to drive it at
+        self.decay_mode = decay_mode            # The decay mode to drive it with
+
+        self.counts_per_rev = encoder_counts * gear_ratio   # The counts per revolution of the output shaft
+        self.revs_per_count = 1 / self.counts_per_rev
+        self.degrees_per_count = 360.0 / self.counts_per_rev
+        self.counts_per_degree = self.counts_per_rev / 360.0
+
+
+class BoardProfile:
+    __slots__ = ("name", "motors", "encoders", "buttons", "adc_reference", "voltage_gain", "current_gain",
+                 "current_offset", "volts_per_raw", "supply_volts_per_raw", "amps_per_raw", "amps_offset")
+
+    def __init__(self, name, motors=(), encoders=(), buttons=(), voltage_gain=1.0, current_gain=1.0,
+                 current_offset=0.0, adc_reference=3.3):
+        self.name = name
+        self.motors = motors                    # The names of each motor's (P, N) pins
+        self.encoders = encoders                # The names of each encoder's (A, B) pins
+        self.buttons = buttons                  # The names of the button pins
+        self.adc_reference = adc_reference
+        self.voltage_gain = voltage_gain        # From the voltage at the ADC to the supply voltage
+        self.current_gain = current_gain        # From the voltage at the ADC (plus offset) to amps
+        self.current_offset = current_offset
+
+        # A raw ADC reading (0 to 65535) is turned into volts, supply volts or amps with one
+        # multiply, plus one add for amps
+        self.volts_per_raw = adc_reference / _ADC_STEPS
+        self.supply_volts_per_raw = self.volts_per_raw * voltage_gain
+        self.amps_per_raw = self.volts_per_raw * current_gain
+        self.amps_offset = current_offset * current_gain
+
+    # The (P, N) pins of a motor. If reverse is True they are swapped, for a motor mounted
+    # facing the other way
+    def motor_pins(self, index, reverse=False):
+        p, n = self.motors[index]
+        if reverse:
+            p, n = n, p
+        return getattr(board, p), getattr(board, n)
+
+    # The (A, B) pins of an encoder. If reverse is True they are swapped, for a motor
+    # mounted facing the other way
+    def encoder_pins(self, index, reverse=False):
+        a, b = self.encoders[index]
+        if reverse:
+            a, b = b, a
+        return getattr(board, a), getattr(board, b)
+
+    def button_pins(self):
+        return [getattr(board, name) for name in self.buttons]
+
+    # Convert a raw ADC reading
+    def volts(self, raw):
+        return raw * self.volts_per_raw
+
+    def supply_volts(self, raw):
+        return raw * self.supply_volts_per_raw
+
+    def amps(self, raw):
+        return (raw * self.amps_per_raw) + self.amps_offset
+
+
+BOARDS = {
+    "motor2040": BoardProfile(
+        "Motor 2040",
+        motors=(("MOTOR_A_P", "MOTOR_A_N"), ("MOTOR_B_P", "MOTOR_B_N"),
+                ("MOTOR_C_P", "MOTOR_C_N"), ("MOTOR_D_P", "MOTOR_D_N")),
+        encoders=(("ENCODER_A_A", "ENCODER_A_B"), ("ENCODER_B_A", "ENCODER_B_B"),
+                  ("ENCODER_C_A", "ENCODER_C_B"), ("ENCODER_D_A", "ENCODER_D_B")),
+        buttons=("USER_SW",),
+        voltage_gain=13.9 / 3.9,
+        current_gain=1 / 0.47,
+        current_offset=-0.005),
+    "pico_motor_shim": BoardProfile(
+        "Pico Motor Shim",
+        motors=(("GP6", "GP7"), ("GP27", "GP26")),
+        buttons=("GP2",)),
+    "servo2040": BoardProfile(
+        "Servo 2040",
+        buttons=("USER_SW",),
+        voltage_gain=13.9 / 3.9,
+        current_gain=1 / (69 * 0.003),      # A current sense amplifier gain of 69, across a 0.003 Ohm shunt
+        current_offset=-0.02),
+    "plasma2040": BoardProfile(
+        "Plasma 2040",
+        buttons=("USER_SW", "SW_A", "SW_B"),
+        current_gain=1 / (50 * 0.015)),     # A current sense amplifier gain of 50, across a 0.015 Ohm shunt
+}
+
+MOTORS = {
+    "mmme_50": MotorProfile("Micro Metal Motor with Encoder, 50:1", gear_ratio=50, speed_scale=5.4),
+}
+
+
+def board_profile(name):
+    if name not in BOARDS:
+        raise ValueError("unknown board. Expected one of " + ", ".join(sorted(BOARDS)))
+    return BOARDS[name]
+
+
+def motor_profile(name):
+    if name not in MOTORS:
+        raise ValueError("unknown motor. Expected one of " + ", ".join(sorted(MOTORS)))
+    return MOTORS[name]
@@ -0,0 +1,137 @@
+# SPDX-License-Identifier: MIT
+
+import math
+
+# A class for finding PID gains for a motor by experiment, rather than by hand.
+#
+# Gains picked by hand for one motor leave others sluggish or oscillating. Instead, this runs
+# a relay experiment (Astrom and Hagglund's relay feedback): in place of the PID, update()
+# drives the loop with +amplitude while the value is below the setpoint and -amplitude while
+# it is above, which makes almost any motor settle into a steady oscillation around the
+# setpoint. The relay switches only once the value is hysteresis past the setpoint, so
+# encoder steps and noise do not make it chatter.
+#
+# The oscillation is measured between each switch to +amplitude. Its period is the ultimate
+# period, Tu, and from its peak-to-peak size the ultimate gain is found, the gain at which a
+# proportional controller would just oscillate:
+#
+#   Ku = 4 * amplitude / (pi * sqrt(a^2 - hysteresis^2))    where a is half the peak-to-peak
+#
+# The first settle_cycles cycles are ignored while the oscillation builds, then the next
+# cycles are averaged. gains() turns Ku and Tu into PID gains by one of two rules:
+#
+#   ZIEGLER_NICHOLS   Kp = 0.6 Ku, Ti = Tu / 2, Td = Tu / 8. Fast, but overshoots
+#   TYREUS_LUYBEN     Kp = Ku / 2.2, Ti = 2.2 Tu, Td = Tu / 6.3. Slower, with little overshoot
+#
+# The gains are returned as (kp, ki, kd), with ki = Kp / Ti and kd = Kp * Td, ready to give to
+# a PID or MultiPID of the loop that the relay stood in for.
+
+ZIEGLER_NICHOLS = 0
+TYREUS_LUYBEN = 1
+
+_INF = float("inf")
+
+# The proportional gain, integral time and derivative time of each rule, as multiples of Ku and Tu
+_RULES = (
+    (0.6, 0.5, 0.125),
+    (1 / 2.2, 2.2, 1 / 6.3),
+)
+
+
+class RelayTuner:
+    __slots__ = ("setpoint", "amplitude", "hysteresis", "cycles", "settle_cycles", "timeout", "ultimate_gain",
+                 "ultimate_period", "done", "_output", "_time", "_cycle_start", "_seen", "_min", "_max",
+                 "_periods", "_heights")
+
+    def __init__(self, amplitude, hysteresis=0.0, cycles=4, settle_cycles=2, timeout=30.0):
+        if amplitude <= 0:
+            raise ValueError("amplitude out of range. Expected greater than 0")
+        if cycles < 1:
+            raise ValueError("cycles out of range. Expected 1 or more")
+
+        self.setpoint = 0.0
+        self.amplitude = amplitude
+        self.hysteresis = hysteresis
+        self.cycles = cycles
+        self.settle_cycles = settle_cycles
+        self.timeout = timeout          # The seconds to give up after, if the oscillation has not been measured
+        self.reset()
+
+    # Start the experiment again
+    def reset(self):
+        self.ultimate_gain = None       # Ku, once the experiment is done
+        self.ultimate_period = None     # Tu in seconds, once the experiment is done
+        self.done = False
+        self._output = self.amplitude
+        self._time = 0.0
+        self._cycle_start = None
+        self._seen = 0
+        self._min = _INF
+        self._max = -_INF
+        self._periods = 0.0
+        self._heights = 0.0
+
+    # Whether the experiment finished without measuring the oscillation, such as from a timeout
+    @property
+    def failed(self):
+        return self.done and self.ultimate_gain is None
+
+    # Give the latest value, and the seconds since the last, and return the output to drive the
+    # loop with. Once done, this returns 0.0
+    def update(self, value, dt):
+        if self.done:
+            return 0.0
+
+        self._time += dt
+        if self._time > self.timeout:
+            self.done = True
+            return 0.0
+
+        if value < self._min:
+            self._min = value
+        if value > self._max:
+            self._max = value
+
+        error = self.setpoint - value
+        if self._output < 0.0 and error > self.hysteresis:
+            # The value has gone below the setpoint, so a new cycle starts
+            self._output = self.amplitude
+            self._cycle()
+        elif self._output > 0.0 and error < -self.hysteresis:
+            self._output = -self.amplitude
+
+        return 0.0 if self.done else self._output
+
+    def _cycle(self):
+        if self._cycle_start is not None:
+            self._seen += 1
+            if self._seen > self.settle_cycles:
+                self._periods += self._time - self._cycle_start
+                self._heights += (self._max - self._min) / 2
+                if self._seen >= self.settle_cycles + self.cycles:
+                    self._finish()
+        self._cycle_start = self._time
+        self._min = _INF
+        self._max = -_INF
+
+    def _finish(self):
+        self.done = True
+        height = self._heights / self.cycles
+        if height <= self.hysteresis:
+            return
+        self.ultimate_gain = (4 * self.amplitude) / (math.pi * math.sqrt((height * height) -
+                                                                         (self.hysteresis * self.hysteresis)))
+        self.ultimate_period = self._periods / self.cycles
+
+    # The (kp, ki, kd) gains given by a rule, once the experiment is done
+    def gains(self, rule=ZIEGLER_NICHOLS):
+        if self.ultimate_gain is None:
+            raise ValueError("no oscillation has been measured yet")
+        if not 0 <= rule < len(_RULES):
+            raise ValueError("rule out of range. Expected ZIEGLER_NICHOLS (0) or TYREUS_LUYBEN (1)")
+
+        gain, integral_time, derivative_time = _RULES[rule]
+        kp = gain * self.ultimate_gain
+        ti = integral_time * self.ultimate_period
+        td = derivative_time * self.ultimate_period
+        return (kp, kp / ti, kp * td)
@@ -0,0 +1,175 @@
+# SPDX-License-Identifier: MIT
+
+import time
+import asyncio
+
+# A class for running several periodic jobs at once, such as a control loop, a status LED
+# and a sensor scan, each at its own rate.
+#
+# Each job is a plain function, added with the number of times a second to call it and a
+# priority, and each runs in its own asyncio task, on a fixed grid of deadlines like
+# LoopTimer's. asyncio cannot interrupt a function once it has started, so priority works
+# by holding back: before a job runs, it checks whether any higher priority job is due
+# before it would finish (going by the time it usually takes, plus _DEFER_MARGIN_NS), and
+# if so waits until that one has run. Lower priority jobs therefore fill the slack between
+# the more important ones rather than delaying them. A run is only held back _MAX_DEFERS
+# times in a row before it goes ahead anyway, so a busy higher priority job cannot starve it,
+# and each job's deadlines are offset from those of the jobs above it, so it is rarely due
+# at the same moment as them in the first place.
+#
+# asyncio only sleeps to the nearest millisecond or so, so a job added with precise=True
+# sleeps through asyncio until just before its deadline, then waits out the rest itself,
+# holding everything else back for that short time. Use it for the control loop.
+#
+# Each job keeps stats of how it has been running, which report() prints. As jobs can run
+# late, each can read the time since its last run from its Job's dt, rather than assuming
+# its period.
+
+_NS_TO_S = 1 / 1000000000
+_PRECISE_NS = 2000000       # How long before its deadline a precise job stops sleeping through asyncio
+_DEFER_MARGIN_NS = 100000   # How much longer than usual a job's run is allowed for, when holding it back
+_MAX_DEFERS = 3             # The most times in a row a run is held back
+
+
+class Job:
+    __slots__ = ("func", "name", "priority", "precise", "period_ns", "deadline", "dt", "runs", "overruns", "deferred",
+                 "forced", "late_max_ns", "run_max_ns", "run_total_ns", "_last_start")
+
+    def __init__(self, func, updates, priority, name, precise):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.precise = precise
+        self.period_ns = 1000000000 // updates
+        self.deadline = 0
+        self.dt = self.period_ns * _NS_TO_S     # The seconds since the job's last run started
+        self._last_start = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.runs = 0           # How many times the job has run
+        self.overruns = 0       # How many runs finished after the next run was due
+        self.deferred = 0       # How many runs were held back for a higher priority job
+        self.forced = 0         # How many of those went ahead after being held back _MAX_DEFERS times
+        self.late_max_ns = 0    # The latest a run has started after its deadline
+        self.run_max_ns = 0     # The longest a run has taken
+        self.run_total_ns = 0
+
+    @property
+    def run_mean_ns(self):
+        return self.run_total_ns // self.runs if self.runs else 0
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs = []
+        self.running = False
+
+    # Add a function to call updates times a second. Higher priorities go first
+    def add(self, func, updates, priority=0, name=None, precise=False):
+        job = Job(func, updates, priority, name if name is not None else func.__name__, precise)
+        self.jobs.append(job)
+        return job
+
+    # Run the jobs until stop() is called (from one of the jobs) or the stop function given
+    # returns True, which is checked by a job of the lowest priority at check_updates a second
+    def run(self, stop=None, check_updates=20):
+        if stop is not None:
+            def check_stop():
+                if stop():
+                    self.stop()
+            self.add(check_stop, check_updates, priority=min(job.priority for job in self.jobs) - 1 if self.jobs else 0)
+        asyncio.run(self._main())
+
+    def stop(self):
+        self.running = False
+
+    async def _main(self):
+        self.running = True
+
+        # Offset the start of each priority by an even share of the shortest period (less the
+        # time a precise job waits out itself), so jobs of different priorities whose rates
+        # divide evenly do not fall due at the same moment
+        start = time.monotonic_ns()
+        priorities = sorted(set(job.priority for job in self.jobs), reverse=True)
+        spread = max(min(job.period_ns for job in self.jobs) - _PRECISE_NS, 0)
+        for job in self.jobs:
+            offset = (spread * priorities.index(job.priority)) // len(priorities)
+            job.deadline = start + job.period_ns + offset
+        await asyncio.gather(*[asyncio.create_task(self._loop(job)) for job in self.jobs])
+
+    # How long until a job more important than this one is due, in nanoseconds
+    def _time_to_higher(self, job, now):
+        soonest = None
+        for other in self.jobs:
+            if other.priority > job.priority:
+                remaining = other.deadline - now
+                if soonest is None or remaining < soonest:
+                    soonest = remaining
+        return soonest
+
+    async def _loop(self, job):
+        period = job.period_ns
+        while self.running:
+            # Sleep until the deadline
+            wait = job.deadline - time.monotonic_ns()
+            if job.precise:
+                if wait > _PRECISE_NS:
+                    await asyncio.sleep((wait - _PRECISE_NS) * _NS_TO_S)
+                wait = job.deadline - time.monotonic_ns()
+                if wait > 0:
+                    time.sleep(wait * _NS_TO_S)
+            elif wait > 0:
+                await asyncio.sleep(wait * _NS_TO_S)
+            else:
+                await asyncio.sleep(0)      # Give the other jobs a chance, even when running late
+
+            # Hold back while a more important job is due before this one would finish, but
+            # only so many times in a row
+            expected = job.run_mean_ns + _DEFER_MARGIN_NS
+            defers = 0
+            while self.running:
+                if defers >= _MAX_DEFERS:
+                    job.forced += 1
+                    break
+                until = self._time_to_higher(job, time.monotonic_ns())
+                if until is None or until > expected:
+                    break
+                defers += 1
+                await asyncio.sleep(max(until, 0) * _NS_TO_S)
+            if defers:
+                job.deferred += 1
+
+            if not self.running:
+                break
+
+            start = time.monotonic_ns()
+            if job._last_start is not None:
+                job.dt = (start - job._last_start) * _NS_TO_S
+            job._last_start = start
+            job.func()
+            end = time.monotonic_ns()
+
+            # Record how it went
+            late = start - job.deadline
+            if late > job.late_max_ns:
+                job.late_max_ns = late
+            taken = end - start
+            if taken > job.run_max_ns:
+                job.run_max_ns = taken
+            job.run_total_ns += taken
+            job.runs += 1
+
+            # Move on to the next deadline, skipping any that have been missed entirely
+            job.deadline += period
+            if end > job.deadline:
+                job.overruns += 1
+                if end - job.deadline >= period:
+                    job.deadline = end + period
+
+    # Print each job's stats, in microseconds
+    def report(self):
+        for job in self.jobs:
+            print(job.name, ": runs = ", job.runs, ", overruns = ", job.overruns, ", deferred = ", job.deferred,
+                  ", forced = ", job.forced, ", late max = ", job.late_max_ns // 1000, "us, run mean = ",
+                  job.run_mean_ns // 1000, "us, run max = ", job.run_max_ns // 1000, "us", sep="")
@@ -0,0 +1,74 @@
+# SPDX-License-Identifier: MIT
+
+import gc
+import time
+
+# A class for running the garbage collector when a loop has time to spare, rather than
+# whenever the heap happens to fill up.
+#
+# CircuitPython collects garbage automatically once the heap is full, which can take a few
+# milliseconds and lands on whichever update happened to allocate at the time. Given to a
+# LoopTimer, tick() is called with the slack left before each deadline, and collects only
+# when that slack is more than margin times the longest a collection has taken, and no more
+# often than every interval updates. A loop that keeps up with this never fills its heap,
+# so the automatic collector never needs to step in (it is left enabled as a safety net).
+#
+# gc.mem_free() is read before and after each collection, so the bytes allocated between
+# collections can be reported. An allocation-free loop should show zero per update. If the
+# heap was found to have more free than after the last collection, an automatic collection
+# must have run in between, which is counted instead.
+
+_NS_TO_US = 1 / 1000
+
+
+class SlackCollector:
+    __slots__ = ("interval", "margin", "collections", "automatic", "collect_max_ns", "allocated", "measured",
+                 "_since", "_free")
+
+    def __init__(self, interval=100, margin=2):
+        self.interval = interval
+        self.margin = margin
+        self.collections = 0        # How many times tick() has collected
+        self.automatic = 0          # How many automatic collections were spotted between those
+        self.collect_max_ns = 0     # The longest a collection has taken
+        self.allocated = 0          # The bytes allocated over the measured updates
+        self.measured = 0           # How many updates the allocations were measured over
+        self._since = 0
+        self._collect()
+
+    def _collect(self):
+        start = time.monotonic_ns()
+        gc.collect()
+        self._free = gc.mem_free()
+        taken = time.monotonic_ns() - start
+        if taken > self.collect_max_ns:
+            self.collect_max_ns = taken
+
+    # Called once per update with the nanoseconds left before the next deadline. Returns
+    # whether it collected, and so used up some of that time
+    def tick(self, slack_ns):
+        self._since += 1
+        if self._since < self.interval or slack_ns <= self.collect_max_ns * self.margin:
+            return False
+
+        free = gc.mem_free()
+        if free > self._free:
+            self.automatic += 1
+        else:
+            self.allocated += self._free - free
+            self.measured += self._since
+        self._collect()
+        self.collections += 1
+        self._since = 0
+        return True
+
+    # The average bytes allocated per update, between collections
+    @property
+    def allocated_per_update(self):
+        return self.allocated / self.measured if self.measured else 0.0
+
+    def report(self):
+        print("GC: collections = ", self.collections, ", automatic = ", self.automatic, ", collect max = ",
+              int(self.collect_max_ns * _NS_TO_US), "us, allocated = ", self.allocated, " bytes over ",
+              self.measured, " updates (", round(self.allocated_per_update, 1), " per update), free = ",
+              gc.mem_free(), sep="")
@@ -0,0 +1,130 @@
+# SPDX-License-Identifier: MIT
+
+import math
+
+# A class for measuring how well a control loop follows a series of steps in its setpoint.
+#
+# Picking between settings, such as PWM frequencies and decay modes, by watching a plot is
+# slow and hard to compare. Instead, start() is called at each step and update() with each
+# value that follows, and the usual measures of a step response are worked out as it goes,
+# without keeping the values themselves:
+#
+#   rise_time     The seconds taken to get from 10% to 90% of the way to each new setpoint,
+#                 averaged over the steps (steps that never get there are counted in missed)
+#   overshoot     The furthest past any setpoint it went, as a percentage of that step
+#   ripple        How much it wanders once settled, as the standard deviation from the
+#                 setpoint over the last settle_fraction of each step, averaged over the steps
+#   steady_error  How far from the setpoint it settled on average, over the same part
+#   current       The average of any currents given, in amps
+#
+# The deviations from the setpoint are summed rather than the values, so the sums stay
+# small and keep their precision in CircuitPython's floats.
+
+
+class StepResponse:
+    __slots__ = ("settle_fraction", "steps", "missed", "_rise_total", "_risen", "_overshoot", "_ripple_total",
+                 "_error_total", "_settled_steps", "_current_total", "_currents", "_from", "_size", "_target",
+                 "_elapsed", "_updates", "_settle_after", "_t10", "_t90", "_peak", "_sum", "_sum_squares",
+                 "_settled")
+
+    def __init__(self, settle_fraction=0.5):
+        self.settle_fraction = settle_fraction
+        self.reset()
+
+    # Forget all the steps measured so far
+    def reset(self):
+        self.steps = 0
+        self.missed = 0
+        self._rise_total = 0.0
+        self._risen = 0
+        self._overshoot = 0.0
+        self._ripple_total = 0.0
+        self._error_total = 0.0
+        self._settled_steps = 0
+        self._current_total = 0.0
+        self._currents = 0
+        self._size = None
+
+    # Begin a step from one value to another, that will last a number of updates
+    def start(self, from_value, to_value, updates):
+        self.finish()
+        self._from = from_value
+        self._size = to_value - from_value
+        self._target = to_value
+        self._elapsed = 0.0
+        self._updates = 0
+        self._settle_after = int(updates * (1 - self.settle_fraction))
+        self._t10 = None
+        self._t90 = None
+        self._peak = 0.0
+        self._sum = 0.0
+        self._sum_squares = 0.0
+        self._settled = 0
+
+    # Give the value (and optionally the current) after each update, and the seconds since the last
+    def update(self, value, dt, current=None):
+        if self._size is None:
+            return
+        self._elapsed += dt
+        self._updates += 1
+
+        if self._size != 0:
+            progress = (value - self._from) / self._size
+            if self._t10 is None and progress >= 0.1:
+                self._t10 = self._elapsed
+            if self._t90 is None and progress >= 0.9:
+                self._t90 = self._elapsed
+            if progress > self._peak:
+                self._peak = progress
+
+        if self._updates > self._settle_after:
+            error = value - self._target
+            self._sum += error
+            self._sum_squares += error * error
+            self._settled += 1
+
+        if current is not None:
+            self._current_total += current
+            self._currents += 1
+
+    # End the step being measured, adding it to the totals. start() calls this itself
+    def finish(self):
+        if self._size is None:
+            return
+        self.steps += 1
+        if self._size != 0:
+            if self._t10 is not None and self._t90 is not None:
+                self._rise_total += self._t90 - self._t10
+                self._risen += 1
+            else:
+                self.missed += 1
+            overshoot = (self._peak - 1.0) * 100
+            if overshoot > self._overshoot:
+                self._overshoot = overshoot
+
+        if self._settled > 0:
+            mean = self._sum / self._settled
+            self._error_total += abs(mean)
+            self._ripple_total += math.sqrt(max((self._sum_squares / self._settled) - (mean * mean), 0.0))
+            self._settled_steps += 1
+        self._size = None
+
+    @property
+    def rise_time(self):
+        return self._rise_total / self._risen if self._risen else None
+
+    @property
+    def overshoot(self):
+        return self._overshoot
+
+    @property
+    def ripple(self):
+        return self._ripple_total / self._settled_steps if self._settled_steps else None
+
+    @property
+    def steady_error(self):
+        return self._error_total / self._settled_steps if self._settled_steps else None
+
+    @property
+    def current(self):
+        return self._current_total / self._currents if self._currents else None
@@ -0,0 +1,152 @@
+# SPDX-License-Identifier: MIT
+
+import struct
+
+# A class for sending values from a control loop to a computer without slowing the loop.
+#
+# print() turns each value into text and waits for the USB serial to take it, which
+# stalls the loop on the updates that print. Instead, log() packs the values as binary
+# into a preallocated ring buffer, and drain() sends as much of the buffer as the USB
+# serial will take without waiting, so it can be called in the slack at the end of each
+# update. If the buffer fills up, the oldest samples are dropped and counted.
+#
+# Each frame is two sync bytes, a byte giving the number of values, a 16-bit sequence
+# number then the values as 32-bit floats, all little-endian. The names of the values are
+# sent every so often as header frames (with the top bit of the count byte set), split
+# into chunks the size of a sample frame's values, so a computer can start listening at
+# any time. tools/telemetry_decode.py turns the frames back into printed lines.
+#
+# The frames are sent over the USB serial data channel, which must be enabled in boot.py,
+# as binary sent to the console can be taken as a Ctrl-C and breaks Thonny's plotter. When
+# it is not enabled, or text is asked for (such as when the data channel is in use for
+# something else), Telemetry prints each sample as a line of text instead, as before.
+
+SYNC = b"\xa5\x5a"
+HEADER_FLAG = 0x80
+_FRAME_START = "<2sBH"
+_FRAME_START_SIZE = struct.calcsize(_FRAME_START)
+
+
+# A ring buffer of fixed-size frames, sent to a stream without waiting. If it fills up, the
+# oldest frame is dropped and counted. Telemetry and loop_trace.py's LoopTrace both send through one.
+# With no stream given, usb_cdc.data is used, or None if it is not enabled. Pass a stream to send elsewhere
+class FrameRing:
+    def __init__(self, frame_size, capacity, stream=None):
+        self.frame_size = frame_size
+        self.dropped = 0
+
+        self._buffer = bytearray(frame_size * capacity)
+        self._view = memoryview(self._buffer)
+        self._head = 0          # Where the next frame will be written
+        self._tail = 0          # Where the next byte to send is
+        self._used = 0          # How many bytes are waiting to be sent
+        self._sequence = 0
+
+        self._stream = stream if stream is not None else _default_stream()
+
+    def _reserve(self):
+        # Find the space for the next frame, dropping the oldest if the buffer is full
+        size = self.frame_size
+        if self._used + size > len(self._buffer):
+            dropped = size - (self._tail % size) if self._tail % size else size
+            self._tail = (self._tail + dropped) % len(self._buffer)
+            self._used -= dropped
+            self.dropped += 1
+        offset = self._head
+        self._head = (self._head + size) % len(self._buffer)
+        self._used += size
+        return offset
+
+    # Send as much of the logged data as the stream will take without waiting
+    def drain(self):
+        sent = 0
+        if self._stream is None:
+            return sent
+        while self._used > 0:
+            # Send up to the end of the buffer, then loop around for the rest
+            length = min(self._used, len(self._buffer) - self._tail)
+            written = self._stream.write(self._view[self._tail:self._tail + length])
+            if not written:
+                break
+            self._tail = (self._tail + written) % len(self._buffer)
+            self._used -= written
+            sent += written
+            if written < length:
+                break
+        return sent
+
+
+class Telemetry(FrameRing):
+    def __init__(self, names, capacity=128, stream=None, header_every=256, text=False):
+        if not 0 < len(names) < HEADER_FLAG:
+            raise ValueError("names must have between 1 and 127 entries")
+
+        if stream is None and not text:
+            stream = _default_stream()
+
+        self.count = len(names)
+        self.values = [0.0] * self.count      # Set these then call log() to log them
+        self.header_every = header_every
+        self.printing = stream is None        # Whether the values are printed as text rather than sent as frames
+        self._names = names
+        self._since_header = 0
+        super().__init__(_FRAME_START_SIZE + (4 * self.count), capacity if not self.printing else 0, stream)
+        if self.printing:
+            self._stream = None
+            return
+
+        # Split the names into frame-sized chunks, padded with spaces
+        text = (",".join(names) + "\n").encode()
+        payload = 4 * self.count
+        text += b" " * (-len(text) % payload)
+        self._header = [text[i:i + payload] for i in range(0, len(text), payload)]
+
+        self.log_header()
+
+    # Queue the names of the values, so a computer that has just started listening can read them
+    def log_header(self):
+        if self.printing:
+            return
+        for index in range(len(self._header)):
+            offset = self._reserve()
+            struct.pack_into(_FRAME_START, self._buffer, offset, SYNC, HEADER_FLAG | self.count, index)
+            start = offset + _FRAME_START_SIZE
+            self._buffer[start:start + len(self._header[index])] = self._header[index]
+        self._since_header = 0
+
+    # Log the current contents of values (or the values given) as one sample
+    def log(self, values=None):
+        if values is None:
+            values = self.values
+        if self.printing:
+            for i in range(self.count - 1):
+                print(self._names[i], "=", values[i], end=", ")
+            print(self._names[-1], "=", values[-1])
+            return
+        if self._since_header >= self.header_every:
+            self.log_header()
+
+        buffer = self._buffer
+        offset = self._reserve()
+        struct.pack_into(_FRAME_START, buffer, offset, SYNC, self.count, self._sequence)
+        offset += _FRAME_START_SIZE
+        for i in range(self.count):
+            struct.pack_into("<f", buffer, offset, values[i])
+            offset += 4
+
+        self._sequence = (self._sequence + 1) & 0xFFFF
+        self._since_header += 1
+
+
+def _default_stream():
+    # The USB serial data channel, or None if it is not enabled in boot.py (or there is no
+    # usb_cdc at all). Never the console, as binary sent to it could be taken as a Ctrl-C
+    try:
+        import usb_cdc
+    except ImportError:
+        return None
+
+    if usb_cdc.data is None:
+        return None
+    usb_cdc.data.write_timeout = 0
+    return usb_cdc.data
@@ -0,0 +1,157 @@
+# SPDX-License-Identifier: MIT
+
+import struct
+from array import array
+
+# A class for undoing the deadband and curve of a motor's throttle-to-speed response.
+#
+# The examples turn a wanted speed into a throttle by dividing by SPEED_SCALE, as if the
+# motor's speed were proportional to its throttle. It is not: below some throttle friction
+# holds the motor still (the deadband), and above it the curve bends, more so with FAST_DECAY
+# and at higher PWM frequencies. The PID then spends its effort pushing through the deadband
+# and around the curve, rather than on the disturbances it is there for.
+#
+# Instead, the examples work out a linear throttle as before (the wanted speed divided by
+# speed_scale), and throttle() looks up the real throttle that gives that speed, from tables
+# found by measuring the motor's steady speed across a sweep of throttles (see
+# motor2040/throttle_sweep.py). There is a table for each direction, holding the throttle at
+# evenly spaced speeds from 0 to speed_scale, with the first entry being the edge of the
+# deadband. Being evenly spaced, the lookup is a single index and interpolation, however many
+# entries there are. A linear throttle of exactly 0.0 stays 0.0, so a stopped motor is not
+# left sitting at the edge of its deadband.
+#
+# ThrottleMapStore keeps a map for each motor in microcontroller.nvm, after the gains that
+# gain_store.py's GainStore keeps there.
+
+DEFAULT_POINTS = 16         # The number of steps in each table, between its points
+
+_MARKER = b"THRM"
+
+
+class ThrottleMap:
+    __slots__ = ("speed_scale", "points", "forward", "reverse")
+
+    def __init__(self, speed_scale, forward, reverse):
+        if len(forward) != len(reverse) or len(forward) < 2:
+            raise ValueError("forward and reverse must have the same number of entries, and at least 2")
+
+        self.speed_scale = speed_scale              # The speed of a linear throttle of 1.0, in revolutions per second
+        self.points = len(forward) - 1
+        self.forward = array("f", forward)          # The throttles giving evenly spaced speeds from 0 to speed_scale
+        self.reverse = array("f", reverse)          # The same for reversing, as positive throttles
+
+    # Build a map from a sweep, being the throttles tried (from low to high) and the steady
+    # speeds they gave forwards and reversing (both as positive revolutions per second). The
+    # edge of the deadband is taken as the highest throttle that gave no more than min_speed
+    @staticmethod
+    def from_sweep(throttles, forward_speeds, reverse_speeds, speed_scale, points=DEFAULT_POINTS, min_speed=0.0):
+        return ThrottleMap(speed_scale, _invert(throttles, forward_speeds, speed_scale, points, min_speed),
+                           _invert(throttles, reverse_speeds, speed_scale, points, min_speed))
+
+    # The throttle that gives the speed of a linear throttle, from -1.0 to 1.0
+    def throttle(self, linear):
+        if linear == 0.0:
+            return 0.0
+        if linear > 0.0:
+            table = self.forward
+            position = linear * self.points
+        else:
+            table = self.reverse
+            position = -linear * self.points
+
+        index = int(position)
+        if index >= self.points:
+            throttle = table[self.points]
+        else:
+            low = table[index]
+            throttle = low + ((table[index + 1] - low) * (position - index))
+        return throttle if linear > 0.0 else -throttle
+
+
+def _invert(throttles, speeds, speed_scale, points, min_speed):
+    # Find the throttle giving each evenly spaced speed by interpolating between those swept,
+    # ignoring any dips in speed so the throttle only ever rises with it
+    deadband = 0.0
+    peak = []
+    fastest = 0.0
+    for i in range(len(throttles)):
+        fastest = max(fastest, speeds[i])
+        peak.append(fastest)
+        if speeds[i] <= min_speed:
+            deadband = throttles[i]
+
+    table = [deadband]
+    j = 0
+    for k in range(1, points + 1):
+        target = (speed_scale * k) / points
+        while j < len(throttles) and peak[j] < target:
+            j += 1
+        if j >= len(throttles):
+            table.append(1.0)       # Even full throttle is too slow, so give it all
+        elif j == 0 or peak[j] == peak[j - 1]:
+            table.append(max(throttles[j], deadband))
+        else:
+            fraction = (target - peak[j - 1]) / (peak[j] - peak[j - 1])
+            throttle = throttles[j - 1] + ((throttles[j] - throttles[j - 1]) * fraction)
+            table.append(max(throttle, deadband))
+    return table
+
+
+class ThrottleMapStore:
+    __slots__ = ("nvm", "offset", "channels", "points")
+
+    def __init__(self, nvm=None, offset=256, channels=4, points=DEFAULT_POINTS):
+        if nvm is None:
+            import microcontroller
+            nvm = microcontroller.nvm
+        self.nvm = nvm
+        self.offset = offset            # Where in nvm the store starts, clear of GainStore by default
+        self.channels = channels
+        self.points = points
+        if nvm is not None and offset + self.size > len(nvm):
+            raise ValueError("offset out of range. Expected the store to fit within nvm")
+
+    @property
+    def _slot_format(self):
+        return "<Bf%df" % (2 * (self.points + 1))
+
+    # The bytes of nvm the store takes up
+    @property
+    def size(self):
+        return len(_MARKER) + (struct.calcsize(self._slot_format) * self.channels)
+
+    def _slot(self, channel):
+        if not 0 <= channel < self.channels:
+            raise ValueError("channel out of range. Expected 0 to " + str(self.channels - 1))
+        return self.offset + len(_MARKER) + (struct.calcsize(self._slot_format) * channel)
+
+    def _marked(self):
+        return self.nvm is not None and self.nvm[self.offset:self.offset + len(_MARKER)] == _MARKER
+
+    # The map saved for a channel, or None if there is none
+    def load(self, channel):
+        start = self._slot(channel)
+        if not self._marked():
+            return None
+        values = struct.unpack(self._slot_format, bytes(self.nvm[start:start + struct.calcsize(self._slot_format)]))
+        if values[0] != 1:
+            return None
+        count = self.points + 1
+        return ThrottleMap(values[1], values[2:2 + count], values[2 + count:])
+
+    def save(self, channel, throttle_map):
+        if throttle_map.points != self.points:
+            raise ValueError("throttle_map has the wrong number of points. Expected " + str(self.points))
+        start = self._slot(channel)
+        if not self._marked():
+            self.clear()
+        data = struct.pack(self._slot_format, 1, throttle_map.speed_scale,
+                           *(tuple(throttle_map.forward) + tuple(throttle_map.reverse)))
+        self.nvm[start:start + len(data)] = data
+
+    # Forget every saved map
+    def clear(self):
+        if self.nvm is None:
+            raise RuntimeError("this board has no nvm to save to")
+        end = self.offset + self.size
+        self.nvm[self.offset:end] = _MARKER + bytes(end - self.offset - len(_MARKER))
@@ -0,0 +1,127 @@
+# SPDX-License-Identifier: MIT
+
+import math
+from array import array
+
+# The shapes of movement a Profile can follow between two values
+STEP = 0            # Jump straight to the end value
+LINEAR = 1          # Move at a constant rate
+COSINE = 2          # Ease in and out along half a cosine wave
+TRAPEZOID = 3       # Accelerate, cruise, then decelerate, within a velocity and acceleration limit
+SCURVE = 4          # As TRAPEZOID, but with the acceleration ramped in and out for a smoother start and stop
+
+
+# A class for generating the setpoints of a movement between two values, one per update.
+#
+# Rather than evaluating the shape of the movement (such as a cosine) on every update,
+# the shape is sampled once into a table of fractions from 0.0 to 1.0, so each update is
+# just a table lookup and a multiply-add to scale it between the start and end values.
+#
+# For STEP, LINEAR and COSINE the table only depends on the number of updates per move,
+# so it is built once and reused for every move. TRAPEZOID and SCURVE take as long as
+# their limits need for the distance being moved, so their table is rebuilt by move().
+# A move takes at least the given number of updates, holding at the end value if it
+# arrives early, and longer if the limits do not allow it to arrive in time.
+class Profile:
+    __slots__ = ("mode", "steps", "dt", "max_vel", "max_accel", "start", "delta", "updates", "_table")
+
+    def __init__(self, mode, steps, dt, max_vel=None, max_accel=None):
+        if mode not in (STEP, LINEAR, COSINE, TRAPEZOID, SCURVE):
+            raise ValueError("mode out of range. Expected STEP, LINEAR, COSINE, TRAPEZOID or SCURVE")
+        if mode >= TRAPEZOID and (not max_vel or not max_accel):
+            raise ValueError("TRAPEZOID and SCURVE need a max_vel and max_accel")
+        self.mode = mode
+        self.steps = steps
+        self.dt = dt
+        self.max_vel = max_vel
+        self.max_accel = max_accel
+        self.start = 0.0
+        self.delta = 0.0
+        self.updates = steps
+        self._table = array("f", [1.0] * (steps + 1))
+
+        if mode == LINEAR:
+            for i in range(steps + 1):
+                self._table[i] = i / steps
+        elif mode == COSINE:
+            for i in range(steps + 1):
+                self._table[i] = (1.0 - math.cos((i / steps) * math.pi)) / 2.0
+
+    # Start a new move between two values
+    def move(self, start, end):
+        self.start = start
+        self.delta = end - start
+        if self.mode >= TRAPEZOID:
+            self._build_limited(abs(self.delta))
+
+    def _build_limited(self, distance):
+        vel = self.max_vel
+        accel = self.max_accel
+        scurve = self.mode == SCURVE
+
+        # Find the peak velocity and how long to ramp up to it, dropping the peak if the
+        # distance is too short to reach the limit before needing to slow down again
+        if scurve:
+            ramp_time = (math.pi * vel) / (2.0 * accel)
+            if vel * ramp_time > distance:
+                vel = math.sqrt((2.0 * accel * distance) / math.pi)
+                ramp_time = (math.pi * vel) / (2.0 * accel)
+        else:
+            ramp_time = vel / accel
+            if vel * ramp_time > distance:
+                vel = math.sqrt(accel * distance)
+                ramp_time = vel / accel
+
+        if vel > 0:
+            cruise_time = (distance - (vel * ramp_time)) / vel
+        else:
+            ramp_time = cruise_time = 0.0
+        total_time = (2.0 * ramp_time) + cruise_time
+
+        self.updates = max(self.steps, math.ceil(total_time / self.dt))
+        if len(self._table) < self.updates + 1:
+            self._table = array("f", [1.0] * (self.updates + 1))
+        table = self._table
+
+        def ramp(t):
+            # The distance covered t seconds into speeding up
+            if scurve:
+                return (vel / 2.0) * (t - ((ramp_time / math.pi) * math.sin((math.pi * t) / ramp_time)))
+            return (vel * t * t) / (2.0 * ramp_time)
+
+        for i in range(self.updates + 1):
+            t = i * self.dt
+            if t >= total_time or distance == 0:
+                table[i] = 1.0
+            elif t < ramp_time:
+                table[i] = ramp(t) / distance
+            elif t < ramp_time + cruise_time:
+                table[i] = (ramp(ramp_time) + (vel * (t - ramp_time))) / distance
+            else:
+                table[i] = (distance - ramp(total_time - t)) / distance
+
+    # The fraction of the way along the move at an update, from 0.0 to 1.0
+    def fraction(self, update):
+        if update > self.updates:
+            update = self.updates
+        return self._table[update]
+
+    # The setpoint at an update of the move
+    def position(self, update):
+        if update > self.updates:
+            update = self.updates
+        return self.start + (self._table[update] * self.delta)
+
+    # The rate the setpoint is changing at an update of the move, per second
+    def velocity(self, update):
+        if update >= self.updates:
+            return 0.0
+        return ((self._table[update + 1] - self._table[update]) * self.delta) / self.dt
+
+    # The rate the setpoint's velocity is changing at an update of the move, per second
+    def acceleration(self, update):
+        if update >= self.updates:
+            return 0.0
+        before = self._table[update - 1] if update > 0 else self._table[0]
+        after = self._table[update + 1]
+        return (((after - self._table[update]) - (self._table[update] - before)) * self.delta) / (self.dt * self.dt)
@@ -0,0 +1,166 @@
+# SPDX-License-Identifier: MIT
+
+import time
+from array import array
+
+# A class for estimating the velocity of an encoder more finely than its counts per update.
+#
+# Dividing the change in counts by the update period can only give whole numbers of counts
+# per period, so at 100 updates per second a 600 count per rev encoder reads in steps of 1/6
+# of a rev per second, and a slow motor flickers between them. Instead, the count and time
+# of each change are kept in a ring of history entries, and the velocity is measured from
+# the oldest entry within max_window seconds of now to the newest. A fast motor changes
+# count on every update, so the ring covers only the last history updates and the velocity
+# still follows changes of speed closely, in steps 1 / (history - 1) of a single update's.
+# The slower the motor, the more updates the ring covers, up to max_window, so the window
+# widens as the speed drops. If it has been longer since the last count than the counts
+# were coming in, the motor must have slowed, so the velocity is reduced to at most one
+# count in that time, reaching zero once max_window passes with no counts.
+#
+# method says how precise the velocity is:
+#
+#   COUNTED  At least min_counts passed over the window, so it is precise at that speed.
+#   TIMED    Fewer than min_counts did, so it rests on the time between a few counts.
+#
+# Counts are only seen when update() is called, so their times are only as fine as the
+# update period, but spanning several updates spreads that error over a longer time.
+#
+# If alpha and beta are given, the velocity is then smoothed by an alpha-beta filter, which
+# also estimates the acceleration. Smaller values smooth more but lag more.
+
+COUNTED = 0
+TIMED = 1
+
+_REBASE_US = 1 << 29    # Rebase the times kept before they outgrow CircuitPython's small ints
+
+
+class VelocityEstimator:
+    __slots__ = ("units_per_count", "min_counts", "velocity", "acceleration", "method", "alpha", "beta",
+                 "_window_us", "_counts", "_times", "_newest", "_stored", "_origin_ns", "_last_count", "_last_us",
+                 "_raw")
+
+    def __init__(self, units_per_count=1.0, min_counts=4, max_window=0.25, history=4, alpha=None, beta=None):
+        if history < 2:
+            raise ValueError("history must be at least 2")
+
+        self.units_per_count = units_per_count
+        self.min_counts = min_counts
+        self.alpha = alpha
+        self.beta = beta
+        self._window_us = int(max_window * 1000000)
+        self._counts = array("l", [0] * history)
+        self._times = array("l", [0] * history)
+        self.reset()
+
+    @property
+    def max_window(self):
+        return self._window_us / 1000000
+
+    @max_window.setter
+    def max_window(self, value):
+        self._window_us = int(value * 1000000)
+
+    # Forget the counts seen so far, starting again from the given count as stationary
+    def reset(self, count=0, now_ns=None):
+        self.velocity = 0.0
+        self.acceleration = 0.0
+        self.method = TIMED
+        self._raw = 0.0
+        self._origin_ns = time.monotonic_ns() if now_ns is None else now_ns
+        self._last_count = count
+        self._last_us = 0
+        self._newest = 0
+        self._stored = 1
+        self._counts[0] = count
+        self._times[0] = 0
+
+    # Give the estimator the encoder's latest count, and the time it was read (from
+    # time.monotonic_ns(), or read now if not given). Returns the velocity in units per second
+    def update(self, count, now_ns=None):
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        now = (now_ns - self._origin_ns) // 1000
+        if now >= _REBASE_US:
+            now = self._rebase(now)
+
+        elapsed = now - self._last_us
+        if elapsed <= 0:
+            return self.velocity
+
+        counts = self._counts
+        times = self._times
+        change = count - self._last_count
+        if change != 0:
+            # Record when this count was seen
+            self._newest = (self._newest + 1) % len(counts)
+            counts[self._newest] = count
+            times[self._newest] = now
+            if self._stored < len(counts):
+                self._stored += 1
+
+        raw = self._measure(now) * self.units_per_count
+        dt = elapsed / 1000000
+        self._last_count = count
+        self._last_us = now
+        self._raw = raw
+
+        if self.alpha is None:
+            self.velocity = raw
+            return raw
+
+        # Predict the velocity from the last acceleration, then correct both by how far off that was
+        predicted = self.velocity + (self.acceleration * dt)
+        residual = raw - predicted
+        self.velocity = predicted + (self.alpha * residual)
+        self.acceleration += (self.beta * residual) / dt
+        return self.velocity
+
+    # The velocity before any filtering, in units per second
+    @property
+    def raw_velocity(self):
+        return self._raw
+
+    def _measure(self, now):
+        counts = self._counts
+        times = self._times
+        size = len(counts)
+        newest = self._newest
+        newest_count = counts[newest]
+        newest_time = times[newest]
+
+        since = now - newest_time
+        self.method = TIMED
+        if since >= self._window_us:
+            return 0.0
+
+        # Look back to the oldest count seen within the window, so the slower the motor, the
+        # longer the time the counts are measured over
+        span_counts = 0
+        span_time = 0
+        index = newest
+        for _ in range(self._stored - 1):
+            index = (index - 1) % size
+            if now - times[index] > self._window_us:
+                break
+            span_counts = newest_count - counts[index]
+            span_time = newest_time - times[index]
+
+        if span_counts == 0 or span_time <= 0:
+            return 0.0
+        if abs(span_counts) >= self.min_counts:
+            self.method = COUNTED
+
+        # If no count has come for longer than they were coming, the motor has slowed since
+        if since * abs(span_counts) > span_time:
+            return (1000000 if span_counts > 0 else -1000000) / since
+        return (span_counts * 1000000) / span_time
+
+    def _rebase(self, now):
+        # Move the origin forward so the times kept stay small
+        shift = now - self._window_us
+        self._origin_ns += shift * 1000
+        times = self._times
+        for i in range(len(times)):
+            times[i] = max(times[i] - shift, -_REBASE_US)     # Long forgotten counts stay forgotten
+        self._last_us -= shift
+        return now - shift
@@ -0,0 +1,152 @@
+# SPDX-License-Identifier: MIT
+
+import board
+import pwmio
+import rotaryio
+from adafruit_motor import motor
+from relay_tuner import RelayTuner, TYREUS_LUYBEN   # relay_tuner.py from this repo's lib folder
+from gain_store import GainStore, VELOCITY, POSITION   # gain_store.py from this repo's lib folder
+from throttle_map import ThrottleMapStore   # throttle_map.py from this repo's lib folder
+from velocity_estimator import VelocityEstimator   # velocity_estimator.py from this repo's lib folder
+from loop_timer import LoopTimer   # loop_timer.py from this repo's lib folder
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile, motor_profile   # profiles.py from this repo's lib folder
+
+# Find the velocity and position gains of each motor by experiment, and save them for
+# velocity_control.py, position_control.py and quad_velocity_sequence.py to use in place of
+# their own. Each motor is driven back and forth by a relay (see lib/relay_tuner.py), so make
+# sure it is free to turn. Press the user switch to stop early.
+
+# The board and motor being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("motor2040")
+MOTOR = motor_profile("mmme_50")
+
+# Setting constants
+FREQUENCY = MOTOR.frequency         # Chose a frequency above human hearing
+DECAY_MODE = MOTOR.decay_mode       # The decay mode affects how the motor
+                                    # responds, with SLOW_DECAY having improved spin
+                                    # threshold and speed-to-throttle linearity
+SPEED_SCALE = MOTOR.speed_scale     # The scaling to apply to the motor's speed to match its real-world speed
+DEGREES_PER_COUNT = MOTOR.degrees_per_count   # The degrees the output shaft turns for each count
+LINEARIZE = False                   # Whether to drive each motor through the map saved by throttle_sweep.py (if any). Match
+                                    # the LINEARIZE of the examples, so the gains found suit the motor as they will drive it
+
+UPDATES = 100                       # How many times to update the motor per second (the same as the examples being tuned for)
+REST_TIME = 1.0                     # How long to let each motor stop for between experiments, in seconds
+
+CHANNELS = (0,)                     # Which motors to tune, from 0 to 3 for A to D
+LOOPS = (VELOCITY, POSITION)        # Which loops to tune. VELOCITY (0), POSITION (1)
+RULE = TYREUS_LUYBEN                # How to turn what was measured into gains. ZIEGLER_NICHOLS (0) responds faster,
+                                    # TYREUS_LUYBEN (1) overshoots less
+SAVE = True                         # Whether to save the gains found, for the other examples to use
+
+# Relay experiment values
+CYCLES = 4                          # How many oscillations to average over
+SETTLE_CYCLES = 2                   # How many oscillations to ignore first, while they build
+TIMEOUT = 20.0                      # How long to give each experiment before giving up, in seconds
+
+VEL_SETPOINT = 2.0                  # The velocity to oscillate around, in revolutions per second
+VEL_RELAY = 20.0                    # The acceleration to drive with either side of it, in revolutions per second per second
+VEL_HYSTERESIS = 0.1                # How far past the setpoint to go before switching, in revolutions per second
+VEL_MIN_COUNTS = 4                  # The velocity estimator's values, as in velocity_control.py
+VEL_WINDOW = 0.25
+
+POS_RELAY = 1.0                     # The speed to drive with either side of the start position, in revolutions per second
+POS_HYSTERESIS = 1.0                # How far past the start position to go before switching, in degrees
+
+LOOP_NAMES = ("Velocity", "Position")
+RULE_NAMES = ("Ziegler-Nichols", "Tyreus-Luyben")
+
+# Create a buttons object for the user switch, which watches it in the background
+buttons = Buttons(board.USER_SW)
+
+# Create the store to save the gains in, and the store of throttle maps
+store = GainStore()
+map_store = ThrottleMapStore()
+
+# Create the loop timer, which keeps each update on schedule and measures the time between them
+timer = LoopTimer(UPDATES)
+
+
+def button_pressed():
+    return buttons.pressed()
+
+
+def rest(mot, seconds):
+    mot.throttle = 0.0
+    for _ in range(int(seconds * UPDATES)):
+        timer.wait()
+
+
+# Drive a motor in a relay experiment on one of its loops, returning the tuner once it is done
+# (or None if stopped early)
+def experiment(mot, encoder, loop, throttle_map):
+    if loop == VELOCITY:
+        tuner = RelayTuner(VEL_RELAY, VEL_HYSTERESIS, CYCLES, SETTLE_CYCLES, TIMEOUT)
+        tuner.setpoint = VEL_SETPOINT
+        estimator = VelocityEstimator(MOTOR.revs_per_count, VEL_MIN_COUNTS, VEL_WINDOW)
+    else:
+        tuner = RelayTuner(POS_RELAY, POS_HYSTERESIS, CYCLES, SETTLE_CYCLES, TIMEOUT)
+        tuner.setpoint = encoder.position * DEGREES_PER_COUNT
+
+    timer.restart()
+    if loop == VELOCITY:
+        estimator.reset(encoder.position, timer.now_ns)
+
+    throttle = 0.0
+    while not tuner.done:
+        dt = timer.wait()
+        if button_pressed():
+            return None
+
+        if loop == VELOCITY:
+            # Drive the acceleration, as velocity_control.py's PID does
+            vel = estimator.update(encoder.position, timer.now_ns)
+            accel = tuner.update(vel, dt)
+            throttle = max(min(throttle + ((accel * dt) / SPEED_SCALE), 1.0), -1.0)
+        else:
+            # Drive the speed, as position_control.py's PID does
+            vel = tuner.update(encoder.position * DEGREES_PER_COUNT, dt)
+            throttle = max(min(vel / SPEED_SCALE, 1.0), -1.0)
+        mot.throttle = throttle if throttle_map is None else throttle_map.throttle(throttle)
+
+    return tuner
+
+
+for index in CHANNELS:
+    # Create the motor and encoder objects
+    pin_p, pin_n = BOARD.motor_pins(index)
+    pwm_p = pwmio.PWMOut(pin_p, frequency=FREQUENCY)
+    pwm_n = pwmio.PWMOut(pin_n, frequency=FREQUENCY)
+    mot = motor.DCMotor(pwm_p, pwm_n)
+    mot.decay_mode = DECAY_MODE
+    pin_a, pin_b = BOARD.encoder_pins(index)
+    encoder = rotaryio.IncrementalEncoder(pin_b, pin_a, divisor=1)
+    throttle_map = map_store.load(index) if LINEARIZE else None
+
+    for loop in LOOPS:
+        tuner = experiment(mot, encoder, loop, throttle_map)
+        rest(mot, REST_TIME)
+        if tuner is None:
+            break
+
+        name = "Motor " + "ABCD"[index] + " " + LOOP_NAMES[loop]
+        if tuner.failed:
+            print(name, ": no steady oscillation found within ", TIMEOUT, "s", sep="")
+            continue
+
+        kp, ki, kd = tuner.gains(RULE)
+        print(name, ": Ku = ", tuner.ultimate_gain, ", Tu = ", tuner.ultimate_period, "s", sep="")
+        print(name, " ", RULE_NAMES[RULE], " gains: KP = ", kp, ", KI = ", ki, ", KD = ", kd, sep="")
+        if SAVE:
+            store.save(loop, index, (kp, ki, kd))
+
+    # Let the motor spin freely, and free its pins for the next
+    mot.throttle = None
+    pwm_p.deinit()
+    pwm_n.deinit()
+    encoder.deinit()
+    if tuner is None:
+        break
+
+print("Done")
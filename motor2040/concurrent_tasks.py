@@ -0,0 +1,186 @@
+# SPDX-License-Identifier: MIT
+
+import board
+import random
+import pwmio
+import digitalio
+import rotaryio
+import neopixel
+from analogio import AnalogIn
+from adafruit_motor import motor
+from pid import PID   # pid.py from this repo's lib folder
+from trajectory import Profile   # trajectory.py from this repo's lib folder
+from telemetry import Telemetry   # telemetry.py from this repo's lib folder
+from velocity_estimator import VelocityEstimator   # velocity_estimator.py from this repo's lib folder
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile, motor_profile   # profiles.py from this repo's lib folder
+from scheduler import Scheduler   # scheduler.py from this repo's lib folder (needs asyncio and adafruit_ticks from the bundle)
+
+# This runs the velocity control of velocity_control.py, a status LED and a scan of the
+# board's sensors all at once, as jobs of a Scheduler. The control job has the highest
+# priority and waits precisely for its deadlines, and the others fill the time around it.
+# When the user switch is pressed, the time each job took is printed.
+
+# The board and motor being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("motor2040")
+MOTOR = motor_profile("mmme_50")
+
+# Pin constants
+MOTOR_P, MOTOR_N = BOARD.motor_pins(0)
+CHANNEL_A, CHANNEL_B = BOARD.encoder_pins(0)
+
+# Setting constants
+FREQUENCY = MOTOR.frequency         # Chose a frequency above human hearing
+DECAY_MODE = MOTOR.decay_mode       # The decay mode affects how the motor
+                                    # responds, with SLOW_DECAY having improved spin
+                                    # threshold and speed-to-throttle linearity
+SPEED_SCALE = MOTOR.speed_scale     # The scaling to apply to each motor's speed to match its real-world speed
+
+CONTROL_UPDATES = 100               # How many times to update the motor per second
+LED_UPDATES = 30                    # How many times to update the LED per second
+SENSOR_UPDATES = 40                 # How many sensors to read per second (one at a time)
+TELEMETRY_UPDATES = 50              # How many times to send the logged values per second
+TIME_FOR_EACH_MOVE = 1              # The time to travel between each random value
+UPDATES_PER_MOVE = TIME_FOR_EACH_MOVE * CONTROL_UPDATES
+PRINT_DIVIDER = 4                   # How many of the updates should be logged (i.e. 2 would be every other update)
+
+VELOCITY_EXTENT = 3                 # How far from zero to drive the motor at, in revolutions per second
+INTERP_MODE = 2                     # The interpolating mode between setpoints. STEP (0), LINEAR (1), COSINE (2), TRAPEZOID (3), SCURVE (4)
+
+# PID values
+VEL_KP = 30.0                       # Velocity proportional (P) gain
+VEL_KI = 0.0                        # Velocity integral (I) gain
+VEL_KD = 0.4                        # Velocity derivative (D) gain
+
+# Job priorities (higher goes first)
+CONTROL_PRIORITY = 3
+SENSOR_PRIORITY = 2
+LED_PRIORITY = 1
+TELEMETRY_PRIORITY = 1
+
+# Create a buttons object for the user switch, which watches it in the background
+buttons = Buttons(board.USER_SW)
+
+# Create the pwm and objects
+pwm_p = pwmio.PWMOut(MOTOR_P, frequency=FREQUENCY)
+pwm_n = pwmio.PWMOut(MOTOR_N, frequency=FREQUENCY)
+mot = motor.DCMotor(pwm_p, pwm_n)
+
+# Set the motor decay modes (if unset the default will be FAST_DECAY)
+mot.decay_mode = DECAY_MODE
+
+# Create the encoder object
+encoder = rotaryio.IncrementalEncoder(CHANNEL_B, CHANNEL_A, divisor=1)
+
+# Create the LED object
+led = neopixel.NeoPixel(board.LED_DATA, board.NUM_LEDS, brightness=0.3, auto_write=False)
+
+# Create the sensor mux and ADC objects
+addr_pins = []
+for pin in (board.ADC_ADDR_0, board.ADC_ADDR_1, board.ADC_ADDR_2):
+    addr_pin = digitalio.DigitalInOut(pin)
+    addr_pin.direction = digitalio.Direction.OUTPUT
+    addr_pins.append(addr_pin)
+analog_in = AnalogIn(board.SHARED_ADC)
+
+
+def button_pressed():
+    return buttons.pressed()
+
+
+def select(address):
+    addr_pins[0].value = address & 0b001
+    addr_pins[1].value = address & 0b010
+    addr_pins[2].value = address & 0b100
+
+
+# Create PID object for velocity control
+vel_pid = PID(VEL_KP, VEL_KI, VEL_KD, 1 / CONTROL_UPDATES)
+
+# Create the profile to move between the values with
+profile = Profile(INTERP_MODE, UPDATES_PER_MOVE, 1 / CONTROL_UPDATES)
+end_value = random.uniform(-VELOCITY_EXTENT, VELOCITY_EXTENT)
+profile.move(0.0, end_value)
+
+# Create the velocity estimator, to give finer velocities than whole counts per update
+estimator = VelocityEstimator(MOTOR.revs_per_count)
+estimator.reset(encoder.position)
+
+# Create the telemetry to log values to (needs usb_cdc.data enabled in boot.py, otherwise they are
+# printed). Run tools/telemetry_decode.py on your computer to read them
+telemetry = Telemetry(("Vel", "Vel SP", "Speed", "Voltage", "Current"))
+
+# The state shared between the jobs
+update = 0
+print_count = 0
+sensor = 0
+voltage = 0.0
+current = 0.0
+
+# Initialise the motor
+mot.throttle = 0.0
+
+
+# The control job, which is velocity_control.py's loop
+def control():
+    global update, print_count, end_value
+
+    # Find how long it has been since the last update, as the job may have run late
+    dt = control_job.dt
+
+    vel = estimator.update(encoder.position)
+    vel_pid.setpoint = profile.position(update)
+    accel = vel_pid.calculate(vel, dt)
+    mot.throttle = max(min(mot.throttle + ((accel * dt) / SPEED_SCALE), 1.0), -1.0)
+
+    # Log the current motor values and their setpoints, but only on every multiple
+    if print_count == 0:
+        telemetry.values[0] = vel
+        telemetry.values[1] = vel_pid.setpoint
+        telemetry.values[2] = mot.throttle * SPEED_SCALE
+        telemetry.values[3] = voltage
+        telemetry.values[4] = current
+        telemetry.log()
+    print_count = (print_count + 1) % PRINT_DIVIDER
+
+    update += 1
+    if update >= profile.updates:
+        update = 0
+        start_value = end_value
+        end_value = random.uniform(-VELOCITY_EXTENT, VELOCITY_EXTENT)
+        profile.move(start_value, end_value)
+
+
+# The sensor job, which reads the voltage sense or the motor's current sense in turn
+def scan_sensors():
+    global sensor, voltage, current
+
+    if sensor == 0:
+        select(board.VOLTAGE_SENSE_ADDR)
+        voltage = BOARD.supply_volts(analog_in.value)
+    else:
+        select(board.CURRENT_SENSE_A_ADDR)
+        current = BOARD.amps(analog_in.value)
+    sensor = (sensor + 1) % 2
+
+
+# The LED job, which shows how closely the motor is following its setpoint, from green to red
+def update_led():
+    error = min(abs(vel_pid.setpoint - estimator.velocity), 1.0)
+    led.fill((int(255 * error), int(255 * (1.0 - error)), 0))
+    led.show()
+
+
+# Set up the jobs and run them until the user switch is pressed
+scheduler = Scheduler()
+control_job = scheduler.add(control, CONTROL_UPDATES, CONTROL_PRIORITY, precise=True)
+scheduler.add(scan_sensors, SENSOR_UPDATES, SENSOR_PRIORITY)
+scheduler.add(update_led, LED_UPDATES, LED_PRIORITY)
+scheduler.add(telemetry.drain, TELEMETRY_UPDATES, TELEMETRY_PRIORITY, name="telemetry")
+scheduler.run(button_pressed)
+
+# Stop the motor and report how each job ran
+mot.throttle = 0.0
+led.fill((0, 0, 0))
+led.show()
+scheduler.report()
@@ -1,119 +1,53 @@
 # SPDX-License-Identifier: MIT
 
-import time
 import board
 import pwmio
-import digitalio
 from adafruit_motor import motor
+from motor_sequence import MotorSequence   # motor_sequence.py and loop_timer.py from this repo's lib folder
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile, motor_profile   # profiles.py from this repo's lib folder
+
+# The board and motor being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("motor2040")
+MOTOR = motor_profile("mmme_50")
 
 # Motor constants
-FREQUENCY = 25000               # Chose a frequency above human hearing
-DECAY_MODE = motor.SLOW_DECAY   # The decay mode affects how the motor
+FREQUENCY = MOTOR.frequency     # Chose a frequency above human hearing
+DECAY_MODE = MOTOR.decay_mode   # The decay mode affects how the motor
                                 # responds, with SLOW_DECAY having improved spin
                                 # threshold and speed-to-throttle linearity
 
-# Create a digitalinout object for the user switch
-user_sw = digitalio.DigitalInOut(board.USER_SW)
-user_sw.direction = digitalio.Direction.INPUT
-user_sw.pull = digitalio.Pull.UP
-
-# Create the pwm objects
-pwm_a_p = pwmio.PWMOut(board.MOTOR_A_P, frequency=FREQUENCY)
-pwm_a_n = pwmio.PWMOut(board.MOTOR_A_N, frequency=FREQUENCY)
-pwm_b_p = pwmio.PWMOut(board.MOTOR_B_P, frequency=FREQUENCY)
-pwm_b_n = pwmio.PWMOut(board.MOTOR_B_N, frequency=FREQUENCY)
-pwm_c_p = pwmio.PWMOut(board.MOTOR_C_P, frequency=FREQUENCY)
-pwm_c_n = pwmio.PWMOut(board.MOTOR_C_N, frequency=FREQUENCY)
-pwm_d_p = pwmio.PWMOut(board.MOTOR_D_P, frequency=FREQUENCY)
-pwm_d_n = pwmio.PWMOut(board.MOTOR_D_N, frequency=FREQUENCY)
+# The sequence to run, as the time to spend on each step in seconds and the throttle
+# to give each motor (0 to stop, or None to spin freely)
+SEQUENCE = (
+    (1.0, (0.5, 0.5, 0.5, 0.5)),        # Forward slow
+    (1.0, (0, 0, 0, 0)),                # Stop
+    (1.0, (1.0, 1.0, 1.0, 1.0)),        # Forward fast
+    (1.0, (None, None, None, None)),    # Spin freely
+    (1.0, (-0.5, -0.5, -0.5, -0.5)),    # Backwards slow
+    (1.0, (0, 0, 0, 0)),                # Stop
+    (1.0, (-1.0, -1.0, -1.0, -1.0)),    # Backwards fast
+    (1.0, (None, None, None, None)),    # Spin freely
+)
+
+# Create a buttons object for the user switch, which watches it in the background
+buttons = Buttons(board.USER_SW)
 
 # Create the motor objects
-mot_a = motor.DCMotor(pwm_a_p, pwm_a_n)
-mot_b = motor.DCMotor(pwm_b_p, pwm_b_n)
-mot_c = motor.DCMotor(pwm_c_p, pwm_c_n)
-mot_d = motor.DCMotor(pwm_d_p, pwm_d_n)
-
-# Set the motor decay modes (if unset the default will be FAST_DECAY)
-mot_a.decay_mode = DECAY_MODE
-mot_b.decay_mode = DECAY_MODE
-mot_c.decay_mode = DECAY_MODE
-mot_d.decay_mode = DECAY_MODE
+motors = []
+for i in range(board.NUM_MOTORS):
+    pin_p, pin_n = BOARD.motor_pins(i)
+    mot = motor.DCMotor(pwmio.PWMOut(pin_p, frequency=FREQUENCY), pwmio.PWMOut(pin_n, frequency=FREQUENCY))
+    mot.decay_mode = DECAY_MODE     # If unset the default will be FAST_DECAY
+    motors.append(mot)
 
 
 def button_pressed():
-    return not user_sw.value
-
-
-# Run the motor sequence
-while True:
-    # Forward slow
-    mot_a.throttle = 0.5
-    mot_b.throttle = 0.5
-    mot_c.throttle = 0.5
-    mot_d.throttle = 0.5
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
-
-    # Stop
-    mot_a.throttle = 0
-    mot_b.throttle = 0
-    mot_c.throttle = 0
-    mot_d.throttle = 0
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
-
-    # Forward fast
-    mot_a.throttle = 1.0
-    mot_b.throttle = 1.0
-    mot_c.throttle = 1.0
-    mot_d.throttle = 1.0
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
-
-    # Spin freely
-    mot_a.throttle = None
-    mot_b.throttle = None
-    mot_c.throttle = None
-    mot_d.throttle = None
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
-
-    # Backwards slow
-    mot_a.throttle = -0.5
-    mot_b.throttle = -0.5
-    mot_c.throttle = -0.5
-    mot_d.throttle = -0.5
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
+    return buttons.pressed()
 
-    # Stop
-    mot_a.throttle = 0
-    mot_b.throttle = 0
-    mot_c.throttle = 0
-    mot_d.throttle = 0
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
 
-    # Backwards fast
-    mot_a.throttle = -1.0
-    mot_b.throttle = -1.0
-    mot_c.throttle = -1.0
-    mot_d.throttle = -1.0
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
+# Create the sequence, which checks the button every 5ms while it plays
+sequence = MotorSequence(motors, SEQUENCE, updates=200)
 
-    # Spin freely
-    mot_a.throttle = None
-    mot_b.throttle = None
-    mot_c.throttle = None
-    mot_d.throttle = None
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
+# Run the motor sequence until the button is pressed
+sequence.play(button_pressed)
@@ -0,0 +1,65 @@
+# SPDX-License-Identifier: MIT
+
+import time
+from pid import PID   # pid.py from this repo's lib folder
+from fixed_point import FixedPID   # fixed_point.py from this repo's lib folder
+
+# Benchmark constants
+CALLS = 5000                        # How many calculate() calls to time for each PID
+UPDATE_RATE = 1 / 100               # The sample rate to give each PID
+
+# PID values (the same as velocity_control.py)
+VEL_KP = 30.0                       # Velocity proportional (P) gain
+VEL_KI = 0.1                        # Velocity integral (I) gain
+VEL_KD = 0.4                        # Velocity derivative (D) gain
+
+
+# The PID class the examples used before pid.py, kept here for comparison
+class OriginalPID:
+    def __init__(self, kp, ki, kd, sample_rate):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.setpoint = 0
+        self._error_sum = 0
+        self._last_value = 0
+        self._sample_rate = sample_rate
+
+    def calculate(self, value):
+        error = self.setpoint - value
+        self._error_sum += error * self._sample_rate
+        rate_error = (value - self._last_value) / self._sample_rate
+        self._last_value = value
+
+        return (error * self.kp) + (self._error_sum * self.ki) - (rate_error * self.kd)
+
+
+def time_pid(pid):
+    pid.setpoint = 1.5
+    value = 0.0
+    start = time.monotonic_ns()
+    for _ in range(CALLS):
+        value += pid.calculate(value) * 0.0001
+    return (time.monotonic_ns() - start) / CALLS
+
+
+# The same as time_pid(), but with the values and output in integers scaled by 1000, so no
+# floats are involved. The two scalings cancel out, so FixedPID's scale is 1
+def time_fixed_pid(pid):
+    pid.setpoint = 1500
+    value = 0
+    start = time.monotonic_ns()
+    for _ in range(CALLS):
+        value += pid.calculate(value) // 10000
+    return (time.monotonic_ns() - start) / CALLS
+
+
+original_ns = time_pid(OriginalPID(VEL_KP, VEL_KI, VEL_KD, UPDATE_RATE))
+shared_ns = time_pid(PID(VEL_KP, VEL_KI, VEL_KD, UPDATE_RATE))
+limited_ns = time_pid(PID(VEL_KP, VEL_KI, VEL_KD, UPDATE_RATE, output_limit=10.0))
+fixed_ns = time_fixed_pid(FixedPID(VEL_KP, VEL_KI, VEL_KD, UPDATE_RATE, scale=1.0, output_limit=10000))
+
+print("Original PID =", round(original_ns / 1000, 2), "us per call")
+print("Shared PID =", round(shared_ns / 1000, 2), "us per call")
+print("Shared PID with limits =", round(limited_ns / 1000, 2), "us per call")
+print("Fixed-point PID with limits =", round(fixed_ns / 1000, 2), "us per call")
@@ -1,50 +1,70 @@
 # SPDX-License-Identifier: MIT
 
-import time
 import board
-import math
 import random
 import pwmio
-import digitalio
 import rotaryio
 from adafruit_motor import motor
+from pid import PID   # pid.py from this repo's lib folder
+from trajectory import Profile   # trajectory.py from this repo's lib folder
+from loop_timer import LoopTimer   # loop_timer.py from this repo's lib folder
+from telemetry import Telemetry   # telemetry.py from this repo's lib folder
+from fixed_point import FixedPID, FixedProfile, FULL_DUTY, set_duty   # fixed_point.py from this repo's lib folder
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile, motor_profile   # profiles.py from this repo's lib folder
+from gain_store import GainStore, POSITION   # gain_store.py from this repo's lib folder
+from throttle_map import ThrottleMapStore   # throttle_map.py from this repo's lib folder
+from motion_queue import MotionQueue, MotionLink   # motion_queue.py from this repo's lib folder
+
+# The board and motor being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("motor2040")
+MOTOR = motor_profile("mmme_50")
 
 # Pin constants
-MOTOR_P = board.MOTOR_A_P
-MOTOR_N = board.MOTOR_A_N
-CHANNEL_A = board.ENCODER_A_A
-CHANNEL_B = board.ENCODER_A_B
+MOTOR_P, MOTOR_N = BOARD.motor_pins(0)
+CHANNEL_A, CHANNEL_B = BOARD.encoder_pins(0)
 
 # Setting constants
-FREQUENCY = 25000                   # Chose a frequency above human hearing
-DECAY_MODE = motor.SLOW_DECAY       # The decay mode affects how the motor
+FREQUENCY = MOTOR.frequency         # Chose a frequency above human hearing
+DECAY_MODE = MOTOR.decay_mode       # The decay mode affects how the motor
                                     # responds, with SLOW_DECAY having improved spin
                                     # threshold and speed-to-throttle linearity
-GEAR_RATIO = 50                     # The gear ratio of the motor
-COUNTS_PER_REV = 12 * GEAR_RATIO    # The counts per revolution of the motor's output shaft
+DEGREES_PER_COUNT = MOTOR.degrees_per_count   # The degrees the output shaft turns for each count
 UPDATES = 100                       # How many times to update the motor per second
 UPDATE_RATE = 1 / UPDATES
 TIME_FOR_EACH_MOVE = 1              # The time to travel between each random value
 UPDATES_PER_MOVE = TIME_FOR_EACH_MOVE * UPDATES
-PRINT_DIVIDER = 4                   # How many of the updates should be printed (i.e. 2 would be every other update)
-SPEED_SCALE = 5.4                   # The scaling to apply to the motor's speed to match its real-world speed
+PRINT_DIVIDER = 4                   # How many of the updates should be logged (i.e. 2 would be every other update)
+SPEED_SCALE = MOTOR.speed_scale     # The scaling to apply to the motor's speed to match its real-world speed
+LINEARIZE = False                   # Whether to drive the motor through the map saved by throttle_sweep.py (if any), to undo
+                                    # its deadband and curve. This is not used with FIXED_POINT
 
-# Multipliers for the different printed values, so they appear nicely on the Thonny plotter
+# Multipliers for the different logged values, so they appear nicely on the Thonny plotter
 SPD_PRINT_SCALE = 20                # Driving Speed multipler
 
 POSITION_EXTENT = 180               # How far from zero to move the motor, in degrees
-INTERP_MODE = 2                     # The interpolating mode between setpoints. STEP (0), LINEAR (1), COSINE (2)
+INTERP_MODE = 2                     # The interpolating mode between setpoints. STEP (0), LINEAR (1), COSINE (2), TRAPEZOID (3), SCURVE (4)
+PROFILE_MAX_VEL = 540.0             # The fastest the setpoint may move, in degrees per second (TRAPEZOID and SCURVE only)
+PROFILE_MAX_ACCEL = 2160.0          # The fastest the setpoint may accelerate, in degrees per second per second (TRAPEZOID and SCURVE only)
+FIXED_POINT = False                 # Whether to run the control in integers (encoder counts and duty cycles) rather than floats,
+                                    # to avoid the RP2040's slow software floats. Streamed moves are still converted to counts in floats
+STREAM = False                      # Whether to follow moves streamed from tools/motion_stream.py --axes 1 rather than random ones
+                                    # (needs usb_cdc.data enabled in boot.py). Their speeds are only fed forward without FIXED_POINT
+QUEUE_CAPACITY = 32                 # How many streamed moves to hold, so the stream can fall behind for a while
 
 
 # PID values
 POS_KP = 0.14                       # Position proportional (P) gain
 POS_KI = 0.0                        # Position integral (I) gain
 POS_KD = 0.0022                     # Position derivative (D) gain
+TUNED_GAINS = False                 # Whether to use the gains saved by autotune.py for this motor (if any) in place of these
 
-# Create a digitalinout object for the user switch
-user_sw = digitalio.DigitalInOut(board.USER_SW)
-user_sw.direction = digitalio.Direction.INPUT
-user_sw.pull = digitalio.Pull.UP
+# Load any saved gains
+if TUNED_GAINS:
+    POS_KP, POS_KI, POS_KD = GainStore().load(POSITION, 0, (POS_KP, POS_KI, POS_KD))
+
+# Create a buttons object for the user switch, which watches it in the background
+buttons = Buttons(board.USER_SW)
 
 # Create the pwm and objects
 pwm_p = pwmio.PWMOut(MOTOR_P, frequency=FREQUENCY)
@@ -57,37 +77,29 @@ mot.decay_mode = DECAY_MODE
 # Create the encoder object
 encoder = rotaryio.IncrementalEncoder(CHANNEL_B, CHANNEL_A, divisor=1)
 
-
-# A simple class for handling Proportional, Integral & Derivative (PID) control calculations
-class PID:
-    def __init__(self, kp, ki, kd, sample_rate):
-        self.kp = kp
-        self.ki = ki
-        self.kd = kd
-        self.setpoint = 0
-        self._error_sum = 0
-        self._last_value = 0
-        self._sample_rate = sample_rate
-
-    def calculate(self, value):
-        error = self.setpoint - value
-        self._error_sum += error * self._sample_rate
-        rate_error = (value - self._last_value) / self._sample_rate
-        self._last_value = value
-
-        return (error * self.kp) + (self._error_sum * self.ki) - (rate_error * self.kd)
+# Load the motor's throttle map, if it has one
+throttle_map = ThrottleMapStore().load(0) if LINEARIZE else None
 
 
 def button_pressed():
-    return not user_sw.value
+    return buttons.pressed()
 
 
 def to_degrees(position):
-    return (position * 360.0) / COUNTS_PER_REV
+    return position * DEGREES_PER_COUNT
 
 
-# Create PID object for position control
-pos_pid = PID(POS_KP, POS_KI, POS_KD, UPDATE_RATE)
+COUNTS_PER_DEGREE = MOTOR.counts_per_degree
+
+if FIXED_POINT:
+    # Create an integer PID object for position control, working from encoder counts to duty cycles.
+    # The scale folds the conversions either side of it into its gains, so they are done once here
+    pos_pid = FixedPID(POS_KP, POS_KI, POS_KD, UPDATE_RATE,
+                       scale=(FULL_DUTY / SPEED_SCALE) / COUNTS_PER_DEGREE, output_limit=FULL_DUTY)
+else:
+    # Create PID object for position control, limiting its output to the full motor speed. This is where
+    # the throttle was clamped to anyway, so the logged Speed is the same, but it also stops the integral winding up
+    pos_pid = PID(POS_KP, POS_KI, POS_KD, UPDATE_RATE, output_limit=SPEED_SCALE)
 
 update = 0
 print_count = 0
@@ -96,36 +108,82 @@ print_count = 0
 start_value = 0.0
 end_value = random.uniform(-POSITION_EXTENT, POSITION_EXTENT)
 
-# Run until the user switch is pressed
-while not button_pressed():
+# Create the profile to move between the values with, sampling its shape once rather than every update
+profile = Profile(INTERP_MODE, UPDATES_PER_MOVE, UPDATE_RATE, PROFILE_MAX_VEL, PROFILE_MAX_ACCEL)
+profile.move(start_value, end_value)
 
-    # Capture the state of the encoder
-    angle = to_degrees(encoder.position)
+# Or sample its setpoints into encoder counts, so following it needs no floats
+fixed_profile = FixedProfile(profile, COUNTS_PER_DEGREE) if FIXED_POINT else None
 
-    # Calculate how far along this movement to be
-    percent_along = min(update / UPDATES_PER_MOVE, 1.0)
+# Create the telemetry to log values to, rather than printing them (needs usb_cdc.data enabled in
+# boot.py, otherwise they are printed). Run tools/telemetry_decode.py on your computer to turn them
+# back into lines of text for reading or plotting. Streamed moves arrive over usb_cdc.data, which
+# tools/motion_stream.py holds open, so then the values are printed to the console instead
+telemetry = Telemetry(("Pos", "Pos SP", "Speed"), text=STREAM)
 
-    if INTERP_MODE == 0:
-        # Move the motor instantly to the end value
-        pos_pid.setpoint = end_value
-    elif INTERP_MODE == 2:
-        # Move the motor between values using cosine
-        pos_pid.setpoint = (((-math.cos(percent_along * math.pi) + 1.0) / 2.0) * (end_value - start_value)) + start_value
+# Or create the queue of streamed moves, starting from where the motor is, and the link that fills it
+queue = None
+link = None
+if STREAM:
+    queue = MotionQueue(1, QUEUE_CAPACITY, (to_degrees(encoder.position),))
+    link = MotionLink(queue)
+
+# Create the loop timer, which keeps each update on schedule and measures the time between them
+timer = LoopTimer(UPDATES)
+
+# Run until the user switch is pressed
+while not button_pressed():
+
+    # Wait until it is time for the next update, and find how long it has been since the last one
+    dt = timer.wait()
+
+    # Move along the streamed moves
+    if queue is not None:
+        queue.update(dt)
+
+    if FIXED_POINT:
+        # Capture the state of the encoder, leaving it in counts
+        count = encoder.position
+
+        # Look up where along this movement to be, already in counts, or convert the streamed one to the nearest count
+        if queue is not None:
+            pos_pid.setpoint = round(queue.positions[0] * COUNTS_PER_DEGREE)
+        else:
+            pos_pid.setpoint = fixed_profile.position(update)
+
+        # Calculate the duty cycle to move the motor closer to the position setpoint, and apply it
+        duty = pos_pid.calculate(count, timer.dt_ns)
+        set_duty(pwm_p, pwm_n, duty, DECAY_MODE)
+
+        # Log the current motor values and their setpoints, but only on every multiple
+        if print_count == 0:
+            telemetry.values[0] = to_degrees(count)
+            telemetry.values[1] = to_degrees(pos_pid.setpoint)
+            telemetry.values[2] = (duty * SPEED_SCALE * SPD_PRINT_SCALE) / FULL_DUTY
+            telemetry.log()
     else:
-        # Move the motor linearly between values
-        pos_pid.setpoint = (percent_along * (end_value - start_value)) + start_value
+        # Capture the state of the encoder
+        angle = to_degrees(encoder.position)
+
+        # Look up where along this movement to be, or where the streamed moves have got to
+        pos_pid.setpoint = queue.positions[0] if queue is not None else profile.position(update)
 
-    # Calculate the velocity to move the motor closer to the position setpoint
-    vel = pos_pid.calculate(angle)
+        # Calculate the velocity to move the motor closer to the position setpoint
+        vel = pos_pid.calculate(angle, dt)
 
-    # Set the new motor driving speed
-    mot.throttle = max(min(vel / SPEED_SCALE, 1.0), -1.0)
+        # Set the new motor driving speed, through the map if there is one. Streamed moves
+        # also give the speed to be going at, which is added on so the PID only has to correct the error
+        drive = vel / SPEED_SCALE
+        if queue is not None:
+            drive = max(min(drive + (queue.velocities[0] / (360.0 * SPEED_SCALE)), 1.0), -1.0)
+        mot.throttle = drive if throttle_map is None else throttle_map.throttle(drive)
 
-    # Print out the current motor values and their setpoints, but only on every multiple
-    if print_count == 0:
-        print("Pos =", angle, end=", ")
-        print("Pos SP =", pos_pid.setpoint, end=", ")
-        print("Speed =", mot.throttle * SPEED_SCALE * SPD_PRINT_SCALE)
+        # Log the current motor values and their setpoints, but only on every multiple
+        if print_count == 0:
+            telemetry.values[0] = angle
+            telemetry.values[1] = pos_pid.setpoint
+            telemetry.values[2] = drive * SPEED_SCALE * SPD_PRINT_SCALE
+            telemetry.log()
 
     # Increment the print count, and wrap it
     print_count = (print_count + 1) % PRINT_DIVIDER
@@ -133,11 +191,22 @@ while not button_pressed():
     update += 1     # Move along in time
 
     # Have we reached the end of this movement?
-    if update >= UPDATES_PER_MOVE:
+    if queue is None and update >= profile.updates:
         update = 0  # Reset the counter
 
         # Set the start as the last end and create a new random end value
         start_value = end_value
         end_value = random.uniform(-POSITION_EXTENT, POSITION_EXTENT)
-
-    time.sleep(UPDATE_RATE)
+        profile.move(start_value, end_value)
+        if fixed_profile is not None:
+            fixed_profile.move(profile, COUNTS_PER_DEGREE)
+
+    # Send the logged values, and queue any moves that have arrived, in the time left before the next update
+    telemetry.drain()
+    if link is not None:
+        link.poll()
+
+# Report how many updates took longer than UPDATE_RATE
+print("Overruns =", timer.overruns, "of", timer.ticks)
+if queue is not None:
+    print("Moves =", queue.completed, "of", link.received, "received, Underruns =", queue.underruns, ", Lost =", link.lost)
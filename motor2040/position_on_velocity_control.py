@@ -0,0 +1,181 @@
+# SPDX-License-Identifier: MIT
+
+import board
+import random
+import pwmio
+import rotaryio
+from adafruit_motor import motor
+from pid import PID   # pid.py from this repo's lib folder
+from trajectory import Profile   # trajectory.py from this repo's lib folder
+from loop_timer import LoopTimer   # loop_timer.py from this repo's lib folder
+from telemetry import Telemetry   # telemetry.py from this repo's lib folder
+from velocity_estimator import VelocityEstimator   # velocity_estimator.py from this repo's lib folder
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile, motor_profile   # profiles.py from this repo's lib folder
+
+# This moves a motor between random positions using two control loops, one inside the other.
+# The outer position loop works out how fast the motor should be going to reach its setpoint,
+# and the inner velocity loop, which updates more often, sets the throttle to make it go that
+# fast. Both are helped by feedforward from the profile being followed: the velocity the
+# setpoint is moving at and the acceleration needed to keep up with it, so the loops only
+# have to correct for what the feedforward gets wrong. Compared to position_control.py, which
+# sets the throttle from the position error alone, this follows each move more closely and
+# settles at the end of it sooner.
+
+# The board and motor being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("motor2040")
+MOTOR = motor_profile("mmme_50")
+
+# Pin constants
+MOTOR_P, MOTOR_N = BOARD.motor_pins(0)
+CHANNEL_A, CHANNEL_B = BOARD.encoder_pins(0)
+
+# Setting constants
+FREQUENCY = MOTOR.frequency         # Chose a frequency above human hearing
+DECAY_MODE = MOTOR.decay_mode       # The decay mode affects how the motor
+                                    # responds, with SLOW_DECAY having improved spin
+                                    # threshold and speed-to-throttle linearity
+DEGREES_PER_COUNT = MOTOR.degrees_per_count   # The degrees the output shaft turns for each count
+UPDATES = 200                       # How many times to update the velocity loop per second
+UPDATE_RATE = 1 / UPDATES
+POSITION_DIVIDER = 2                # How many velocity updates there are for each position update
+POSITION_RATE = UPDATE_RATE * POSITION_DIVIDER
+TIME_FOR_EACH_MOVE = 1              # The time to travel between each random value
+UPDATES_PER_MOVE = int(TIME_FOR_EACH_MOVE / POSITION_RATE)
+PRINT_DIVIDER = 8                   # How many of the updates should be logged (i.e. 2 would be every other update)
+SPEED_SCALE = MOTOR.speed_scale     # The scaling to apply to the motor's speed to match its real-world speed
+
+# Multipliers for the different logged values, so they appear nicely on the Thonny plotter
+SPD_PRINT_SCALE = 20                # Driving Speed multipler
+
+POSITION_EXTENT = 180               # How far from zero to move the motor, in degrees
+INTERP_MODE = 2                     # The interpolating mode between setpoints. STEP (0), LINEAR (1), COSINE (2), TRAPEZOID (3), SCURVE (4)
+PROFILE_MAX_VEL = 540.0             # The fastest the setpoint may move, in degrees per second (TRAPEZOID and SCURVE only)
+PROFILE_MAX_ACCEL = 2160.0          # The fastest the setpoint may accelerate, in degrees per second per second (TRAPEZOID and SCURVE only)
+
+# PID values
+POS_KP = 0.1                        # Position proportional (P) gain, in revolutions per second per degree
+POS_KI = 0.0                        # Position integral (I) gain
+POS_KD = 0.0                        # Position derivative (D) gain
+
+VEL_KP = 0.5                        # Velocity proportional (P) gain, in throttle per revolution per second
+VEL_KI = 4.0                        # Velocity integral (I) gain
+VEL_KD = 0.0                        # Velocity derivative (D) gain
+VEL_INTEGRAL_LIMIT = 0.3            # The most throttle the velocity integral may add
+
+# Feedforward values
+FF_VEL = 1.0                        # How much of the profile's velocity to feed forward (0 to disable)
+FF_ACCEL = 0.005                    # The throttle to add per revolution per second per second of the profile's acceleration
+
+# Create a buttons object for the user switch, which watches it in the background
+buttons = Buttons(board.USER_SW)
+
+# Create the pwm and objects
+pwm_p = pwmio.PWMOut(MOTOR_P, frequency=FREQUENCY)
+pwm_n = pwmio.PWMOut(MOTOR_N, frequency=FREQUENCY)
+mot = motor.DCMotor(pwm_p, pwm_n)
+
+# Set the motor decay modes (if unset the default will be FAST_DECAY)
+mot.decay_mode = DECAY_MODE
+
+# Create the encoder object
+encoder = rotaryio.IncrementalEncoder(CHANNEL_B, CHANNEL_A, divisor=1)
+
+
+def button_pressed():
+    return buttons.pressed()
+
+
+def to_degrees(position):
+    return position * DEGREES_PER_COUNT
+
+
+# Create the PID objects. The position PID gives a velocity correction, limited to the full
+# motor speed, and the velocity PID gives a throttle correction
+pos_pid = PID(POS_KP, POS_KI, POS_KD, POSITION_RATE, output_limit=SPEED_SCALE)
+vel_pid = PID(VEL_KP, VEL_KI, VEL_KD, UPDATE_RATE, output_limit=1.0, integral_limit=VEL_INTEGRAL_LIMIT)
+
+update = 0
+position_count = 0
+print_count = 0
+
+# Set the initial value and create a random end value between the extents
+start_value = 0.0
+end_value = random.uniform(-POSITION_EXTENT, POSITION_EXTENT)
+
+# Create the profile to move between the values with, sampling its shape once rather than every update
+profile = Profile(INTERP_MODE, UPDATES_PER_MOVE, POSITION_RATE, PROFILE_MAX_VEL, PROFILE_MAX_ACCEL)
+profile.move(start_value, end_value)
+
+# Create the velocity estimator, to give finer velocities than whole counts per update
+estimator = VelocityEstimator(MOTOR.revs_per_count)
+estimator.reset(encoder.position)
+
+# The feedforward throttle, from the profile's acceleration
+accel_ff = 0.0
+
+# Create the telemetry to log values to, rather than printing them (needs usb_cdc.data enabled in
+# boot.py, otherwise they are printed). Run tools/telemetry_decode.py on your computer to turn them
+# back into lines of text for reading or plotting
+telemetry = Telemetry(("Pos", "Pos SP", "Vel SP", "Speed"))
+
+# Create the loop timer, which keeps each update on schedule and measures the time between them
+timer = LoopTimer(UPDATES)
+
+# Run until the user switch is pressed
+while not button_pressed():
+
+    # Wait until it is time for the next update, and find how long it has been since the last one
+    dt = timer.wait()
+
+    # Capture the state of the encoder
+    position = encoder.position
+    vel = estimator.update(position, timer.now_ns)
+
+    # Update the position loop, every few velocity updates
+    if position_count == 0:
+        angle = to_degrees(position)
+
+        # Look up where along this movement to be, and how fast and hard the setpoint is moving there
+        pos_pid.setpoint = profile.position(update)
+        vel_ff = (profile.velocity(update) * FF_VEL) / 360.0
+        accel_ff = (profile.acceleration(update) * FF_ACCEL) / 360.0
+
+        # Calculate the velocity to move the motor at, being the profile's plus a correction
+        vel_pid.setpoint = vel_ff + pos_pid.calculate(angle)
+
+        update += 1     # Move along in time
+
+        # Have we reached the end of this movement?
+        if update >= profile.updates:
+            update = 0  # Reset the counter
+
+            # Set the start as the last end and create a new random end value
+            start_value = end_value
+            end_value = random.uniform(-POSITION_EXTENT, POSITION_EXTENT)
+            profile.move(start_value, end_value)
+
+    # Increment the position count, and wrap it
+    position_count = (position_count + 1) % POSITION_DIVIDER
+
+    # Calculate the throttle needed for the velocity setpoint, being a direct scaling of it, plus the
+    # feedforward for the acceleration, plus a correction for whatever difference those leave
+    throttle = (vel_pid.setpoint / SPEED_SCALE) + accel_ff + vel_pid.calculate(vel, dt)
+    mot.throttle = max(min(throttle, 1.0), -1.0)
+
+    # Log the current motor values and their setpoints, but only on every multiple
+    if print_count == 0:
+        telemetry.values[0] = to_degrees(position)
+        telemetry.values[1] = pos_pid.setpoint
+        telemetry.values[2] = vel_pid.setpoint * 360.0
+        telemetry.values[3] = mot.throttle * SPEED_SCALE * SPD_PRINT_SCALE
+        telemetry.log()
+
+    # Increment the print count, and wrap it
+    print_count = (print_count + 1) % PRINT_DIVIDER
+
+    # Send the logged values in the time left before the next update
+    telemetry.drain()
+
+# Report how many updates took longer than UPDATE_RATE
+print("Overruns =", timer.overruns, "of", timer.ticks)
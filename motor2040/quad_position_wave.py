@@ -1,105 +1,76 @@
 # SPDX-License-Identifier: MIT
 
-import time
 import board
-import math
 import pwmio
-import digitalio
 import rotaryio
 from adafruit_motor import motor
+from array import array
+from pid import MultiPID   # pid.py from this repo's lib folder
+from trajectory import Profile, COSINE   # trajectory.py from this repo's lib folder
+from loop_timer import LoopTimer   # loop_timer.py from this repo's lib folder
+from encoder_snapshot import EncoderSnapshot   # encoder_snapshot.py from this repo's lib folder
+from motion_queue import MotionQueue, MotionLink   # motion_queue.py from this repo's lib folder
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile, motor_profile   # profiles.py from this repo's lib folder
+
+# The board and motor being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("motor2040")
+MOTOR = motor_profile("mmme_50")
 
 # Setting constants
-FREQUENCY = 25000                   # Chose a frequency above human hearing
-DECAY_MODE = motor.SLOW_DECAY       # The decay mode affects how the motor
+FREQUENCY = MOTOR.frequency         # Chose a frequency above human hearing
+DECAY_MODE = MOTOR.decay_mode       # The decay mode affects how the motor
                                     # responds, with SLOW_DECAY having improved spin
                                     # threshold and speed-to-throttle linearity
-GEAR_RATIO = 50                     # The gear ratio of the motor
-COUNTS_PER_REV = 12 * GEAR_RATIO    # The counts per revolution of the motor's output shaft
+REVERSED = (False, True, True, False)   # Which motors (A to D) are mounted facing the other way, so need reversing
 UPDATES = 100                       # How many times to update the motor per second
 UPDATE_RATE = 1 / UPDATES
 TIME_FOR_EACH_MOVE = 1              # The time to travel between each random value
 UPDATES_PER_MOVE = TIME_FOR_EACH_MOVE * UPDATES
 PRINT_DIVIDER = 4                   # How many of the updates should be printed (i.e. 2 would be every other update)
-SPEED_SCALE = 5.4                   # The scaling to apply to the motor's speed to match its real-world speed
+SPEED_SCALE = MOTOR.speed_scale     # The scaling to apply to the motor's speed to match its real-world speed
+STREAM = False                      # Whether to follow moves streamed from tools/motion_stream.py rather than the wave
+                                    # (needs usb_cdc.data enabled in boot.py)
+QUEUE_CAPACITY = 32                 # How many streamed moves to hold, so the stream can fall behind for a while
 
 # Multipliers for the different printed values, so they appear nicely on the Thonny plotter
 SPD_PRINT_SCALE = 20                # Driving Speed multipler
 
 POSITION_EXTENT = 180               # How far from zero to move the motor, in degrees
-INTERP_MODE = 2                     # The interpolating mode between setpoints. STEP (0), LINEAR (1), COSINE (2)
 
 # PID values
 POS_KP = 0.14                       # Position proportional (P) gain
 POS_KI = 0.0                        # Position integral (I) gain
 POS_KD = 0.0022                     # Position derivative (D) gain
 
-# Create a digitalinout object for the user switch
-user_sw = digitalio.DigitalInOut(board.USER_SW)
-user_sw.direction = digitalio.Direction.INPUT
-user_sw.pull = digitalio.Pull.UP
-
-# Create the pwm objects
-pwm_a_p = pwmio.PWMOut(board.MOTOR_A_P, frequency=FREQUENCY)
-pwm_a_n = pwmio.PWMOut(board.MOTOR_A_N, frequency=FREQUENCY)
-pwm_b_p = pwmio.PWMOut(board.MOTOR_B_P, frequency=FREQUENCY)
-pwm_b_n = pwmio.PWMOut(board.MOTOR_B_N, frequency=FREQUENCY)
-pwm_c_p = pwmio.PWMOut(board.MOTOR_C_P, frequency=FREQUENCY)
-pwm_c_n = pwmio.PWMOut(board.MOTOR_C_N, frequency=FREQUENCY)
-pwm_d_p = pwmio.PWMOut(board.MOTOR_D_P, frequency=FREQUENCY)
-pwm_d_n = pwmio.PWMOut(board.MOTOR_D_N, frequency=FREQUENCY)
-
-# Create the motor objects
-mot_a = motor.DCMotor(pwm_a_p, pwm_a_n)
-mot_b = motor.DCMotor(pwm_b_n, pwm_b_p)     # Reversed direction
-mot_c = motor.DCMotor(pwm_c_n, pwm_c_p)     # Reversed direction
-mot_d = motor.DCMotor(pwm_d_p, pwm_d_n)
-motors = [mot_a, mot_b, mot_c, mot_d]
-
-# Set the motor decay modes (if unset the default will be FAST_DECAY)
-mot_a.decay_mode = DECAY_MODE
-mot_b.decay_mode = DECAY_MODE
-mot_c.decay_mode = DECAY_MODE
-mot_d.decay_mode = DECAY_MODE
-
-# Create the encoder objects
-enc_a = rotaryio.IncrementalEncoder(board.ENCODER_A_B, board.ENCODER_A_A, divisor=1)
-enc_b = rotaryio.IncrementalEncoder(board.ENCODER_B_A, board.ENCODER_B_B, divisor=1)     # Reversed direction
-enc_c = rotaryio.IncrementalEncoder(board.ENCODER_C_A, board.ENCODER_C_B, divisor=1)     # Reversed direction
-enc_d = rotaryio.IncrementalEncoder(board.ENCODER_D_B, board.ENCODER_D_A, divisor=1)
-encoders = [enc_a, enc_b, enc_c, enc_d]
-ENCODER_NAMES = ["A", "B", "C", "D"]
+# Create a buttons object for the user switch, which watches it in the background
+buttons = Buttons(board.USER_SW)
 
+# Create the motor and encoder objects, swapping the pins of any mounted facing the other way
+motors = []
+encoders = []
+for i in range(board.NUM_MOTORS):
+    pin_p, pin_n = BOARD.motor_pins(i, REVERSED[i])
+    mot = motor.DCMotor(pwmio.PWMOut(pin_p, frequency=FREQUENCY), pwmio.PWMOut(pin_n, frequency=FREQUENCY))
+    mot.decay_mode = DECAY_MODE     # If unset the default will be FAST_DECAY
+    motors.append(mot)
 
-# A simple class for handling Proportional, Integral & Derivative (PID) control calculations
-class PID:
-    def __init__(self, kp, ki, kd, sample_rate):
-        self.kp = kp
-        self.ki = ki
-        self.kd = kd
-        self.setpoint = 0
-        self._error_sum = 0
-        self._last_value = 0
-        self._sample_rate = sample_rate
+    pin_a, pin_b = BOARD.encoder_pins(i, REVERSED[i])
+    encoders.append(rotaryio.IncrementalEncoder(pin_b, pin_a, divisor=1))
 
-    def calculate(self, value):
-        error = self.setpoint - value
-        self._error_sum += error * self._sample_rate
-        rate_error = (value - self._last_value) / self._sample_rate
-        self._last_value = value
+ENCODER_NAMES = ["A", "B", "C", "D"]
 
-        return (error * self.kp) + (self._error_sum * self.ki) - (rate_error * self.kd)
+# Create the snapshot, to read all the encoders at once
+snapshot = EncoderSnapshot(encoders)
 
 
 def button_pressed():
-    return not user_sw.value
-
+    return buttons.pressed()
 
-def to_degrees(position):
-    return (position * 360.0) / COUNTS_PER_REV
 
-
-# Create PID object for position control
-pos_pids = [PID(POS_KP, POS_KI, POS_KD, UPDATE_RATE) for i in range(board.NUM_MOTORS)]
+# Create a PID object to handle the position control of all the motors together,
+# limiting its outputs to the full motor speed
+pos_pids = MultiPID(board.NUM_MOTORS, POS_KP, POS_KI, POS_KD, UPDATE_RATE, output_limit=SPEED_SCALE)
 
 update = 0
 print_count = 0
@@ -108,27 +79,54 @@ print_count = 0
 start_value = 0.0
 end_value = 270.0
 
-angles = [0.0] * board.NUM_MOTORS
+# Create the profile to move the motors between values using cosine, sampling its shape once rather than every update
+profile = Profile(COSINE, UPDATES_PER_MOVE, UPDATE_RATE)
+profile.move(start_value, end_value)
+
+# Create an array to hold the angles of all the motors
+angles = array("f", [0.0] * board.NUM_MOTORS)
+DEGREES_PER_COUNT = MOTOR.degrees_per_count
+
+# Or create the queue of streamed moves, starting from where the motors are, and the link that fills it
+queue = None
+link = None
+if STREAM:
+    snapshot.capture()
+    snapshot.scale(DEGREES_PER_COUNT, angles)
+    queue = MotionQueue(board.NUM_MOTORS, QUEUE_CAPACITY, angles)
+    link = MotionLink(queue)
+
+# Create the loop timer, which keeps each update on schedule and measures the time between them
+timer = LoopTimer(UPDATES)
 
 # Run until the user switch is pressed
 while not button_pressed():
 
-    # Capture the state of the encoders
-    for i in range(board.NUM_MOTORS):
-        angles[i] = to_degrees(encoders[i].position)
-
-    # Calculate how far along this movement to be
-    percent_along = min(update / UPDATES_PER_MOVE, 1.0)
+    # Wait until it is time for the next update, and find how long it has been since the last one
+    dt = timer.wait()
 
-    for i in range(board.NUM_MOTORS):
-        # Move the motor between values using cosine
-        pos_pids[i].setpoint = (((-math.cos(percent_along * math.pi) + 1.0) / 2.0) * (end_value - start_value)) + start_value
+    # Capture the state of the encoders all at once, so they are read as close together as possible
+    counts = snapshot.capture()
 
-        # Calculate the velocity to move the motor closer to the position setpoint
-        vel = pos_pids[i].calculate(angles[i])
+    # Move along the streamed moves, which give each motor its own setpoint, or look up where
+    # along this movement to be, which is the same for every motor
+    if queue is not None:
+        queue.update(dt)
+    else:
+        setpoint = profile.position(update)
 
-        # Set the new motor driving speed
-        motors[i].throttle = max(min(vel / SPEED_SCALE, 1.0), -1.0)
+    # Then for each motor in a single pass, convert its count to an angle, calculate the velocity to move it
+    # closer to its position setpoint, and set its new driving speed. Streamed moves also give the speed to be
+    # going at, which is added on so the PIDs only have to correct the error
+    for i in range(board.NUM_MOTORS):
+        angles[i] = counts[i] * DEGREES_PER_COUNT
+        if queue is not None:
+            pos_pids.setpoints[i] = queue.positions[i]
+            vel = pos_pids.calculate_channel(i, angles[i], dt)
+            motors[i].throttle = max(min((vel + (queue.velocities[i] / 360.0)) / SPEED_SCALE, 1.0), -1.0)
+        else:
+            pos_pids.setpoints[i] = setpoint
+            motors[i].throttle = pos_pids.calculate_channel(i, angles[i], dt) / SPEED_SCALE
 
     # Print out the current motor values and their setpoints, but only on every multiple
     if print_count == 0:
@@ -142,12 +140,20 @@ while not button_pressed():
     update += 1     # Move along in time
 
     # Have we reached the end of this movement?
-    if update >= UPDATES_PER_MOVE:
+    if queue is None and update >= UPDATES_PER_MOVE:
         update = 0  # Reset the counter
 
         # Swap the start and end values
         temp = start_value
         start_value = end_value
         end_value = temp
+        profile.move(start_value, end_value)
+
+    # Queue any moves that have arrived, in the time left before the next update
+    if link is not None:
+        link.poll()
 
-    time.sleep(UPDATE_RATE)
+# Report how many updates took longer than UPDATE_RATE
+print("Overruns =", timer.overruns, "of", timer.ticks)
+if queue is not None:
+    print("Moves =", queue.completed, "of", link.received, "received, Underruns =", queue.underruns, ", Lost =", link.lost)
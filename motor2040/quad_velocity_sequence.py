@@ -1,11 +1,25 @@
 # SPDX-License-Identifier: MIT
 
-import time
+import math
 import board
 import pwmio
-import digitalio
 import rotaryio
+import digitalio
+from analogio import AnalogIn
 from adafruit_motor import motor
+from array import array
+from pid import MultiPID   # pid.py from this repo's lib folder
+from loop_timer import LoopTimer   # loop_timer.py from this repo's lib folder
+from loop_stats import LoopStats   # loop_stats.py from this repo's lib folder
+from slack_collector import SlackCollector   # slack_collector.py from this repo's lib folder
+from encoder_snapshot import EncoderSnapshot   # encoder_snapshot.py from this repo's lib folder
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile, motor_profile   # profiles.py from this repo's lib folder
+from gain_store import GainStore, VELOCITY   # gain_store.py from this repo's lib folder
+from throttle_map import ThrottleMapStore   # throttle_map.py from this repo's lib folder
+from kinematics import Kinematics, Odometry, MECANUM   # kinematics.py from this repo's lib folder
+from current_monitor import CurrentMonitor   # current_monitor.py from this repo's lib folder
+from loop_trace import LoopTrace   # loop_trace.py and telemetry.py from this repo's lib folder
 
 # Wheel friendly names
 FL = 2
@@ -13,125 +27,122 @@ FR = 3
 RL = 1
 RR = 0
 
+# The board and motor being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("motor2040")
+MOTOR = motor_profile("mmme_50")
+
 # Setting constants
-FREQUENCY = 25000                   # Chose a frequency above human hearing
-DECAY_MODE = motor.SLOW_DECAY       # The decay mode affects how the motor
+FREQUENCY = MOTOR.frequency         # Chose a frequency above human hearing
+DECAY_MODE = MOTOR.decay_mode       # The decay mode affects how the motor
                                     # responds, with SLOW_DECAY having improved spin
                                     # threshold and speed-to-throttle linearity
-GEAR_RATIO = 50                     # The gear ratio of the motor
-COUNTS_PER_REV = 12 * GEAR_RATIO    # The counts per revolution of the motor's output shaft
+REVERSED = (False, True, True, False)   # Which motors (A to D) are mounted facing the other way, so need reversing
 
-SPEED_SCALE = 5.4                       # The scaling to apply to each motor's speed to match its real-world speed
+SPEED_SCALE = MOTOR.speed_scale     # The scaling to apply to each motor's speed to match its real-world speed
+LINEARIZE = False                   # Whether to drive each motor through the map saved by throttle_sweep.py (if any), to undo its deadband and curve
 
 UPDATES = 100                       # How many times to update the motor per second
 UPDATE_RATE = 1 / UPDATES
 TIME_FOR_EACH_MOVE = 1              # The time to travel between each random value
 UPDATES_PER_MOVE = TIME_FOR_EACH_MOVE * UPDATES
+GC_IN_SLACK = False                 # Whether to collect garbage only in the time left after each update, and report what was allocated
 PRINT_DIVIDER = 4                   # How many of the updates should be printed (i.e. 2 would be every other update)
+TRACE = False                       # Whether to send a trace of every update for tools/trace_replay.py (needs usb_cdc.data enabled in boot.py)
 
 DRIVING_SPEED = 1.0                 # The speed to drive the wheels at, from 0.0 to SPEED_SCALE
 
+# Current protection constants (each motor's current is read once every NUM_MOTORS updates)
+CURRENT_LIMIT = 1.2                 # The current to scale a motor's throttle back to stay under, in amps
+STALL_CURRENT = 0.8                 # A motor drawing more than this current while barely moving may have stalled, in amps
+STALL_SPEED = 0.1                   # The speed below which a motor is barely moving, in revolutions per second
+STALL_READS = 10                    # How many readings in a row a motor must look stalled for before it is cut
+HOLD_READS = 50                     # How many readings to keep a stalled motor cut for, before easing it back in
+
+# Robot constants (measure these on your own robot)
+WHEEL_DIAMETER = 0.06               # The diameter of each wheel, in metres
+TRACK_WIDTH = 0.16                  # The distance between the centres of the left and right wheels, in metres
+WHEELBASE = 0.14                    # The distance between the centres of the front and rear wheels, in metres
+
+# The body speeds that drive each wheel at DRIVING_SPEED
+LINEAR_SPEED = DRIVING_SPEED * math.pi * WHEEL_DIAMETER     # In metres per second
+TURN_SPEED = LINEAR_SPEED / ((TRACK_WIDTH + WHEELBASE) / 2)  # In radians per second, anticlockwise
+
+# The body velocities to drive at in turn, as (forward, leftward, anticlockwise) speeds
+SEQUENCE = (
+    (LINEAR_SPEED, 0.0, 0.0),       # Drive forward
+    (-LINEAR_SPEED, 0.0, 0.0),      # Drive backward
+    (0.0, 0.0, -TURN_SPEED),        # Turn right
+    (0.0, 0.0, TURN_SPEED),         # Turn left
+    (0.0, -LINEAR_SPEED, 0.0),      # Strafe right
+    (0.0, LINEAR_SPEED, 0.0),       # Strafe left
+    (0.0, 0.0, 0.0),                # Stop
+)
+
 # PID values
 VEL_KP = 30.0                       # Velocity proportional (P) gain
 VEL_KI = 0.0                        # Velocity integral (I) gain
 VEL_KD = 0.4                        # Velocity derivative (D) gain
+TUNED_GAINS = False                 # Whether to use the gains saved by autotune.py for each motor (if any) in place of these
 
-# Create a digitalinout object for the user switch
-user_sw = digitalio.DigitalInOut(board.USER_SW)
-user_sw.direction = digitalio.Direction.INPUT
-user_sw.pull = digitalio.Pull.UP
-
-# Create the pwm objects
-pwm_a_p = pwmio.PWMOut(board.MOTOR_A_P, frequency=FREQUENCY)
-pwm_a_n = pwmio.PWMOut(board.MOTOR_A_N, frequency=FREQUENCY)
-pwm_b_p = pwmio.PWMOut(board.MOTOR_B_P, frequency=FREQUENCY)
-pwm_b_n = pwmio.PWMOut(board.MOTOR_B_N, frequency=FREQUENCY)
-pwm_c_p = pwmio.PWMOut(board.MOTOR_C_P, frequency=FREQUENCY)
-pwm_c_n = pwmio.PWMOut(board.MOTOR_C_N, frequency=FREQUENCY)
-pwm_d_p = pwmio.PWMOut(board.MOTOR_D_P, frequency=FREQUENCY)
-pwm_d_n = pwmio.PWMOut(board.MOTOR_D_N, frequency=FREQUENCY)
-
-# Create the motor objects
-mot_a = motor.DCMotor(pwm_a_p, pwm_a_n)
-mot_b = motor.DCMotor(pwm_b_n, pwm_b_p)     # Reversed direction
-mot_c = motor.DCMotor(pwm_c_n, pwm_c_p)     # Reversed direction
-mot_d = motor.DCMotor(pwm_d_p, pwm_d_n)
-motors = [mot_a, mot_b, mot_c, mot_d]
-
-# Set the motor decay modes (if unset the default will be FAST_DECAY)
-mot_a.decay_mode = DECAY_MODE
-mot_b.decay_mode = DECAY_MODE
-mot_c.decay_mode = DECAY_MODE
-mot_d.decay_mode = DECAY_MODE
-
-# Create the encoder objects
-enc_a = rotaryio.IncrementalEncoder(board.ENCODER_A_B, board.ENCODER_A_A, divisor=1)
-enc_b = rotaryio.IncrementalEncoder(board.ENCODER_B_A, board.ENCODER_B_B, divisor=1)     # Reversed direction
-enc_c = rotaryio.IncrementalEncoder(board.ENCODER_C_A, board.ENCODER_C_B, divisor=1)     # Reversed direction
-enc_d = rotaryio.IncrementalEncoder(board.ENCODER_D_B, board.ENCODER_D_A, divisor=1)
-encoders = [enc_a, enc_b, enc_c, enc_d]
-ENCODER_NAMES = ["RR", "RL", "FL", "FR"]
-
-
-# A simple class for handling Proportional, Integral & Derivative (PID) control calculations
-class PID:
-    def __init__(self, kp, ki, kd, sample_rate):
-        self.kp = kp
-        self.ki = ki
-        self.kd = kd
-        self.setpoint = 0
-        self._error_sum = 0
-        self._last_value = 0
-        self._sample_rate = sample_rate
-
-    def calculate(self, value):
-        error = self.setpoint - value
-        self._error_sum += error * self._sample_rate
-        rate_error = (value - self._last_value) / self._sample_rate
-        self._last_value = value
-
-        return (error * self.kp) + (self._error_sum * self.ki) - (rate_error * self.kd)
+# Create a buttons object for the user switch, which watches it in the background
+buttons = Buttons(board.USER_SW)
 
+# Create the motor and encoder objects, swapping the pins of any mounted facing the other way
+motors = []
+encoders = []
+for i in range(board.NUM_MOTORS):
+    pin_p, pin_n = BOARD.motor_pins(i, REVERSED[i])
+    mot = motor.DCMotor(pwmio.PWMOut(pin_p, frequency=FREQUENCY), pwmio.PWMOut(pin_n, frequency=FREQUENCY))
+    mot.decay_mode = DECAY_MODE     # If unset the default will be FAST_DECAY
+    motors.append(mot)
 
-def button_pressed():
-    return not user_sw.value
+    pin_a, pin_b = BOARD.encoder_pins(i, REVERSED[i])
+    encoders.append(rotaryio.IncrementalEncoder(pin_b, pin_a, divisor=1))
 
+ENCODER_NAMES = ["RR", "RL", "FL", "FR"]
 
-def to_revs(position):
-    return position / COUNTS_PER_REV
+# Load each motor's throttle map, if it has one
+if LINEARIZE:
+    map_store = ThrottleMapStore()
+    throttle_maps = [map_store.load(i) for i in range(board.NUM_MOTORS)]
+else:
+    throttle_maps = [None] * board.NUM_MOTORS
 
+# Create the snapshot, to read all the encoders at once
+snapshot = EncoderSnapshot(encoders)
 
-# Helper functions for driving in common directions
-def drive_forward(speed):
-    vel_pids[FL].setpoint = speed
-    vel_pids[FR].setpoint = speed
-    vel_pids[RL].setpoint = speed
-    vel_pids[RR].setpoint = speed
+# Create the sensor mux and ADC objects
+addr_pins = []
+for pin in (board.ADC_ADDR_0, board.ADC_ADDR_1, board.ADC_ADDR_2):
+    addr_pin = digitalio.DigitalInOut(pin)
+    addr_pin.direction = digitalio.Direction.OUTPUT
+    addr_pins.append(addr_pin)
+analog_in = AnalogIn(board.SHARED_ADC)
 
+# Create the current monitor, to read one motor's current each update and hold back any that draw too much
+current_addresses = [i + board.CURRENT_SENSE_A_ADDR for i in range(board.NUM_MOTORS)]
+currents = CurrentMonitor(addr_pins, analog_in, current_addresses, BOARD.amps_per_raw, BOARD.amps_offset,
+                          CURRENT_LIMIT, STALL_CURRENT, STALL_SPEED, STALL_READS, HOLD_READS)
 
-def turn_right(speed):
-    vel_pids[FL].setpoint = speed
-    vel_pids[FR].setpoint = -speed
-    vel_pids[RL].setpoint = speed
-    vel_pids[RR].setpoint = -speed
 
+def button_pressed():
+    return buttons.pressed()
 
-def strafe_right(speed):
-    vel_pids[FL].setpoint = speed
-    vel_pids[FR].setpoint = -speed
-    vel_pids[RL].setpoint = -speed
-    vel_pids[RR].setpoint = speed
 
+# Create the kinematics, to turn body velocities into wheel speeds, and the odometry, to track where the robot is
+kinematics = Kinematics(MECANUM, (FL, FR, RL, RR), WHEEL_DIAMETER, TRACK_WIDTH, WHEELBASE)
+odometry = Odometry(kinematics, MOTOR.counts_per_rev)
 
-def stop():
-    vel_pids[FL].setpoint = 0
-    vel_pids[FR].setpoint = 0
-    vel_pids[RL].setpoint = 0
-    vel_pids[RR].setpoint = 0
 
+# Create a PID object to handle the velocity control of all the motors together
+vel_pids = MultiPID(board.NUM_MOTORS, VEL_KP, VEL_KI, VEL_KD, UPDATE_RATE)
 
-# Create PID objects for velocity control
-vel_pids = [PID(VEL_KP, VEL_KI, VEL_KD, UPDATE_RATE) for i in range(board.NUM_MOTORS)]
+# Give each motor its own saved gains, if it has any
+if TUNED_GAINS:
+    store = GainStore()
+    for i in range(board.NUM_MOTORS):
+        kp, ki, kd = store.load(VELOCITY, i, (VEL_KP, VEL_KI, VEL_KD))
+        vel_pids.set_gains(kp, ki, kd, i)
 
 update = 0
 print_count = 0
@@ -141,31 +152,65 @@ sequence = 0
 for i in range(board.NUM_MOTORS):
     motors[i].throttle = 0.0
 
-revs = [0.0] * board.NUM_MOTORS
-last_revs = [0.0] * board.NUM_MOTORS
+# Create arrays to hold the state of all the motors, rather than reading it back from each motor
+revs = array("f", [0.0] * board.NUM_MOTORS)
+vels = array("f", [0.0] * board.NUM_MOTORS)
+throttles = array("f", [0.0] * board.NUM_MOTORS)
+REVS_PER_COUNT = MOTOR.revs_per_count
+
+# Create the trace, to record every update so it can be replayed after changing the gains
+trace = LoopTrace(board.NUM_MOTORS) if TRACE else None
+
+# Create the loop timer, which keeps each update on schedule and measures the time between them,
+# and the loop stats, which record how long each update takes to show whether UPDATES is being kept up with
+stats = LoopStats(UPDATES)
+collector = SlackCollector() if GC_IN_SLACK else None
+timer = LoopTimer(UPDATES, stats, collector)
 
 # Run until the user switch is pressed
 while not button_pressed():
 
+    # Wait until it is time for the next update, and find how long it has been since the last one
+    dt = timer.wait()
+
+    # Capture the state of the encoders all at once, so they are read as close together as possible,
+    # then work out where the robot has got to from them
+    counts = snapshot.capture()
+    last_counts = snapshot.last_counts
+    odometry.update(snapshot)
+
+    # Read the current of the next motor, and check whether it has gone over the limit or stalled
+    # (going by the velocities of the last update)
+    currents.update(vels)
+
+    # Then for each motor in a single pass, work out its position and velocity, calculate the acceleration to apply
+    # to move it closer to its velocity setpoint, and accelerate or decelerate it, keeping it within what its current
+    # allows and driving it through its map
+    elapsed = snapshot.dt
+    rate_scale = REVS_PER_COUNT / elapsed if elapsed > 0 else None
+    accel_scale = dt / SPEED_SCALE
     for i in range(board.NUM_MOTORS):
-        # Capture the state of the encoder
-        last_revs[i] = revs[i]
-        revs[i] = to_revs(encoders[i].position)
-
-    for i in range(board.NUM_MOTORS):
-        vel = (revs[i] - last_revs[i]) / UPDATE_RATE
-
-        # Calculate the acceleration to apply to the motor to move it closer to the velocity setpoint
-        accel = vel_pids[i].calculate(vel)
-
-        # Accelerate or decelerate the motor
-        motors[i].throttle = max(min(motors[i].throttle + ((accel * UPDATE_RATE) / SPEED_SCALE), 1.0), -1.0)
-
-    # Print out the current motor values, but only on every multiple
-    if print_count == 0:
+        revs[i] = counts[i] * REVS_PER_COUNT
+        if rate_scale is not None:
+            vels[i] = (counts[i] - last_counts[i]) * rate_scale
+        accel = vel_pids.calculate_channel(i, vels[i], dt)
+
+        limit = currents.scales[i]
+        throttles[i] = max(min(throttles[i] + (accel * accel_scale), limit), -limit)
+        throttle_map = throttle_maps[i]
+        motors[i].throttle = throttles[i] if throttle_map is None else throttle_map.throttle(throttles[i])
+
+    # Record the counts, setpoints and throttles of this update to the trace
+    if trace is not None:
+        trace.log(snapshot.timestamp_ns, snapshot.counts, vel_pids.setpoints, throttles)
+
+    # Otherwise print out the current motor values, but only on every multiple, as text would corrupt the trace
+    elif print_count == 0:
         for i in range(board.NUM_MOTORS):
             print(ENCODER_NAMES[i], "=", revs[i], end=", ")
-        print()
+        print("X =", odometry.x, end=", ")
+        print("Y =", odometry.y, end=", ")
+        print("Heading =", odometry.heading)
 
     # Increment the print count, and wrap it
     print_count = (print_count + 1) % PRINT_DIVIDER
@@ -180,23 +225,21 @@ while not button_pressed():
         sequence += 1
 
         # Loop the sequence back around
-        if sequence >= 7:
+        if sequence >= len(SEQUENCE):
             sequence = 0
 
-    # Set the motor speeds, based on the sequence
-    if sequence == 0:
-        drive_forward(DRIVING_SPEED)
-    elif sequence == 1:
-        drive_forward(-DRIVING_SPEED)
-    elif sequence == 2:
-        turn_right(DRIVING_SPEED)
-    elif sequence == 3:
-        turn_right(-DRIVING_SPEED)
-    elif sequence == 4:
-        strafe_right(DRIVING_SPEED)
-    elif sequence == 5:
-        strafe_right(-DRIVING_SPEED)
-    elif sequence == 6:
-        stop()
-
-    time.sleep(UPDATE_RATE)
+    # Set all the wheel speeds at once, from the body velocity of this part of the sequence
+    vx, vy, omega = SEQUENCE[sequence]
+    kinematics.inverse(vx, vy, omega, vel_pids.setpoints)
+
+    # Send the trace in the time left before the next update
+    if trace is not None:
+        trace.drain()
+
+# Report how many updates took longer than UPDATE_RATE, and how often each motor was held back
+print("Overruns =", timer.overruns, "of", timer.ticks)
+stats.report()
+if collector is not None:
+    collector.report()
+for i in range(board.NUM_MOTORS):
+    print(ENCODER_NAMES[i], " current trips = ", currents.trips[i], ", stalls = ", currents.stalls[i], sep="")
@@ -2,41 +2,48 @@
 
 import time
 import board
-import digitalio
 import rotaryio
+from array import array
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile, motor_profile   # profiles.py from this repo's lib folder
+from encoder_snapshot import EncoderSnapshot   # encoder_snapshot.py from this repo's lib folder
+
+# The board and motor being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("motor2040")
+MOTOR = motor_profile("mmme_50")
 
 # Encoder constants
-GEAR_RATIO = 50                     # The gear ratio of the motor
-COUNTS_PER_REV = 12 * GEAR_RATIO    # The counts per revolution of the motor's output shaft
 ENCODER_NAMES = ["A", "B", "C", "D"]
 
-# Create a digitalinout object for the user switch
-user_sw = digitalio.DigitalInOut(board.USER_SW)
-user_sw.direction = digitalio.Direction.INPUT
-user_sw.pull = digitalio.Pull.UP
+# Create a buttons object for the user switch, which watches it in the background
+buttons = Buttons(board.USER_SW)
 
 # Create the encoder objects
-enc_a = rotaryio.IncrementalEncoder(board.ENCODER_A_B, board.ENCODER_A_A, divisor=1)
-enc_b = rotaryio.IncrementalEncoder(board.ENCODER_B_B, board.ENCODER_B_A, divisor=1)
-enc_c = rotaryio.IncrementalEncoder(board.ENCODER_C_B, board.ENCODER_C_A, divisor=1)
-enc_d = rotaryio.IncrementalEncoder(board.ENCODER_D_B, board.ENCODER_D_A, divisor=1)
-encoders = [enc_a, enc_b, enc_c, enc_d]
-
+encoders = []
+for i in range(board.NUM_ENCODERS):
+    pin_a, pin_b = BOARD.encoder_pins(i)
+    encoders.append(rotaryio.IncrementalEncoder(pin_b, pin_a, divisor=1))
 
-def button_pressed():
-    return not user_sw.value
+# Create the snapshot, to read all the encoders at once, and an array to hold their angles
+snapshot = EncoderSnapshot(encoders)
+angles = array("f", [0.0] * board.NUM_ENCODERS)
+DEGREES_PER_COUNT = MOTOR.degrees_per_count
 
 
-def to_degrees(position):
-    return (position * 360.0) / COUNTS_PER_REV
+def button_pressed():
+    return buttons.pressed()
 
 
 # Run until the user switch is pressed
 while not button_pressed():
 
+    # Read all the encoders, then convert them to angles
+    snapshot.capture()
+    snapshot.scale(DEGREES_PER_COUNT, angles)
+
     # Print out the angle of each encoder
     for i in range(board.NUM_ENCODERS):
-        print(ENCODER_NAMES[i], "=", to_degrees(encoders[i].position), end=", ")
+        print(ENCODER_NAMES[i], "=", angles[i], end=", ")
     print()
 
     time.sleep(0.1)
@@ -3,20 +3,26 @@
 # SPDX-License-Identifier: MIT
 
 import board
-import digitalio
 import rotaryio
+from array import array
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile   # profiles.py from this repo's lib folder
+from loop_timer import LoopTimer   # loop_timer.py from this repo's lib folder
+from encoder_monitor import EncoderMonitor, FIELDS, TIME, COUNT, DELTA, MIN, MAX   # encoder_monitor.py from this repo's lib folder
+
+# The board being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("motor2040")
 
 # Pins of the motor encoder to read
-CHANNEL_A = board.ENCODER_A_A
-CHANNEL_B = board.ENCODER_A_B
+CHANNEL_A, CHANNEL_B = BOARD.encoder_pins(0)
 
 # Encoder constants
 REVERSED = True     # Whether to reverse the counting direction (set to True if using MMME)
+POLL_RATE = 1000    # How many times to read the encoder per second
+OUTPUT_RATE = 10    # The most times to print how the encoder has moved per second
 
-# Create a digitalinout object for the user switch
-user_sw = digitalio.DigitalInOut(board.USER_SW)
-user_sw.direction = digitalio.Direction.INPUT
-user_sw.pull = digitalio.Pull.UP
+# Create a buttons object for the user switch, which watches it in the background
+buttons = Buttons(board.USER_SW)
 
 # Create the encoder object
 if REVERSED:
@@ -24,17 +30,27 @@ if REVERSED:
 else:
     encoder = rotaryio.IncrementalEncoder(CHANNEL_A, CHANNEL_B, divisor=1)
 
+# Create the monitor, to gather the encoder's changes into batches, and somewhere to take each batch into
+monitor = EncoderMonitor(encoder, POLL_RATE, OUTPUT_RATE)
+record = array("l", [0] * FIELDS)
 
-last_position = None
+# Create the loop timer, which keeps the reads on schedule
+timer = LoopTimer(POLL_RATE)
 
 
 def button_pressed():
-    return not user_sw.value
+    return buttons.pressed()
 
 
 # Run until the user switch is pressed
 while not button_pressed():
-    position = encoder.position
-    if last_position is None or position != last_position:
-        print(position)
-    last_position = position
+    timer.wait()
+    monitor.poll()
+
+    # Print any batches that are ready
+    while monitor.get_into(record):
+        print("Time = ", record[TIME], "ms, Count = ", record[COUNT], ", Delta = ", record[DELTA],
+              ", Min = ", record[MIN], ", Max = ", record[MAX], sep="")
+
+# Report any batches there was not time to print
+print("Dropped =", monitor.dropped)
@@ -1,25 +1,40 @@
 # SPDX-License-Identifier: MIT
 
-import time
 import board
 import pwmio
-import digitalio
 from adafruit_motor import motor
+from motor_sequence import MotorSequence   # motor_sequence.py and loop_timer.py from this repo's lib folder
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile, motor_profile   # profiles.py from this repo's lib folder
+
+# The board and motor being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("motor2040")
+MOTOR = motor_profile("mmme_50")
 
 # Pins of the motor to drive
-MOTOR_P = board.MOTOR_A_P
-MOTOR_N = board.MOTOR_A_N
+MOTOR_P, MOTOR_N = BOARD.motor_pins(0)
 
 # Motor constants
-FREQUENCY = 25000               # Chose a frequency above human hearing
-DECAY_MODE = motor.SLOW_DECAY   # The decay mode affects how the motor
+FREQUENCY = MOTOR.frequency     # Chose a frequency above human hearing
+DECAY_MODE = MOTOR.decay_mode   # The decay mode affects how the motor
                                 # responds, with SLOW_DECAY having improved spin
                                 # threshold and speed-to-throttle linearity
 
-# Create a digitalinout object for the user switch
-user_sw = digitalio.DigitalInOut(board.USER_SW)
-user_sw.direction = digitalio.Direction.INPUT
-user_sw.pull = digitalio.Pull.UP
+# The sequence to run, as the time to spend on each step in seconds and the throttle
+# to give each motor (0 to stop, or None to spin freely)
+SEQUENCE = (
+    (1.0, (0.5,)),     # Forward slow
+    (1.0, (0,)),       # Stop
+    (1.0, (1.0,)),     # Forward fast
+    (1.0, (None,)),    # Spin freely
+    (1.0, (-0.5,)),    # Backwards slow
+    (1.0, (0,)),       # Stop
+    (1.0, (-1.0,)),    # Backwards fast
+    (1.0, (None,)),    # Spin freely
+)
+
+# Create a buttons object for the user switch, which watches it in the background
+buttons = Buttons(board.USER_SW)
 
 # Create the pwm and motor objects
 pwm_p = pwmio.PWMOut(MOTOR_P, frequency=FREQUENCY)
@@ -31,55 +46,11 @@ mot.decay_mode = DECAY_MODE
 
 
 def button_pressed():
-    return not user_sw.value
-
-
-# Run the motor sequence
-while True:
-    # Forward slow
-    mot.throttle = 0.5
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
-
-    # Stop
-    mot.throttle = 0
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
-
-    # Forward fast
-    mot.throttle = 1.0
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
-
-    # Spin freely
-    mot.throttle = None
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
-
-    # Backwards slow
-    mot.throttle = -0.5
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
+    return buttons.pressed()
 
-    # Stop
-    mot.throttle = 0
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
 
-    # Backwards fast
-    mot.throttle = -1.0
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
+# Create the sequence, which checks the button every 5ms while it plays
+sequence = MotorSequence([mot], SEQUENCE, updates=200)
 
-    # Spin freely
-    mot.throttle = None
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
+# Run the motor sequence until the button is pressed
+sequence.play(button_pressed)
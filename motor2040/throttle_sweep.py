@@ -0,0 +1,122 @@
+# SPDX-License-Identifier: MIT
+
+import board
+import pwmio
+import rotaryio
+from adafruit_motor import motor
+from throttle_map import ThrottleMap, ThrottleMapStore   # throttle_map.py from this repo's lib folder
+from loop_timer import LoopTimer   # loop_timer.py from this repo's lib folder
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile, motor_profile   # profiles.py from this repo's lib folder
+
+# Measure how fast each motor turns across a sweep of throttles, in both directions, and save
+# a map of the throttles that give evenly spaced speeds (see lib/throttle_map.py). With
+# LINEARIZE = True, velocity_control.py, position_control.py and quad_velocity_sequence.py
+# drive their motors through this map, so they no longer have to fight each motor's deadband
+# and curve. The response depends on the decay mode and frequency, so sweep again after
+# changing either. Make sure each motor is free to turn. Press the user switch to stop early.
+
+# The board and motor being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("motor2040")
+MOTOR = motor_profile("mmme_50")
+
+# Setting constants
+FREQUENCY = MOTOR.frequency         # Chose a frequency above human hearing
+DECAY_MODE = MOTOR.decay_mode       # The decay mode affects how the motor
+                                    # responds, with SLOW_DECAY having improved spin
+                                    # threshold and speed-to-throttle linearity
+SPEED_SCALE = MOTOR.speed_scale     # The speed a linear throttle of 1.0 should give, in revolutions per second
+
+UPDATES = 100                       # How many times to check the button per second
+CHANNELS = (0,)                     # Which motors to sweep, from 0 to 3 for A to D
+SAVE = True                         # Whether to save the maps found, for the other examples to use
+
+# Sweep values
+STEPS = 50                          # How many throttles to try in each direction, evenly spaced up to full
+SETTLE_TIME = 0.3                   # How long to let the motor settle at each throttle, in seconds
+MEASURE_TIME = 0.2                  # How long to then measure its speed over, in seconds
+POINTS = 16                         # How many steps to give each table of the map
+
+REVS_PER_COUNT = MOTOR.revs_per_count
+MIN_SPEED = REVS_PER_COUNT / MEASURE_TIME   # Counted as stopped, being a single count over the measurement
+
+# Create a buttons object for the user switch, which watches it in the background
+buttons = Buttons(board.USER_SW)
+
+# Create the store to save the maps in
+store = ThrottleMapStore(points=POINTS)
+
+# Create the loop timer, which keeps each update on schedule and measures the time between them
+timer = LoopTimer(UPDATES)
+
+
+def button_pressed():
+    return buttons.pressed()
+
+
+# Wait for a number of seconds, returning False if the button was pressed
+def wait(seconds):
+    for _ in range(round(seconds * UPDATES)):
+        timer.wait()
+        if button_pressed():
+            return False
+    return True
+
+
+# Measure the steady speed of a motor at each throttle in turn, in one direction, returning
+# them as positive revolutions per second (or None if stopped early)
+def sweep(mot, encoder, throttles, direction):
+    speeds = []
+    timer.restart()
+    for throttle in throttles:
+        mot.throttle = throttle * direction
+        if not wait(SETTLE_TIME):
+            return None
+        start = encoder.position
+        if not wait(MEASURE_TIME):
+            return None
+        speeds.append(abs(encoder.position - start) * REVS_PER_COUNT / MEASURE_TIME)
+
+    mot.throttle = 0.0
+    return speeds if wait(SETTLE_TIME) else None
+
+
+throttles = [i / STEPS for i in range(STEPS + 1)]
+
+for index in CHANNELS:
+    # Create the motor and encoder objects
+    pin_p, pin_n = BOARD.motor_pins(index)
+    pwm_p = pwmio.PWMOut(pin_p, frequency=FREQUENCY)
+    pwm_n = pwmio.PWMOut(pin_n, frequency=FREQUENCY)
+    mot = motor.DCMotor(pwm_p, pwm_n)
+    mot.decay_mode = DECAY_MODE
+    pin_a, pin_b = BOARD.encoder_pins(index)
+    encoder = rotaryio.IncrementalEncoder(pin_b, pin_a, divisor=1)
+
+    forward = sweep(mot, encoder, throttles, 1)
+    reverse = sweep(mot, encoder, throttles, -1) if forward is not None else None
+
+    # Let the motor spin freely, and free its pins for the next
+    mot.throttle = None
+    pwm_p.deinit()
+    pwm_n.deinit()
+    encoder.deinit()
+    if reverse is None:
+        break
+
+    # Print the sweep, so it can be plotted, then the map built from it
+    name = "Motor " + "ABCD"[index]
+    for i in range(len(throttles)):
+        print("Throttle = ", throttles[i], ", Forward = ", forward[i], ", Reverse = ", reverse[i], sep="")
+
+    throttle_map = ThrottleMap.from_sweep(throttles, forward, reverse, SPEED_SCALE, POINTS, MIN_SPEED)
+    print(name, " deadband = ", round(throttle_map.forward[0], 3), " forward, ", round(throttle_map.reverse[0], 3),
+          " reverse", sep="")
+    print(name, " full speed = ", forward[-1], " forward, ", reverse[-1], " reverse (SPEED_SCALE = ",
+          SPEED_SCALE, ")", sep="")
+    print(name, " forward map = ", [round(value, 3) for value in throttle_map.forward], sep="")
+    print(name, " reverse map = ", [round(value, 3) for value in throttle_map.reverse], sep="")
+    if SAVE:
+        store.save(index, throttle_map)
+
+print("Done")
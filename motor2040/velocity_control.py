@@ -1,51 +1,74 @@
 # SPDX-License-Identifier: MIT
 
-import time
 import board
-import math
 import random
 import pwmio
-import digitalio
 import rotaryio
 from adafruit_motor import motor
+from pid import PID   # pid.py from this repo's lib folder
+from trajectory import Profile   # trajectory.py from this repo's lib folder
+from loop_timer import LoopTimer   # loop_timer.py from this repo's lib folder
+from loop_stats import LoopStats   # loop_stats.py from this repo's lib folder
+from slack_collector import SlackCollector   # slack_collector.py from this repo's lib folder
+from telemetry import Telemetry   # telemetry.py from this repo's lib folder
+from loop_trace import LoopTrace   # loop_trace.py and telemetry.py from this repo's lib folder
+from velocity_estimator import VelocityEstimator   # velocity_estimator.py from this repo's lib folder
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile, motor_profile   # profiles.py from this repo's lib folder
+from gain_store import GainStore, VELOCITY   # gain_store.py from this repo's lib folder
+from throttle_map import ThrottleMapStore   # throttle_map.py from this repo's lib folder
+
+# The board and motor being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("motor2040")
+MOTOR = motor_profile("mmme_50")
 
 # Pin constants
-MOTOR_P = board.MOTOR_A_P
-MOTOR_N = board.MOTOR_A_N
-CHANNEL_A = board.ENCODER_A_A
-CHANNEL_B = board.ENCODER_A_B
+MOTOR_P, MOTOR_N = BOARD.motor_pins(0)
+CHANNEL_A, CHANNEL_B = BOARD.encoder_pins(0)
 
 # Setting constants
-FREQUENCY = 25000                   # Chose a frequency above human hearing
-DECAY_MODE = motor.SLOW_DECAY       # The decay mode affects how the motor
+FREQUENCY = MOTOR.frequency         # Chose a frequency above human hearing
+DECAY_MODE = MOTOR.decay_mode       # The decay mode affects how the motor
                                     # responds, with SLOW_DECAY having improved spin
                                     # threshold and speed-to-throttle linearity
-GEAR_RATIO = 50                     # The gear ratio of the motor
-COUNTS_PER_REV = 12 * GEAR_RATIO    # The counts per revolution of the motor's output shaft
 
-SPEED_SCALE = 5.4                   # The scaling to apply to each motor's speed to match its real-world speed
+SPEED_SCALE = MOTOR.speed_scale     # The scaling to apply to each motor's speed to match its real-world speed
+LINEARIZE = False                   # Whether to drive the motor through the map saved by throttle_sweep.py (if any), to undo its deadband and curve
 
 UPDATES = 100                       # How many times to update the motor per second
 UPDATE_RATE = 1 / UPDATES
 TIME_FOR_EACH_MOVE = 1              # The time to travel between each random value
 UPDATES_PER_MOVE = TIME_FOR_EACH_MOVE * UPDATES
-PRINT_DIVIDER = 4                   # How many of the updates should be printed (i.e. 2 would be every other update)
+GC_IN_SLACK = False                 # Whether to collect garbage only in the time left after each update, and report what was allocated
+PRINT_DIVIDER = 4                   # How many of the updates should be logged (i.e. 2 would be every other update)
+TRACE = False                       # Whether to send a trace of every update for tools/trace_replay.py, rather than the telemetry (needs usb_cdc.data enabled in boot.py)
 
-# Multipliers for the different printed values, so they appear nicely on the Thonny plotter
+# Multipliers for the different logged values, so they appear nicely on the Thonny plotter
 ACC_PRINT_SCALE = 0.05              # Acceleration multiplier
 
 VELOCITY_EXTENT = 3                 # How far from zero to drive the motor at, in revolutions per second
-INTERP_MODE = 2                     # The interpolating mode between setpoints. STEP (0), LINEAR (1), COSINE (2)
+INTERP_MODE = 2                     # The interpolating mode between setpoints. STEP (0), LINEAR (1), COSINE (2), TRAPEZOID (3), SCURVE (4)
+PROFILE_MAX_RATE = 9.0              # The fastest the setpoint may change, in revolutions per second per second (TRAPEZOID and SCURVE only)
+PROFILE_MAX_RATE_CHANGE = 36.0      # The fastest that rate may change (TRAPEZOID and SCURVE only)
+
+# Velocity estimate values
+VEL_MIN_COUNTS = 4                  # The fewest counts over the window for the velocity to be COUNTED. Below this it rests on the time between counts
+VEL_WINDOW = 0.25                   # The longest to look back for counts to measure the velocity over, in seconds
+VEL_FILTER_ALPHA = None             # The alpha-beta filter gains to smooth the velocity with, such as 0.5 and 0.05 (None to not filter)
+VEL_FILTER_BETA = None
 
 # PID values
 VEL_KP = 30.0                       # Velocity proportional (P) gain
 VEL_KI = 0.0                        # Velocity integral (I) gain
 VEL_KD = 0.4                        # Velocity derivative (D) gain
+TUNED_GAINS = False                 # Whether to use the gains saved by autotune.py for this motor (if any) in place of these
+
+# Load any saved gains
+if TUNED_GAINS:
+    VEL_KP, VEL_KI, VEL_KD = GainStore().load(VELOCITY, 0, (VEL_KP, VEL_KI, VEL_KD))
 
-# Create a digitalinout object for the user switch
-user_sw = digitalio.DigitalInOut(board.USER_SW)
-user_sw.direction = digitalio.Direction.INPUT
-user_sw.pull = digitalio.Pull.UP
+# Create a buttons object for the user switch, which watches it in the background
+buttons = Buttons(board.USER_SW)
 
 # Create the pwm and objects
 pwm_p = pwmio.PWMOut(MOTOR_P, frequency=FREQUENCY)
@@ -58,33 +81,12 @@ mot.decay_mode = DECAY_MODE
 # Create the encoder object
 encoder = rotaryio.IncrementalEncoder(CHANNEL_B, CHANNEL_A, divisor=1)
 
-
-# A simple class for handling Proportional, Integral & Derivative (PID) control calculations
-class PID:
-    def __init__(self, kp, ki, kd, sample_rate):
-        self.kp = kp
-        self.ki = ki
-        self.kd = kd
-        self.setpoint = 0
-        self._error_sum = 0
-        self._last_value = 0
-        self._sample_rate = sample_rate
-
-    def calculate(self, value):
-        error = self.setpoint - value
-        self._error_sum += error * self._sample_rate
-        rate_error = (value - self._last_value) / self._sample_rate
-        self._last_value = value
-
-        return (error * self.kp) + (self._error_sum * self.ki) - (rate_error * self.kd)
+# Load the motor's throttle map, if it has one
+throttle_map = ThrottleMapStore().load(0) if LINEARIZE else None
 
 
 def button_pressed():
-    return not user_sw.value
-
-
-def to_revs(position):
-    return position / COUNTS_PER_REV
+    return buttons.pressed()
 
 
 # Create PID object for velocity control
@@ -93,49 +95,78 @@ vel_pid = PID(VEL_KP, VEL_KI, VEL_KD, UPDATE_RATE)
 update = 0
 print_count = 0
 
-# Initialise the motor
+# Initialise the motor, and the linear throttle it is driven from
 mot.throttle = 0.0
+drive = 0.0
 
 # Set the initial value and create a random end value between the extents
 start_value = 0.0
 end_value = random.uniform(-VELOCITY_EXTENT, VELOCITY_EXTENT)
 
-revs = 0.0
-last_revs = 0.0
+# Create the profile to move between the values with, sampling its shape once rather than every update
+profile = Profile(INTERP_MODE, UPDATES_PER_MOVE, UPDATE_RATE, PROFILE_MAX_RATE, PROFILE_MAX_RATE_CHANGE)
+profile.move(start_value, end_value)
+
+# Create the velocity estimator, to give finer velocities than whole counts per update
+estimator = VelocityEstimator(MOTOR.revs_per_count, VEL_MIN_COUNTS, VEL_WINDOW,
+                              alpha=VEL_FILTER_ALPHA, beta=VEL_FILTER_BETA)
+
+# Create the telemetry to log values to, rather than printing them (needs usb_cdc.data enabled in
+# boot.py, otherwise they are printed). Run tools/telemetry_decode.py on your computer to turn them
+# back into lines of text for reading or plotting
+telemetry = Telemetry(("Vel", "Vel SP", "Accel", "Speed")) if not TRACE else None
+
+# Or create the trace, to record every update so it can be replayed after changing the gains
+trace = LoopTrace(1) if TRACE else None
+
+# Create the loop timer, which keeps each update on schedule and measures the time between them,
+# and the loop stats, which record how long each update takes to show whether UPDATES is being kept up with
+stats = LoopStats(UPDATES)
+collector = SlackCollector() if GC_IN_SLACK else None
+timer = LoopTimer(UPDATES, stats, collector)
+
+# Start the estimator from the encoder's count now, recording that as the first update of the trace
+# so a replay of it starts the estimator from the same place
+count = encoder.position
+estimator.reset(count, timer.now_ns)
+if trace is not None:
+    trace.counts[0] = count
+    trace.log(timer.now_ns)
 
 # Run until the user switch is pressed
 while not button_pressed():
 
-    # Capture the state of the encoder
-    last_revs = revs
-    revs = to_revs(encoder.position)
+    # Wait until it is time for the next update, and find how long it has been since the last one
+    dt = timer.wait()
 
-    # Calculate how far along this movement to be
-    percent_along = min(update / UPDATES_PER_MOVE, 1.0)
+    # Capture the state of the encoder, and estimate the velocity from it
+    count = encoder.position
+    vel = estimator.update(count, timer.now_ns)
 
-    if INTERP_MODE == 0:
-        # Move the motor instantly to the end value
-        vel_pid.setpoint = end_value
-    elif INTERP_MODE == 2:
-        # Move the motor between values using cosine
-        vel_pid.setpoint = (((-math.cos(percent_along * math.pi) + 1.0) / 2.0) * (end_value - start_value)) + start_value
-    else:
-        # Move the motor linearly between values
-        vel_pid.setpoint = (percent_along * (end_value - start_value)) + start_value
+    # Look up where along this movement to be
+    vel_pid.setpoint = profile.position(update)
 
     # Calculate the acceleration to apply to the motor to move it closer to the velocity setpoint
-    vel = (revs - last_revs) / UPDATE_RATE
-    accel = vel_pid.calculate(vel)
-
-    # Set the new motor driving speed
-    mot.throttle = max(min(mot.throttle + ((accel * UPDATE_RATE) / SPEED_SCALE), 1.0), -1.0)
-
-    # Print out the current motor values and their setpoints, but only on every multiple
-    if print_count == 0:
-        print("Vel =", vel, end=", ")
-        print("Vel SP =", vel_pid.setpoint, end=", ")
-        print("Accel =", accel * ACC_PRINT_SCALE, end=", ")
-        print("Speed =", mot.throttle * SPEED_SCALE)
+    accel = vel_pid.calculate(vel, dt)
+
+    # Set the new motor driving speed, through the map if there is one
+    drive = max(min(drive + ((accel * dt) / SPEED_SCALE), 1.0), -1.0)
+    mot.throttle = drive if throttle_map is None else throttle_map.throttle(drive)
+
+    # Record this update whole to the trace, if there is one
+    if trace is not None:
+        trace.counts[0] = count
+        trace.setpoints[0] = vel_pid.setpoint
+        trace.throttles[0] = drive
+        trace.log(timer.now_ns)
+
+    # Otherwise log the current motor values and their setpoints, but only on every multiple
+    elif print_count == 0:
+        telemetry.values[0] = vel
+        telemetry.values[1] = vel_pid.setpoint
+        telemetry.values[2] = accel * ACC_PRINT_SCALE
+        telemetry.values[3] = drive * SPEED_SCALE
+        telemetry.log()
 
     # Increment the print count, and wrap it
     print_count = (print_count + 1) % PRINT_DIVIDER
@@ -143,11 +174,22 @@ while not button_pressed():
     update += 1     # Move along in time
 
     # Have we reached the end of this movement?
-    if update >= UPDATES_PER_MOVE:
+    if update >= profile.updates:
         update = 0  # Reset the counter
 
         # Set the start as the last end and create a new random end value
         start_value = end_value
         end_value = random.uniform(-VELOCITY_EXTENT, VELOCITY_EXTENT)
+        profile.move(start_value, end_value)
+
+    # Send the logged values in the time left before the next update
+    if trace is not None:
+        trace.drain()
+    else:
+        telemetry.drain()
 
-    time.sleep(UPDATE_RATE)
+# Report how many updates took longer than UPDATE_RATE
+print("Overruns =", timer.overruns, "of", timer.ticks)
+stats.report()
+if collector is not None:
+    collector.report()
@@ -0,0 +1,189 @@
+# SPDX-License-Identifier: MIT
+
+import json
+import board
+import pwmio
+import rotaryio
+import digitalio
+from adafruit_motor import motor
+from pid import PID   # pid.py from this repo's lib folder
+from step_response import StepResponse   # step_response.py from this repo's lib folder
+from velocity_estimator import VelocityEstimator   # velocity_estimator.py from this repo's lib folder
+from loop_timer import LoopTimer   # loop_timer.py from this repo's lib folder
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile, motor_profile   # profiles.py from this repo's lib folder
+from gain_store import GainStore, VELOCITY   # gain_store.py from this repo's lib folder
+
+# Run the same velocity steps on a motor at each of a grid of PWM frequencies, in both decay
+# modes, measuring how well it follows them (see lib/step_response.py), as
+# motor2040/pwm_benchmark.py does. The Pico Motor Shim has no current sense, so the current
+# of each combination is reported as null, and no encoder connectors, so the motor's encoder
+# must be wired to two of the Pico's free pins (ENCODER_A and ENCODER_B below). Each
+# combination is printed as a line of JSON, followed by a summary of the best of them.
+# Make sure the motor is free to turn. Press button A to stop early.
+
+# The board and motor being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("pico_motor_shim")
+MOTOR = motor_profile("mmme_50")
+
+# Pins of the Pico Motor Shim, and of the encoder wired to the Pico
+INDEX = 0                           # Which motor to benchmark, 0 or 1 for motor 1 or 2
+BUTTON_A = BOARD.button_pins()[0]
+MOTOR_P, MOTOR_N = BOARD.motor_pins(INDEX)
+ENCODER_A = board.GP0
+ENCODER_B = board.GP1
+
+# Setting constants
+FREQUENCIES = (5000, 10000, 15000, 20000, 25000, 40000)    # The PWM frequencies to try, in hertz
+DECAY_MODES = (motor.FAST_DECAY, motor.SLOW_DECAY)          # The decay modes to try at each
+DECAY_NAMES = ("fast", "slow")
+SPEED_SCALE = MOTOR.speed_scale     # The scaling to apply to the motor's speed to match its real-world speed
+
+UPDATES = 100                       # How many times to update the motor per second
+UPDATE_RATE = 1 / UPDATES
+STEPS = (2.0, 4.0, 1.0, -2.0, -4.0, 0.0)    # The velocities to step between, in revolutions per second
+STEP_TIME = 1.0                     # How long to hold each velocity for, in seconds
+UPDATES_PER_STEP = round(STEP_TIME * UPDATES)
+SETTLE_FRACTION = 0.5               # How much of the end of each step to measure the ripple over
+REST_TIME = 1.0                     # How long to let the motor stop for between combinations, in seconds
+
+# Velocity estimate values
+VEL_MIN_COUNTS = 4                  # The fewest counts over the window for the velocity to be COUNTED. Below this it rests on the time between counts
+VEL_WINDOW = 0.25                   # The longest to look back for counts to measure the velocity over, in seconds
+
+# PID values
+VEL_KP = 30.0                       # Velocity proportional (P) gain
+VEL_KI = 0.0                        # Velocity integral (I) gain
+VEL_KD = 0.4                        # Velocity derivative (D) gain
+TUNED_GAINS = False                 # Whether to use the gains saved by motor2040/autotune.py for this motor (if any) in place of these
+
+# Load any saved gains. The motor is not driven through a throttle map, as motor2040/throttle_sweep.py
+# saves one for a single frequency and decay mode
+if TUNED_GAINS:
+    VEL_KP, VEL_KI, VEL_KD = GainStore().load(VELOCITY, INDEX, (VEL_KP, VEL_KI, VEL_KD))
+
+# Create a buttons object for the button, which watches it in the background
+buttons = Buttons(BUTTON_A)
+
+# Create a digitalinout object for the Pico's LED
+led = digitalio.DigitalInOut(board.LED)
+led.direction = digitalio.Direction.OUTPUT
+
+# Create the encoder object
+encoder = rotaryio.IncrementalEncoder(ENCODER_B, ENCODER_A, divisor=1)
+
+# Create the velocity estimator, to give finer velocities than whole counts per update
+estimator = VelocityEstimator(MOTOR.revs_per_count, VEL_MIN_COUNTS, VEL_WINDOW)
+
+# Create the loop timer, which keeps each update on schedule and measures the time between them
+timer = LoopTimer(UPDATES)
+
+
+def button_pressed():
+    return buttons.pressed()
+
+
+# Wait for a number of seconds, returning False if the button was pressed
+def wait(seconds):
+    for _ in range(round(seconds * UPDATES)):
+        timer.wait()
+        if button_pressed():
+            return False
+    return True
+
+
+def rounded(value, digits):
+    return round(value, digits) if value is not None else None
+
+
+# Drive the motor through the steps at one frequency and decay mode, returning what was
+# measured (or None if stopped early)
+def benchmark(frequency, decay_mode):
+    # Create the pwm and motor objects for this combination, and let the motor rest
+    pwm_p = pwmio.PWMOut(MOTOR_P, frequency=frequency)
+    pwm_n = pwmio.PWMOut(MOTOR_N, frequency=frequency)
+    mot = motor.DCMotor(pwm_p, pwm_n)
+    mot.decay_mode = decay_mode
+    mot.throttle = 0.0
+    timer.restart()
+    completed = wait(REST_TIME)
+
+    vel_pid = PID(VEL_KP, VEL_KI, VEL_KD, UPDATE_RATE)
+    response = StepResponse(SETTLE_FRACTION)
+    drive = 0.0
+    timer.restart()
+    estimator.reset(encoder.position, timer.now_ns)
+
+    setpoint = 0.0
+    for target in STEPS:
+        if not completed:
+            break
+        response.start(setpoint, target, UPDATES_PER_STEP)
+        setpoint = vel_pid.setpoint = target
+
+        for _ in range(UPDATES_PER_STEP):
+            dt = timer.wait()
+            if button_pressed():
+                completed = False
+                break
+
+            # Control the velocity as motor2040/velocity_control.py does, measuring how it follows
+            vel = estimator.update(encoder.position, timer.now_ns)
+            accel = vel_pid.calculate(vel, dt)
+            drive = max(min(drive + ((accel * dt) / SPEED_SCALE), 1.0), -1.0)
+            mot.throttle = drive
+            response.update(vel, dt)
+    response.finish()
+
+    # Let the motor spin freely, and free its pins for the next combination
+    mot.throttle = None
+    pwm_p.deinit()
+    pwm_n.deinit()
+    if not completed:
+        return None
+
+    return {
+        "board": BOARD.name,
+        "motor": MOTOR.name,
+        "frequency": frequency,
+        "decay_mode": DECAY_NAMES[decay_mode],
+        "rise_time": rounded(response.rise_time, 4),            # Seconds from 10% to 90% of each step, on average
+        "overshoot": rounded(response.overshoot, 2),            # The most past any step, as a percentage of it
+        "ripple": rounded(response.ripple, 4),                  # Revolutions per second, once settled
+        "steady_error": rounded(response.steady_error, 4),      # Revolutions per second, once settled
+        "missed": response.missed,                              # Steps the motor never got 90% of the way through
+        "current": None,                                        # The shim cannot measure these
+        "supply_voltage": None,
+        "power": None,
+    }
+
+
+# Turn on the Pico's LED to show the benchmark is running
+led.value = True
+
+results = []
+for frequency in FREQUENCIES:
+    for decay_mode in DECAY_MODES:
+        result = benchmark(frequency, decay_mode)
+        if result is None:
+            break
+        print(json.dumps(result))
+        results.append(result)
+    if result is None:
+        break
+
+encoder.deinit()
+led.value = False
+
+
+def describe(result):
+    return str(result["frequency"]) + "Hz " + result["decay_mode"] + " decay"
+
+
+# Summarise the best combinations for response
+if results:
+    for name, key in (("Fastest rise", "rise_time"), ("Least overshoot", "overshoot"), ("Least ripple", "ripple")):
+        best = min(results, key=lambda result: result[key] if result[key] is not None else float("inf"))
+        print(name, " = ", describe(best), " (", key, " = ", best[key], ")", sep="")
+
+print("Done")
@@ -1,28 +1,43 @@
 # SPDX-License-Identifier: MIT
 
-import time
 import board
 import pwmio
 import digitalio
 from adafruit_motor import motor
+from motor_sequence import MotorSequence   # motor_sequence.py and loop_timer.py from this repo's lib folder
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from profiles import board_profile, motor_profile   # profiles.py from this repo's lib folder
 
-# Pin names for the Pico Motor Shim
-BUTTON_A = board.GP2
-MOTOR_1_P = board.GP6
-MOTOR_1_N = board.GP7
-MOTOR_2_P = board.GP27
-MOTOR_2_N = board.GP26
+# The board and motor being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("pico_motor_shim")
+MOTOR = motor_profile("mmme_50")
+
+# Pins of the Pico Motor Shim
+BUTTON_A = BOARD.button_pins()[0]
+MOTOR_1_P, MOTOR_1_N = BOARD.motor_pins(0)
+MOTOR_2_P, MOTOR_2_N = BOARD.motor_pins(1)
 
 # Motor constants
-FREQUENCY = 25000               # Chose a frequency above human hearing
-DECAY_MODE = motor.SLOW_DECAY   # The decay mode affects how the motor
+FREQUENCY = MOTOR.frequency     # Chose a frequency above human hearing
+DECAY_MODE = MOTOR.decay_mode   # The decay mode affects how the motor
                                 # responds, with SLOW_DECAY having improved spin
                                 # threshold and speed-to-throttle linearity
 
-# Create a digitalinout object for the button
-button_a = digitalio.DigitalInOut(BUTTON_A)
-button_a.direction = digitalio.Direction.INPUT
-button_a.pull = digitalio.Pull.UP
+# The sequence to run, as the time to spend on each step in seconds and the throttle
+# to give each motor (0 to stop, or None to spin freely)
+SEQUENCE = (
+    (1.0, (0.5, -0.5)),     # Forward slow
+    (1.0, (0, 0)),          # Stop
+    (1.0, (1.0, -1.0)),     # Forward fast
+    (1.0, (None, None)),    # Spin freely
+    (1.0, (-0.5, 0.5)),     # Backwards slow
+    (1.0, (0, 0)),          # Stop
+    (1.0, (-1.0, 1.0)),     # Backwards fast
+    (1.0, (None, None)),    # Spin freely
+)
+
+# Create a buttons object for the button, which watches it in the background
+buttons = Buttons(BUTTON_A)
 
 # Create a digitalinout object for the Pico's LED
 led = digitalio.DigitalInOut(board.LED)
@@ -46,62 +61,10 @@ motor2.decay_mode = DECAY_MODE
 led.value = True
 
 def button_pressed():
-    return not button_a.value
-
-# Run the motor sequence
-while True:
-    # Forward slow
-    motor1.throttle = 0.5
-    motor2.throttle = -0.5
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
-
-    # Stop
-    motor1.throttle = 0
-    motor2.throttle = 0
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
-
-    # Forward fast
-    motor1.throttle = 1.0
-    motor2.throttle = -1.0
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
-
-    # Spin freely
-    motor1.throttle = None
-    motor2.throttle = None
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
-
-    # Backwards slow
-    motor1.throttle = -0.5
-    motor2.throttle = 0.5
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
-
-    # Stop
-    motor1.throttle = 0
-    motor2.throttle = 0
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
+    return buttons.pressed()
 
-    # Backwards fast
-    motor1.throttle = -1.0
-    motor2.throttle = 1.0
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
+# Create the sequence, which checks the button every 5ms while it plays
+sequence = MotorSequence([motor1, motor2], SEQUENCE, updates=200)
 
-    # Spin freely
-    motor1.throttle = None
-    motor2.throttle = None
-    time.sleep(1)
-    if button_pressed():  # Exit if button is pressed
-        break
+# Run the motor sequence until the button is pressed
+sequence.play(button_pressed)
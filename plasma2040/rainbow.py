@@ -1,18 +1,25 @@
-import time
 import board
-import digitalio
 from analogio import AnalogIn
 import adafruit_rgbled
 import busio
 import neopixel
 import adafruit_dotstar as dotstar
 import math
+from buttons import Buttons   # buttons.py from this repo's lib folder
+from loop_timer import LoopTimer   # loop_timer.py from this repo's lib folder
+from loop_stats import LoopStats   # loop_stats.py from this repo's lib folder
+from slack_collector import SlackCollector   # slack_collector.py from this repo's lib folder
+from profiles import board_profile   # profiles.py from this repo's lib folder
 
 # Press "B" to speed up the LED cycling effect.
 # Press "A" to slow it down again.
 # Press "Boot" to reset the speed back to default.
+# Press "A" and "B" together to print how long each update is taking.
 
 
+# The board being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("plasma2040")
+
 # Set how many LEDs you have
 NUM_LEDS = 30
 
@@ -25,6 +32,9 @@ UPDATES = 60
 # How bright the LEDs will be (between 0.0 and 1.0)
 BRIGHTNESS = 0.5
 
+# Whether to collect garbage only in the time left after each update, and report what was allocated
+GC_IN_SLACK = False
+
 
 # Pick *one* LED type by uncommenting the relevant line below:
 
@@ -34,34 +44,19 @@ BRIGHTNESS = 0.5
 # WS2812 / NeoPixel™ LEDs
 led_strip = neopixel.NeoPixel(board.DATA, NUM_LEDS, brightness=BRIGHTNESS, auto_write=False)
 
-user_sw = digitalio.DigitalInOut(board.USER_SW)
-user_sw.direction = digitalio.Direction.INPUT
-user_sw.pull = digitalio.Pull.UP
-
-sw_a = digitalio.DigitalInOut(board.SW_A)
-sw_a.direction = digitalio.Direction.INPUT
-sw_a.pull = digitalio.Pull.UP
-
-sw_b = digitalio.DigitalInOut(board.SW_B)
-sw_b.direction = digitalio.Direction.INPUT
-sw_b.pull = digitalio.Pull.UP
+# Watch the buttons in the background, so reading them each update costs very little
+buttons = Buttons(*BOARD.button_pins())
+BUTTON_SW = 0
+BUTTON_A = 1
+BUTTON_B = 2
 
 led = adafruit_rgbled.RGBLED(board.LED_R, board.LED_G, board.LED_B, invert_pwm = True)
 
 sense = AnalogIn(board.CURRENT_SENSE)
 
-# Constants used for current conversion
-ADC_GAIN = 50
-SHUNT_RESISTOR = 0.015 # Yes, this is 0.015 Ohm
-
-def get_voltage(pin):
-    return (pin.value * 3.3) / 65536
-    
-def get_current(pin):
-    return get_voltage(pin) / (ADC_GAIN * SHUNT_RESISTOR)
-
 def hsv_to_rgb(h, s, v):
-	# All inputs are from 0.0 to 1.0
+    # All inputs are from 0.0 to 1.0. The colour is returned packed as 0xRRGGBB,
+    # which the LEDs take directly, so no tuple is created for every LED on every update
     i = math.floor(h * 6.0)
     f = h * 6.0 - i
     v *= 255.0
@@ -71,55 +66,77 @@ def hsv_to_rgb(h, s, v):
 
     zone = int(i) % 6
     if zone == 0:
-        return (v, t, p)
-    if zone == 1:
-	    return (q, v, p)
-    if zone == 2:
-        return (p, v, t)
-    if zone == 3:
-	    return (p, q, v)
-    if zone == 4:
-	    return (t, p, v)
-    if zone == 5:
-		return (v, p, q)
-    return (0, 0, 0)
-
-def button_read(button):
-	return not button.value
+        r, g, b = v, t, p
+    elif zone == 1:
+        r, g, b = q, v, p
+    elif zone == 2:
+        r, g, b = p, v, t
+    elif zone == 3:
+        r, g, b = p, q, v
+    elif zone == 4:
+        r, g, b = t, p, v
+    else:
+        r, g, b = v, p, q
+    return (int(r) << 16) | (int(g) << 8) | int(b)
 
 speed = DEFAULT_SPEED
 offset = 0.0
 
+last_speed = None
 count = 0
+both_pressed = False
+
+# Keep the updates on schedule, and record how long each one takes
+stats = LoopStats(UPDATES)
+collector = SlackCollector() if GC_IN_SLACK else None
+timer = LoopTimer(UPDATES, stats, collector)
+
 # Make rainbows
-while True:
-    sw = not user_sw.value
-    a = not sw_a.value
-    b = not sw_b.value
-	
-    if sw:
-		speed = DEFAULT_SPEED
-    else:
-        if a:
-            speed -= 1
-        if b:
-            speed += 1
-			
-	speed = min(255, max(1, speed))
-	
-	offset += float(speed) / 2000.0
-
-    for i in range(NUM_LEDS):
-        hue = float(i) / NUM_LEDS
-        led_strip[i] = hsv_to_rgb(hue + offset, 1.0, 1.0)
-	led_strip.show()
-	
-    led.color = (speed, 0, 255 - speed)
-
-    count += 1
-    if count >= UPDATES:
-        # Display the current value once every second
-        print("Current =", get_current(sense), "A")
-        count = 0
-
-    time.sleep(1.0 / UPDATES)
+try:
+    while True:
+        # Act on buttons that are held down, and on any quick taps since the last update
+        sw = buttons.pressed(BUTTON_SW) or buttons.held(BUTTON_SW)
+        a = buttons.pressed(BUTTON_A) or buttons.held(BUTTON_A)
+        b = buttons.pressed(BUTTON_B) or buttons.held(BUTTON_B)
+
+        # Print how the updates are going when A and B are first pressed together
+        if a and b and not both_pressed:
+            stats.report()
+            if collector is not None:
+                collector.report()
+        both_pressed = a and b
+
+        if sw:
+            speed = DEFAULT_SPEED
+        else:
+            if a:
+                speed -= 1
+            if b:
+                speed += 1
+
+        speed = min(255, max(1, speed))
+
+        offset += float(speed) / 2000.0
+
+        for i in range(NUM_LEDS):
+            hue = float(i) / NUM_LEDS
+            led_strip[i] = hsv_to_rgb(hue + offset, 1.0, 1.0)
+        led_strip.show()
+
+        # Only change the LED's colour when the speed does
+        if speed != last_speed:
+            led.color = (speed, 0, 255 - speed)
+            last_speed = speed
+
+        count += 1
+        if count >= UPDATES:
+            # Display the current value once every second
+            print("Current =", BOARD.amps(sense.value), "A")
+            count = 0
+
+        timer.wait()
+finally:
+    # Print how the updates went when stopped (such as with Ctrl-C)
+    stats.report()
+    if collector is not None:
+        collector.report()
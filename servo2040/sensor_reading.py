@@ -7,6 +7,10 @@ import time
 import board
 from digitalio import DigitalInOut, Direction
 from analogio import AnalogIn
+from profiles import board_profile   # profiles.py from this repo's lib folder
+
+# The board being used, from lib/profiles.py (add your own there)
+BOARD = board_profile("servo2040")
 
 addr0_pin = DigitalInOut(board.ADC_ADDR_0)
 addr0_pin.direction = Direction.OUTPUT
@@ -20,33 +24,26 @@ addr2_pin.direction = Direction.OUTPUT
 analog_in = AnalogIn(board.SHARED_ADC)
 
 
-def get_voltage(pin):
-    return (pin.value * 3.3) / 65536
-
 def select(address):
     addr0_pin.value = address & 0b001
     addr1_pin.value = address & 0b010
     addr2_pin.value = address & 0b100
 
 
-VOLTAGE_GAIN = 13.9 / 3.9
-CURRENT_GAIN = 1 / (69 * 0.003)
-CURRENT_OFFSET = -0.02
-
 while True:
     # Read each sensor in turn and print its voltage
     for i in range(board.NUM_SENSORS):
         select(i)
-        print("S", i + 1, " = ", round(get_voltage(analog_in), 3), sep="", end=", ")
+        print("S", i + 1, " = ", round(BOARD.volts(analog_in.value), 3), sep="", end=", ")
 
     # Read the voltage sense and print the value
     select(board.VOLTAGE_SENSE_ADDR)
-    voltage = get_voltage(analog_in) * VOLTAGE_GAIN
+    voltage = BOARD.supply_volts(analog_in.value)
     print("Voltage =", round(voltage, 4), end=", ")
 
     # Read the current sense and print the value
     select(board.CURRENT_SENSE_ADDR)
-    current = (get_voltage(analog_in) + CURRENT_OFFSET) * CURRENT_GAIN
+    current = BOARD.amps(analog_in.value)
     print("Current =", round(current, 4))
 
     time.sleep(0.5)
\ No newline at end of file
@@ -0,0 +1,175 @@
+# SPDX-License-Identifier: MIT
+
+"""
+Compare the float and fixed-point control paths of motor2040/position_control.py.
+
+The example is run against motor_sim.py's simulated motor twice. The first run
+uses the float path, with a lib/fixed_point.py FixedPID shadowing the float PID:
+it is given the same encoder counts and setpoint (rounded to the nearest count)
+on every update, and the throttles the two would set are compared. The second
+run uses the fixed-point path for real, so the tracking of the two can be
+compared too:
+
+    python tools/fixed_point_benchmark.py --duration 30
+
+The check fails if the two ever differ by more than TOLERANCE of full throttle.
+Rounding the setpoint to whole counts moves the proportional term by up to half
+a count, which is POS_KP * 0.3 / SPEED_SCALE = 0.8% of full throttle with the
+example's gains, so that is where the tolerance comes from.
+
+The cost of each calculate() call is also timed, replaying the recorded inputs.
+These times are of this computer running CPython, where floats are done in
+hardware, so they say little about the RP2040. Run motor2040/pid_benchmark.py on
+the board for that.
+"""
+
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+import motor_sim
+
+SCRIPT = os.path.join(motor_sim.REPO_DIR, "motor2040", "position_control.py")
+TOLERANCE = 0.01    # The most the throttles may differ by, as a fraction of full throttle
+
+
+def _with_fixed_point(script):
+    # Write a copy of the example with its fixed-point path switched on
+    with open(script) as file:
+        source = file.read()
+    if "FIXED_POINT = False" not in source:
+        sys.exit("Could not find FIXED_POINT in " + script)
+    handle, path = tempfile.mkstemp(suffix=".py")
+    with os.fdopen(handle, "w") as file:
+        file.write(source.replace("FIXED_POINT = False", "FIXED_POINT = True", 1))
+    return path
+
+
+def run_float(duration, model):
+    """Run the float path with a FixedPID shadowing it, returning the samples and both PIDs' settings and inputs."""
+    sim = motor_sim.Simulation(duration, model)
+    samples = []
+    recorded = []
+    settings = {}
+
+    def prepare():
+        import fixed_point
+        import pid
+        calculate = pid.PID.calculate
+        shadows = {}
+
+        def shadowed(self, value, dt=None):
+            globals_ = sys._getframe(1).f_globals
+            if id(self) not in shadows:
+                counts_per_degree = globals_["COUNTS_PER_DEGREE"]
+                speed_scale = globals_["SPEED_SCALE"]
+                settings.update(gains=(self.kp, self.ki, self.kd, self.sample_rate), output_limit=speed_scale,
+                                scale=(fixed_point.FULL_DUTY / speed_scale) / counts_per_degree)
+                shadow = fixed_point.FixedPID(*settings["gains"], scale=settings["scale"],
+                                              output_limit=fixed_point.FULL_DUTY)
+                shadow.reset(round(value * counts_per_degree))
+                shadows[id(self)] = (shadow, counts_per_degree, speed_scale)
+            shadow, counts_per_degree, speed_scale = shadows[id(self)]
+
+            count = round(value * counts_per_degree)
+            setpoint = round(self.setpoint * counts_per_degree)
+            dt_ns = round(dt * 1000000000) if dt is not None else None
+            output = calculate(self, value, dt)
+            shadow.setpoint = setpoint
+            duty = shadow.calculate(count, dt_ns)
+
+            samples.append((output / speed_scale, duty / fixed_point.FULL_DUTY, self.setpoint - value))
+            recorded.append((value, self.setpoint, dt, count, setpoint, dt_ns))
+            return output
+
+        pid.PID.calculate = shadowed
+
+    motor_sim.run(SCRIPT, sim, quiet=True, prepare=prepare)
+    return samples, settings, recorded
+
+
+def run_fixed(duration, model):
+    """Run the fixed-point path for real, returning its tracking errors in degrees."""
+    sim = motor_sim.Simulation(duration, model)
+    errors = []
+    path = _with_fixed_point(SCRIPT)
+
+    def prepare():
+        import fixed_point
+        calculate = fixed_point.FixedPID.calculate
+
+        def recording(self, value, dt_ns=None):
+            counts_per_degree = sys._getframe(1).f_globals["COUNTS_PER_DEGREE"]
+            errors.append((self.setpoint - value) / counts_per_degree)
+            return calculate(self, value, dt_ns)
+
+        fixed_point.FixedPID.calculate = recording
+
+    try:
+        motor_sim.run(path, sim, quiet=True, prepare=prepare)
+    finally:
+        os.remove(path)
+    return errors
+
+
+def time_calls(settings, recorded):
+    """Replay the recorded inputs through both PIDs, returning the mean ns per call of each."""
+    with motor_sim.installed(motor_sim.Simulation(0)):
+        import fixed_point
+        import pid
+        float_pid = pid.PID(*settings["gains"], output_limit=settings["output_limit"])
+        fixed_pid = fixed_point.FixedPID(*settings["gains"], scale=settings["scale"],
+                                         output_limit=fixed_point.FULL_DUTY)
+
+        start = time.perf_counter_ns()
+        for value, setpoint, dt, _, _, _ in recorded:
+            float_pid.setpoint = setpoint
+            float_pid.calculate(value, dt)
+        float_ns = (time.perf_counter_ns() - start) / len(recorded)
+
+        start = time.perf_counter_ns()
+        for _, _, _, count, setpoint, dt_ns in recorded:
+            fixed_pid.setpoint = setpoint
+            fixed_pid.calculate(count, dt_ns)
+        fixed_ns = (time.perf_counter_ns() - start) / len(recorded)
+    return float_ns, fixed_ns
+
+
+def _rms(values):
+    return math.sqrt(sum(value * value for value in values) / len(values)) if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of simulated time to run each path for")
+    motor_sim.add_model_arguments(parser)
+    args = parser.parse_args()
+
+    model = motor_sim.model_from_args(args)
+    samples, settings, recorded = run_float(args.duration, model)
+    fixed_errors = run_fixed(args.duration, model)
+    if not samples:
+        sys.exit("The example made no PID calculations")
+
+    differences = [abs(float_out - fixed_out) for float_out, fixed_out, _ in samples]
+    worst = max(differences)
+    float_ns, fixed_ns = time_calls(settings, recorded)
+
+    print("Updates compared       = %d" % len(samples))
+    print("Throttle difference    = %.5f mean, %.5f max (tolerance %.5f)" % (
+        sum(differences) / len(differences), worst, TOLERANCE))
+    print("Tracking error (float) = %.3f degrees RMS" % _rms([error for _, _, error in samples]))
+    print("Tracking error (fixed) = %.3f degrees RMS" % _rms(fixed_errors))
+    print("Host cost per call     = %.0f ns float, %.0f ns fixed" % (float_ns, fixed_ns))
+
+    if worst > TOLERANCE:
+        print("FAIL: the fixed-point path differs by more than the tolerance")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# SPDX-License-Identifier: MIT
+
+"""
+Measure how much each update of the motor control examples costs.
+
+Each example is run against motor_sim.py's simulated hardware, with the
+parts of its loop wrapped so the time spent in each is totalled per update:
+
+    encoder        reading rotaryio.IncrementalEncoder.position
+    snapshot       EncoderSnapshot's capture(), scale() and rates(), less
+                   the encoder reads inside them
+    estimator      VelocityEstimator.update()
+    pid            PID.calculate(), and MultiPID.calculate() and
+                   calculate_channel()
+    interpolation  the trajectory.Profile lookups and move(), fixed_point's
+                   FixedProfile, and MotionQueue.update()
+    kinematics     Kinematics.inverse() and forward(), and Odometry.update()
+    current        CurrentMonitor.update()
+    throttle       setting DCMotor.throttle, and ThrottleMap.throttle()
+    print          print(), telemetry.Telemetry's log() and drain(), and
+                   loop_trace.LoopTrace's
+    other          everything else in the update
+
+The time spent simulating the motors is left out, as is the time asleep
+between updates. The mean, 99th percentile and maximum of each part are
+printed and saved as JSON, along with the git revision they were measured
+at, so a later run can be compared against them:
+
+    python tools/loop_benchmark.py --output before.json
+    python tools/loop_benchmark.py --compare before.json
+
+The times are of this computer running CPython, not of an RP2040, so use
+them to compare revisions and to see where the time goes, rather than as
+the share of the update period the board will use.
+"""
+
+import argparse
+import builtins
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import motor_sim
+
+SCRIPTS = [
+    "motor2040/velocity_control.py",
+    "motor2040/position_control.py",
+    "motor2040/position_on_velocity_control.py",
+    "motor2040/quad_position_wave.py",
+    "motor2040/quad_velocity_sequence.py",
+]
+
+CATEGORIES = ("encoder", "snapshot", "estimator", "pid", "interpolation", "kinematics", "current", "throttle", "print",
+              "other", "total")
+
+_perf_ns = time.perf_counter_ns
+
+
+class Profiler:
+    """Totals the time spent in each part of an update, excluding anything nested inside."""
+
+    def __init__(self):
+        self.samples = {category: [] for category in CATEGORIES}
+        self._current = dict.fromkeys(CATEGORIES[:-2], 0)
+        self._stack = []
+        self._excluded = 0
+        self._overhead = 0
+        self._tick_start = None
+        self.overhead_ns = 0
+        self.inner_overhead_ns = 0
+        self._calibrate()
+
+    def _calibrate(self):
+        # Find the cost of the wrapper itself, so it can be taken off every call. Part of it
+        # falls between the two readings of the clock, so is taken off the call's own part,
+        # and the rest falls in whatever called it, so is taken off that
+        def func():
+            pass
+
+        wrapped = self.wrap("pid", func)
+        calls = 20000
+        start = _perf_ns()
+        for _ in range(calls):
+            func()
+        bare = _perf_ns() - start
+        start = _perf_ns()
+        for _ in range(calls):
+            wrapped()
+        full = _perf_ns() - start
+        inner = self._current["pid"]
+        self._current["pid"] = 0
+        self._overhead = 0
+        self.overhead_ns = max(full - bare, 0) // calls
+        self.inner_overhead_ns = min(max(inner - bare, 0) // calls, self.overhead_ns)
+
+    def _enter(self):
+        self._stack.append([_perf_ns(), 0])
+
+    def _exit(self, category):
+        start, nested = self._stack.pop()
+        elapsed = _perf_ns() - start
+        self._overhead += self.overhead_ns
+        if category is None:
+            self._excluded += elapsed
+        else:
+            self._current[category] += max(elapsed - nested - self.inner_overhead_ns, 0)
+        if self._stack:
+            self._stack[-1][1] += elapsed + self.overhead_ns - self.inner_overhead_ns
+
+    def wrap(self, category, func):
+        def wrapper(*args, **kwargs):
+            self._enter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._exit(category)
+        return wrapper
+
+    def exclude(self, func):
+        return self.wrap(None, func)
+
+    def end_update(self):
+        now = _perf_ns()
+        if self._tick_start is not None:
+            total = max(now - self._tick_start - self._excluded - self._overhead, 0)
+            measured = 0
+            for category, value in self._current.items():
+                self.samples[category].append(value)
+                measured += value
+            self.samples["other"].append(max(total - measured, 0))
+            self.samples["total"].append(total)
+        for category in self._current:
+            self._current[category] = 0
+
+    def start_update(self):
+        self._excluded = 0
+        self._overhead = 0
+        self._tick_start = _perf_ns()
+
+
+def _wrap_property(cls, name, profiler, category, getter=False, setter=False):
+    prop = getattr(cls, name)
+    fget = profiler.wrap(category, prop.fget) if getter else prop.fget
+    fset = profiler.wrap(category, prop.fset) if setter and prop.fset else prop.fset
+    setattr(cls, name, property(fget, fset))
+
+
+def _wrap_method(cls, name, profiler, category):
+    setattr(cls, name, profiler.wrap(category, getattr(cls, name)))
+
+
+def _summarise(values):
+    if not values:
+        return {"mean_us": 0.0, "p99_us": 0.0, "max_us": 0.0}
+    ordered = sorted(values)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return {
+        "mean_us": round(sum(values) / len(values) / 1000, 3),
+        "p99_us": round(p99 / 1000, 3),
+        "max_us": round(ordered[-1] / 1000, 3),
+    }
+
+
+def benchmark(script, duration, model=None):
+    """Run one example and return the cost of its updates, broken down by part."""
+    sim = motor_sim.Simulation(duration, model)
+    profiler = Profiler()
+    original_print = builtins.print
+
+    def prepare():
+        # Wrap the simulated hardware and the shared lib modules the example will import
+        sim.sync = profiler.exclude(sim.sync)
+        _wrap_property(sys.modules["rotaryio"].IncrementalEncoder, "position", profiler, "encoder", getter=True)
+        _wrap_property(sys.modules["adafruit_motor.motor"].DCMotor, "throttle", profiler, "throttle", setter=True)
+
+        import pid
+        _wrap_method(pid.PID, "calculate", profiler, "pid")
+        for name in ("calculate", "calculate_channel"):
+            _wrap_method(pid.MultiPID, name, profiler, "pid")
+
+        import encoder_snapshot
+        for name in ("capture", "scale", "rates"):
+            _wrap_method(encoder_snapshot.EncoderSnapshot, name, profiler, "snapshot")
+
+        import velocity_estimator
+        _wrap_method(velocity_estimator.VelocityEstimator, "update", profiler, "estimator")
+
+        import trajectory
+        for name in ("position", "velocity", "acceleration", "fraction", "move"):
+            _wrap_method(trajectory.Profile, name, profiler, "interpolation")
+
+        import fixed_point
+        for name in ("position", "move"):
+            _wrap_method(fixed_point.FixedProfile, name, profiler, "interpolation")
+
+        import motion_queue
+        _wrap_method(motion_queue.MotionQueue, "update", profiler, "interpolation")
+
+        import kinematics
+        for name in ("inverse", "forward"):
+            _wrap_method(kinematics.Kinematics, name, profiler, "kinematics")
+        _wrap_method(kinematics.Odometry, "update", profiler, "kinematics")
+
+        import current_monitor
+        _wrap_method(current_monitor.CurrentMonitor, "update", profiler, "current")
+
+        import throttle_map
+        _wrap_method(throttle_map.ThrottleMap, "throttle", profiler, "throttle")
+
+        import telemetry
+        import loop_trace
+        for cls in (telemetry.Telemetry, loop_trace.LoopTrace):
+            for name in ("log", "drain"):
+                _wrap_method(cls, name, profiler, "print")
+
+        # Each sleep marks the end of one update and the start of the next
+        fake_time = sys.modules["time"]
+        sleep = fake_time.sleep
+
+        def timed_sleep(seconds):
+            profiler.end_update()
+            sleep(seconds)
+            profiler.start_update()
+
+        fake_time.sleep = timed_sleep
+        builtins.print = profiler.wrap("print", original_print)
+
+    try:
+        result = motor_sim.run(os.path.join(motor_sim.REPO_DIR, script), sim, quiet=True, prepare=prepare)
+    finally:
+        builtins.print = original_print
+
+    updates = result.get("UPDATES")
+    summary = {
+        "updates": len(profiler.samples["total"]),
+        "period_us": round(1000000 / updates, 3) if updates else None,
+        "wrapper_overhead_ns": profiler.overhead_ns,
+        "wrapper_inner_overhead_ns": profiler.inner_overhead_ns,
+        "parts": {category: _summarise(profiler.samples[category]) for category in CATEGORIES},
+    }
+    return summary
+
+
+def _revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=motor_sim.REPO_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_report(results, previous=None):
+    for script, summary in results.items():
+        print(script, "(%d updates)" % summary["updates"])
+        print("    %-14s %10s %10s %10s" % ("part", "mean us", "p99 us", "max us"), end="")
+        print("   change" if previous else "")
+        for category in CATEGORIES:
+            part = summary["parts"][category]
+            print("    %-14s %10.2f %10.2f %10.2f" % (category, part["mean_us"], part["p99_us"], part["max_us"]), end="")
+            old = previous.get(script, {}).get("parts", {}).get(category) if previous else None
+            if old and old["mean_us"]:
+                print("   %+6.1f%%" % (((part["mean_us"] / old["mean_us"]) - 1) * 100))
+            else:
+                print("")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scripts", nargs="*", default=SCRIPTS, help="the examples to measure (default: the closed-loop ones)")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of simulated time to run each for")
+    parser.add_argument("--output", default="loop_benchmark.json", help="where to save the results")
+    parser.add_argument("--compare", help="results from an earlier run to compare against")
+    motor_sim.add_model_arguments(parser)
+    args = parser.parse_args()
+
+    model = motor_sim.model_from_args(args)
+    results = {script: benchmark(script, args.duration, model) for script in args.scripts}
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)["results"]
+    _print_report(results, previous)
+
+    with open(args.output, "w") as file:
+        json.dump({
+            "revision": _revision(),
+            "python": platform.python_implementation() + " " + platform.python_version(),
+            "machine": platform.machine(),
+            "duration": args.duration,
+            "results": results,
+        }, file, indent=2)
+    print("Saved results to", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# SPDX-License-Identifier: MIT
+
+"""
+Stream timed multi-axis moves to lib/motion_queue.py's MotionLink.
+
+Each segment is a duration in seconds followed by where each axis should be at
+its end, and optionally how fast each should be going there (otherwise the
+board blends it into the next segment). Segments are read from a CSV file with
+one per line, or made up by --demo, which sweeps every axis through a sine wave
+a quarter of a turn out of phase with the last, in segments as short as the
+control loop's update so the queue is fed at the full loop rate:
+
+    0.5, 90, 90, -90, -90
+    0.5, 180, 0, 0, -180, 0, 0, 0, 0
+
+They are sent to the board's usb_cdc data channel (enable it in boot.py), which
+holds up this tool while the board's queue is full, so they are sent no faster
+than they are used. They can also be saved to a file, for motor_sim.py's --input:
+
+    python tools/motion_stream.py moves.csv --port /dev/ttyACM1
+    python tools/motion_stream.py --demo 10 --output moves.bin
+"""
+
+import argparse
+import math
+import struct
+import sys
+
+SYNC = b"\xa5\x5c"
+FLAG_VELOCITIES = 0x01
+FLAG_CLEAR = 0x02
+FRAME_START = "<2sBBHf"
+
+
+class SegmentEncoder:
+    """Packs segments into the frames MotionLink reads, numbering them in turn."""
+
+    def __init__(self, axes):
+        self.axes = axes
+        self.format = FRAME_START + "%df" % (2 * axes)
+        self.sequence = 0
+
+    def frame(self, duration, positions, velocities=None, clear=False):
+        if len(positions) != self.axes or (velocities is not None and len(velocities) != self.axes):
+            raise ValueError("expected a position (and velocity) for each of the %d axes" % self.axes)
+        if not duration > 0:
+            raise ValueError("expected a duration of more than 0")
+
+        flags = (FLAG_VELOCITIES if velocities is not None else 0) | (FLAG_CLEAR if clear else 0)
+        data = struct.pack(self.format, SYNC, self.axes, flags, self.sequence, duration, *positions,
+                           *(velocities if velocities is not None else [0.0] * self.axes))
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        return data
+
+
+def read_segments(path, axes):
+    """Yield the (duration, positions, velocities) of each line of a CSV file."""
+    with open(path) as file:
+        for number, line in enumerate(file, 1):
+            line = line.split("#")[0].strip()
+            if not line:
+                continue
+            try:
+                values = [float(value) for value in line.split(",")]
+            except ValueError:
+                if number == 1:
+                    continue    # A header
+                raise SystemExit("%s:%d: expected numbers" % (path, number))
+            if len(values) == 1 + axes:
+                yield values[0], values[1:], None
+            elif len(values) == 1 + (2 * axes):
+                yield values[0], values[1:1 + axes], values[1 + axes:]
+            else:
+                raise SystemExit("%s:%d: expected a duration then %d positions, and optionally %d velocities"
+                                 % (path, number, axes, axes))
+
+
+def demo_segments(seconds, axes, segment_time, amplitude, period):
+    """Yield segments sweeping each axis through a sine wave, starting from 0."""
+    phases = [(math.pi / 2) * axis for axis in range(axes)]
+    for step in range(1, round(seconds / segment_time) + 1):
+        angle = (2 * math.pi * step * segment_time) / period
+        yield segment_time, [amplitude * (math.sin(angle + phase) - math.sin(phase)) for phase in phases], None
+
+
+def _open_output(args):
+    if args.port:
+        try:
+            import serial
+        except ImportError:
+            sys.exit("Writing to a serial port needs pyserial: pip install pyserial")
+        port = serial.Serial(args.port, args.baud, write_timeout=None)
+        return port.write, port.close
+    if args.output in (None, "-"):
+        return sys.stdout.buffer.write, sys.stdout.buffer.flush
+    file = open(args.output, "wb")
+    return file.write, file.close
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", nargs="?", help="a CSV file of segments to send")
+    parser.add_argument("--demo", type=float, metavar="SECONDS", help="send this many seconds of sine waves instead")
+    parser.add_argument("--axes", type=int, default=4, help="the number of axes the board's queue has")
+    parser.add_argument("--segment-time", type=float, default=0.01, help="the seconds each --demo segment takes")
+    parser.add_argument("--amplitude", type=float, default=180.0, help="how far each --demo wave swings, in degrees")
+    parser.add_argument("--period", type=float, default=2.0, help="the seconds each --demo wave takes")
+    parser.add_argument("--clear", action="store_true", help="drop whatever the board has queued before the first")
+    parser.add_argument("--port", help="a serial port to send to, such as /dev/ttyACM1 or COM4")
+    parser.add_argument("--baud", type=int, default=115200, help="the baud rate of the serial port")
+    parser.add_argument("--output", help="write the frames to this file (or - for stdout) rather than a port")
+    args = parser.parse_args()
+
+    if (args.input is None) == (args.demo is None):
+        parser.error("give either a CSV file of segments or --demo")
+    if args.demo is not None:
+        segments = demo_segments(args.demo, args.axes, args.segment_time, args.amplitude, args.period)
+    else:
+        segments = read_segments(args.input, args.axes)
+
+    write, close = _open_output(args)
+    encoder = SegmentEncoder(args.axes)
+    count = 0
+    total = 0.0
+    try:
+        for duration, positions, velocities in segments:
+            write(encoder.frame(duration, positions, velocities, clear=args.clear and count == 0))
+            count += 1
+            total += duration
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close()
+
+    print("Sent %d segments, covering %.2fs" % (count, total), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,864 @@
+# SPDX-License-Identifier: MIT
+
+"""
+Run the motor examples on a computer, against a simulated motor and encoder.
+
+This stands in for the board, microcontroller, pwmio, digitalio, keypad,
+rotaryio, analogio, usb_cdc, neopixel and adafruit_motor modules, plus time and asyncio modules
+driven by a virtual clock and a gc module whose collections take virtual time, so an example such as motor2040/velocity_control.py can be run unmodified:
+
+    python tools/motor_sim.py motor2040/velocity_control.py --duration 10
+
+Each motor is modelled as a geared, brushed DC motor with its electrical time
+constant neglected (the PWM period is far shorter than the mechanical one), so
+the current is set by the average of the H-bridge states over a PWM cycle.
+This captures how SLOW_DECAY (braking in the off time) gives a near-linear
+throttle-to-speed curve while FAST_DECAY (coasting in the off time) does not,
+along with the deadband that Coulomb friction causes at low throttle.
+
+The clock only advances when the example sleeps, plus a small fixed cost for
+each call made to the simulated hardware, so examples run many times faster
+than real time. When the duration is up, every button reads as pressed so the
+example can exit its loop the way it would on the board.
+"""
+
+import argparse
+import contextlib
+import heapq
+import io
+import math
+import os
+import re
+import runpy
+import sys
+import time as _host_time
+import types
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIB_DIR = os.path.join(REPO_DIR, "lib")
+
+FAST_DECAY = 0
+SLOW_DECAY = 1
+
+# The ADC mux addresses of the Motor 2040
+MOTOR2040_CONSTANTS = {
+    "NUM_MOTORS": 4,
+    "NUM_ENCODERS": 4,
+    "NUM_SENSORS": 2,
+    "NUM_LEDS": 1,
+    "CURRENT_SENSE_A_ADDR": 0,
+    "CURRENT_SENSE_B_ADDR": 1,
+    "CURRENT_SENSE_C_ADDR": 2,
+    "CURRENT_SENSE_D_ADDR": 3,
+    "VOLTAGE_SENSE_ADDR": 4,
+    "FAULT_SENSE_ADDR": 5,
+    "SENSOR_1_ADDR": 6,
+    "SENSOR_2_ADDR": 7,
+}
+
+# The analog front end of the Motor 2040, used to turn simulated readings back into ADC values
+ADC_REFERENCE = 3.3
+VOLTAGE_GAIN = 13.9 / 3.9
+CURRENT_GAIN = 1 / 0.47
+CURRENT_OFFSET = -0.005
+
+# The simulated garbage collector
+GC_COLLECT_NS = 3000000
+GC_MEM_FREE = 150000
+
+# The size of the RP2040's microcontroller.nvm, which starts erased
+NVM_SIZE = 4096
+
+# The bytes of usb_cdc input that can be waiting to be read at once
+SERIAL_BUFFER = 256
+
+# Pins that are not named after their motor, such as those of the Pico Motor Shim, and
+# the encoder pico_motor_shim/pwm_benchmark.py expects wired to its first motor
+PIN_CHANNELS = {
+    "GP6": ("1", "P"),
+    "GP7": ("1", "N"),
+    "GP0": ("1", "A"),
+    "GP1": ("1", "B"),
+    "GP27": ("2", "P"),
+    "GP26": ("2", "N"),
+}
+
+
+class SimulationEnd(Exception):
+    pass
+
+
+class MotorModel:
+    """A geared DC motor with a quadrature encoder on its motor shaft."""
+
+    def __init__(self, gear_ratio=50, encoder_counts=12, supply_voltage=5.0, resistance=3.1,
+                 torque_constant=0.00278, inertia=7.5e-8, viscous_friction=2e-9,
+                 coulomb_friction=0.00025, load_inertia=0.0, load_torque=0.0):
+        # The viscous friction must be above zero, so a coasting motor always slows down
+        self.gear_ratio = gear_ratio
+        self.encoder_counts = encoder_counts            # Counts per turn of the motor shaft
+        self.supply_voltage = supply_voltage            # Volts
+        self.resistance = resistance                    # Ohms
+        self.torque_constant = torque_constant          # Nm/A, and V.s/rad for back-EMF
+        self.inertia = inertia                          # kg.m^2 at the motor shaft
+        self.viscous_friction = viscous_friction        # Nm.s/rad at the motor shaft
+        self.coulomb_friction = coulomb_friction        # Nm at the motor shaft
+        self.load_inertia = load_inertia                # kg.m^2 at the output shaft
+        self.load_torque = load_torque                  # Nm of friction at the output shaft
+
+    @property
+    def total_inertia(self):
+        return self.inertia + (self.load_inertia / (self.gear_ratio * self.gear_ratio))
+
+
+class Plant:
+    """The state of one simulated motor, driven by a pair of PWM outputs."""
+
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+        self.pwm_p = None
+        self.pwm_n = None
+        self.speed = 0.0            # rad/s at the motor shaft
+        self.angle = 0.0            # rad at the motor shaft
+        self.current = 0.0          # A through the motor, averaged over a PWM cycle
+        self.supply_current = 0.0   # A drawn from the supply, averaged over a PWM cycle
+        self.stalled = False        # Hold the output shaft still, as if blocked
+        self.synced_ns = 0          # The simulated time the state was last brought up to
+
+    def _bridge(self):
+        dp = self.pwm_p.duty_cycle / 0xFFFF if self.pwm_p is not None else 0.0
+        dn = self.pwm_n.duty_cycle / 0xFFFF if self.pwm_n is not None else 0.0
+        # Both outputs turn on at the start of each PWM cycle, so the bridge spends
+        # min(dp, dn) shorted, |dp - dn| driving and the rest of the cycle open
+        return dp - dn, max(dp, dn)
+
+    @property
+    def output_speed(self):
+        # Revolutions per second of the output shaft
+        return self.speed / (2 * math.pi * self.model.gear_ratio)
+
+    @property
+    def output_revs(self):
+        return self.angle / (2 * math.pi * self.model.gear_ratio)
+
+    @property
+    def counts(self):
+        return math.floor(self.angle * self.model.encoder_counts / (2 * math.pi))
+
+    def step(self, dt):
+        m = self.model
+        drive, conducting = self._bridge()
+        vs = m.supply_voltage
+        kt = m.torque_constant
+
+        if self.stalled:
+            self.speed = 0.0
+        else:
+            inertia = m.total_inertia
+            friction = m.coulomb_friction + (m.load_torque / m.gear_ratio)
+            drive_torque = kt * vs * drive / m.resistance
+            damping = ((kt * kt * conducting / m.resistance) + m.viscous_friction) / inertia
+
+            # Between PWM changes the speed decays exponentially towards where the drive,
+            # back-EMF and friction balance, so integrate that exactly rather than in small
+            # steps. Friction flips direction with the shaft, so stop at zero speed if needed
+            remaining = dt
+            while remaining > 0:
+                if self.speed == 0.0:
+                    # Static friction holds the shaft until the drive overcomes it
+                    if abs(drive_torque) <= friction:
+                        break
+                    direction = math.copysign(1.0, drive_torque)
+                else:
+                    direction = math.copysign(1.0, self.speed)
+
+                w0 = self.speed
+                w_inf = (drive_torque - (direction * friction)) / (inertia * damping)
+                t = remaining
+                stopping = (w_inf * direction) < 0
+                if stopping:
+                    t_stop = math.log((w0 - w_inf) / -w_inf) / damping
+                    if t_stop < t:
+                        t = t_stop
+                    else:
+                        stopping = False
+
+                decay = math.exp(-damping * t)
+                self.angle += (w_inf * t) + ((w0 - w_inf) * (1 - decay) / damping)
+                self.speed = 0.0 if stopping else w_inf + ((w0 - w_inf) * decay)
+                remaining -= t
+
+        back_emf = kt * self.speed
+        self.current = ((vs * drive) - (back_emf * conducting)) / m.resistance
+        self.supply_current = abs(drive) * abs(vs - math.copysign(back_emf, drive)) / m.resistance
+
+
+class Simulation:
+    """The virtual clock and simulated hardware shared by the fake modules."""
+
+    def __init__(self, duration, model=None, call_cost=0.000005, models=None):
+        self.duration_ns = int(duration * 1e9)
+        self.call_cost_ns = int(call_cost * 1e9)
+        self.default_model = model if model is not None else MotorModel()
+        self.models = models or {}
+        self.now_ns = 0
+        self.plants = {}
+        self.pins = {}
+        self.listeners = []
+        self.serial = None          # A binary file to receive what is written to usb_cdc, enabling usb_cdc.data
+        self.serial_input = None    # A binary file to be read from usb_cdc.data, which also enables it
+        self.nvm = bytearray(b"\xff" * NVM_SIZE)     # What microcontroller.nvm holds, which can be loaded and saved between runs
+
+    # The clock
+
+    @property
+    def finished(self):
+        return self.now_ns >= self.duration_ns
+
+    def cost(self):
+        self.now_ns += self.call_cost_ns
+
+    def sync(self, plant=None):
+        # The motors are integrated exactly between PWM changes, so each only needs bringing
+        # up to date when something is about to read it or change how it is driven
+        for plant in (self.plants.values() if plant is None else (plant,)):
+            if plant.synced_ns != self.now_ns:
+                plant.step((self.now_ns - plant.synced_ns) / 1e9)
+                plant.synced_ns = self.now_ns
+
+    def sleep(self, seconds):
+        if self.now_ns >= self.duration_ns + 1000000000:
+            # The example has carried on a second past its button press, so stop it
+            raise SimulationEnd()
+        if seconds > 0:
+            self.now_ns += int(seconds * 1e9)
+        else:
+            self.cost()
+        if self.listeners:
+            self.sync()
+            for listener in self.listeners:
+                listener(self)
+
+    # The hardware
+
+    def plant(self, channel):
+        if channel not in self.plants:
+            model = self.models.get(channel, self.default_model)
+            self.plants[channel] = Plant(channel, model)
+            self.plants[channel].synced_ns = self.now_ns
+        return self.plants[channel]
+
+    def pin_value(self, name):
+        return self.pins.get(name, False)
+
+    def button_value(self, name, pull_up):
+        # All buttons are released until the duration is up, then pressed
+        return (not self.finished) if pull_up else self.finished
+
+    def mux_address(self):
+        return (int(bool(self.pin_value("ADC_ADDR_0")))
+                | (int(bool(self.pin_value("ADC_ADDR_1"))) << 1)
+                | (int(bool(self.pin_value("ADC_ADDR_2"))) << 2))
+
+    def adc_voltage(self, pin_name):
+        if pin_name == "SHARED_ADC":
+            address = self.mux_address()
+            if address < 4:
+                plant = self.plants.get("ABCD"[address])
+                current = abs(plant.current) if plant is not None else 0.0
+                return (current / CURRENT_GAIN) - CURRENT_OFFSET
+            if address == MOTOR2040_CONSTANTS["VOLTAGE_SENSE_ADDR"]:
+                return self.default_model.supply_voltage / VOLTAGE_GAIN
+            return 0.0
+        return 0.0
+
+
+def _pin_channel(name):
+    match = re.match(r"MOTOR_(\w)_([PN])$", name)
+    if match:
+        return match.group(1), match.group(2)
+    match = re.match(r"ENCODER_(\w)_([AB])$", name)
+    if match:
+        return match.group(1), match.group(2)
+    return PIN_CHANNELS.get(name, (None, None))
+
+
+class Pin:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "board." + self.name
+
+
+def _make_modules(sim):
+    modules = {}
+
+    # board
+    board = types.ModuleType("board")
+    pins = {}
+
+    def board_getattr(name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if name not in pins:
+            pins[name] = Pin(name)
+        return pins[name]
+
+    board.__getattr__ = board_getattr
+    for key, value in MOTOR2040_CONSTANTS.items():
+        setattr(board, key, value)
+    modules["board"] = board
+
+    # microcontroller, for its nvm
+    microcontroller = types.ModuleType("microcontroller")
+    microcontroller.nvm = sim.nvm
+    modules["microcontroller"] = microcontroller
+
+    # time
+    fake_time = types.ModuleType("time")
+
+    def monotonic_ns():
+        sim.cost()
+        return sim.now_ns
+
+    fake_time.monotonic_ns = monotonic_ns
+    fake_time.monotonic = lambda: monotonic_ns() / 1e9
+    fake_time.sleep = sim.sleep
+    fake_time.time = lambda: int(monotonic_ns() // 1000000000)
+    modules["time"] = fake_time
+
+    # asyncio, running its tasks one at a time on the virtual clock
+    modules["asyncio"] = _make_asyncio(sim)
+
+    # gc, where a collection takes as long as a full one can on the RP2040. The host's
+    # allocations say nothing about the board's, so mem_free() always reports the same
+    fake_gc = types.ModuleType("gc")
+
+    def collect():
+        sim.now_ns += GC_COLLECT_NS
+
+    fake_gc.collect = collect
+    fake_gc.enable = lambda: None
+    fake_gc.disable = lambda: None
+    fake_gc.mem_free = lambda: GC_MEM_FREE
+    fake_gc.mem_alloc = lambda: 0
+    modules["gc"] = fake_gc
+
+    # pwmio
+    pwmio = types.ModuleType("pwmio")
+
+    class PWMOut:
+        def __init__(self, pin, *, duty_cycle=0, frequency=500, variable_frequency=False):
+            self.pin = pin
+            self._duty_cycle = duty_cycle
+            self.frequency = frequency
+            self._plant = None
+            channel, side = _pin_channel(pin.name)
+            if channel is not None and side in "PN":
+                self._plant = sim.plant(channel)
+                if side == "P":
+                    self._plant.pwm_p = self
+                else:
+                    self._plant.pwm_n = self
+
+        @property
+        def duty_cycle(self):
+            return self._duty_cycle
+
+        @duty_cycle.setter
+        def duty_cycle(self, value):
+            if not 0 <= value <= 0xFFFF:
+                raise ValueError("duty_cycle must be between 0 and 65535")
+            sim.cost()
+            if self._plant is not None:
+                sim.sync(self._plant)
+            self._duty_cycle = int(value)
+
+        def deinit(self):
+            pass
+
+    pwmio.PWMOut = PWMOut
+    modules["pwmio"] = pwmio
+
+    # digitalio
+    digitalio = types.ModuleType("digitalio")
+
+    class Direction:
+        INPUT = "INPUT"
+        OUTPUT = "OUTPUT"
+
+    class Pull:
+        UP = "UP"
+        DOWN = "DOWN"
+
+    class DigitalInOut:
+        def __init__(self, pin):
+            self.pin = pin
+            self.direction = Direction.INPUT
+            self.pull = None
+
+        def switch_to_output(self, value=False, drive_mode=None):
+            self.direction = Direction.OUTPUT
+            self.value = value
+
+        def switch_to_input(self, pull=None):
+            self.direction = Direction.INPUT
+            self.pull = pull
+
+        @property
+        def value(self):
+            sim.cost()
+            if self.direction == Direction.OUTPUT:
+                return sim.pin_value(self.pin.name)
+            return sim.button_value(self.pin.name, self.pull == Pull.UP)
+
+        @value.setter
+        def value(self, value):
+            sim.cost()
+            sim.pins[self.pin.name] = value
+
+        def deinit(self):
+            pass
+
+    digitalio.Direction = Direction
+    digitalio.Pull = Pull
+    digitalio.DigitalInOut = DigitalInOut
+    modules["digitalio"] = digitalio
+
+    # keypad, scanning the buttons whenever its events are checked
+    keypad = types.ModuleType("keypad")
+
+    class Event:
+        def __init__(self, key_number=0, pressed=True):
+            self.key_number = key_number
+            self.pressed = pressed
+            self.timestamp = 0
+
+        @property
+        def released(self):
+            return not self.pressed
+
+    class EventQueue:
+        def __init__(self, keys, max_events):
+            self._keys = keys
+            self._events = []
+            self._max_events = max_events
+            self.overflowed = False
+
+        def _put(self, key_number, pressed):
+            if len(self._events) >= self._max_events:
+                self.overflowed = True
+            else:
+                self._events.append((key_number, pressed, sim.now_ns // 1000000))
+
+        def get_into(self, event):
+            sim.cost()
+            self._keys._scan()
+            if not self._events:
+                return False
+            event.key_number, event.pressed, event.timestamp = self._events.pop(0)
+            return True
+
+        def get(self):
+            event = Event()
+            return event if self.get_into(event) else None
+
+        def clear(self):
+            self._events.clear()
+            self.overflowed = False
+
+        def __len__(self):
+            self._keys._scan()
+            return len(self._events)
+
+    class Keys:
+        def __init__(self, pins, *, value_when_pressed, pull=True, interval=0.02, max_events=64):
+            self._names = [pin.name for pin in pins]
+            self._pull_up = pull and not value_when_pressed
+            self._value_when_pressed = value_when_pressed
+            self._down = [False] * len(pins)
+            self.key_count = len(pins)
+            self.events = EventQueue(self, max_events)
+
+        def _scan(self):
+            for i, name in enumerate(self._names):
+                down = sim.button_value(name, self._pull_up) == self._value_when_pressed
+                if down != self._down[i]:
+                    self._down[i] = down
+                    self.events._put(i, down)
+
+        def reset(self):
+            self._down = [False] * len(self._names)
+
+        def deinit(self):
+            pass
+
+    keypad.Event = Event
+    keypad.EventQueue = EventQueue
+    keypad.Keys = Keys
+    modules["keypad"] = keypad
+
+    # rotaryio
+    rotaryio = types.ModuleType("rotaryio")
+
+    class IncrementalEncoder:
+        def __init__(self, pin_a, pin_b, divisor=4):
+            channel, side = _pin_channel(pin_a.name)
+            self._plant = sim.plant(channel) if channel is not None else None
+            # A motor's encoder counts up when driven forward with its B channel given first
+            self._sign = 1 if side == "B" else -1
+            self.divisor = divisor
+            self._offset = 0
+
+        @property
+        def position(self):
+            sim.cost()
+            if self._plant is None:
+                return self._offset
+            sim.sync(self._plant)
+            return ((self._sign * self._plant.counts) // self.divisor) + self._offset
+
+        @position.setter
+        def position(self, value):
+            self._offset = 0
+            self._offset = value - self.position
+
+        def deinit(self):
+            pass
+
+    rotaryio.IncrementalEncoder = IncrementalEncoder
+    modules["rotaryio"] = rotaryio
+
+    # analogio
+    analogio = types.ModuleType("analogio")
+
+    class AnalogIn:
+        def __init__(self, pin):
+            self.pin = pin
+            self.reference_voltage = ADC_REFERENCE
+
+        @property
+        def value(self):
+            sim.cost()
+            sim.sync()
+            voltage = sim.adc_voltage(self.pin.name)
+            return max(0, min(int(voltage * 65536 / ADC_REFERENCE), 0xFFFF))
+
+        def deinit(self):
+            pass
+
+    analogio.AnalogIn = AnalogIn
+    modules["analogio"] = analogio
+
+    # neopixel, which just holds the colours it is given
+    neopixel = types.ModuleType("neopixel")
+
+    class NeoPixel:
+        def __init__(self, pin, n, *, bpp=3, brightness=1.0, auto_write=True, pixel_order=None):
+            self._pixels = [(0,) * bpp] * n
+            self.brightness = brightness
+            self.auto_write = auto_write
+
+        def __len__(self):
+            return len(self._pixels)
+
+        def __getitem__(self, index):
+            return self._pixels[index]
+
+        def __setitem__(self, index, value):
+            sim.cost()
+            self._pixels[index] = value
+
+        def fill(self, value):
+            sim.cost()
+            self._pixels = [value] * len(self._pixels)
+
+        def show(self):
+            sim.cost()
+
+        def deinit(self):
+            pass
+
+    neopixel.NeoPixel = NeoPixel
+    modules["neopixel"] = neopixel
+
+    # usb_cdc, with only the console enabled as it is by default, unless there is a file to
+    # write the data channel to or input to read from it. Input is held back as it would be by the USB, so only
+    # SERIAL_BUFFER bytes are waiting to be read at a time
+    usb_cdc = types.ModuleType("usb_cdc")
+
+    class Serial:
+        def __init__(self, source=None):
+            self.timeout = 1
+            self.write_timeout = None
+            self._source = source
+            self._waiting = b""
+
+        @property
+        def in_waiting(self):
+            if self._source is not None and len(self._waiting) < SERIAL_BUFFER:
+                self._waiting += self._source.read(SERIAL_BUFFER - len(self._waiting))
+            return len(self._waiting)
+
+        def write(self, data):
+            sim.cost()
+            if sim.serial is not None:
+                sim.serial.write(data)
+            return len(data)
+
+        def read(self, size=1):
+            sim.cost()
+            size = min(size, self.in_waiting)
+            data, self._waiting = self._waiting[:size], self._waiting[size:]
+            return data
+
+        def readinto(self, buffer):
+            data = self.read(len(buffer))
+            buffer[:len(data)] = data
+            return len(data)
+
+        def flush(self):
+            pass
+
+    usb_cdc.Serial = Serial
+    usb_cdc.console = Serial()
+    usb_cdc.data = Serial(sim.serial_input) if sim.serial is not None or sim.serial_input is not None else None
+    modules["usb_cdc"] = usb_cdc
+
+    # adafruit_motor, following the behaviour of adafruit_motor.motor.DCMotor
+    adafruit_motor = types.ModuleType("adafruit_motor")
+    motor = types.ModuleType("adafruit_motor.motor")
+    motor.FAST_DECAY = FAST_DECAY
+    motor.SLOW_DECAY = SLOW_DECAY
+
+    class DCMotor:
+        def __init__(self, positive_pwm, negative_pwm):
+            self._positive = positive_pwm
+            self._negative = negative_pwm
+            self._throttle = None
+            self.decay_mode = FAST_DECAY
+
+        @property
+        def throttle(self):
+            return self._throttle
+
+        @throttle.setter
+        def throttle(self, value):
+            if value is not None and (value > 1.0 or value < -1.0):
+                raise ValueError("Throttle must be None or between -1.0 and +1.0")
+            self._throttle = value
+            if value is None:
+                self._positive.duty_cycle = 0
+                self._negative.duty_cycle = 0
+            elif value == 0:
+                self._positive.duty_cycle = 0xFFFF
+                self._negative.duty_cycle = 0xFFFF
+            else:
+                duty_cycle = int(0xFFFF * abs(value))
+                if self.decay_mode == SLOW_DECAY:
+                    if value < 0:
+                        self._positive.duty_cycle = 0xFFFF - duty_cycle
+                        self._negative.duty_cycle = 0xFFFF
+                    else:
+                        self._positive.duty_cycle = 0xFFFF
+                        self._negative.duty_cycle = 0xFFFF - duty_cycle
+                else:
+                    if value < 0:
+                        self._positive.duty_cycle = 0
+                        self._negative.duty_cycle = duty_cycle
+                    else:
+                        self._positive.duty_cycle = duty_cycle
+                        self._negative.duty_cycle = 0
+
+        def deinit(self):
+            pass
+
+    motor.DCMotor = DCMotor
+    adafruit_motor.motor = motor
+    modules["adafruit_motor"] = adafruit_motor
+    modules["adafruit_motor.motor"] = motor
+
+    return modules
+
+
+def _make_asyncio(sim):
+    asyncio = types.ModuleType("asyncio")
+
+    class Sleep:
+        def __init__(self, seconds):
+            self.seconds = seconds
+
+        def __await__(self):
+            yield self
+
+    class Task:
+        def __init__(self, coro):
+            self.coro = coro
+            self.done = False
+            self.result = None
+            self.waiters = []
+
+        def __await__(self):
+            while not self.done:
+                yield self
+            return self.result
+
+    queue = []
+    counter = [0]
+
+    def schedule(task, wake_ns):
+        counter[0] += 1
+        heapq.heappush(queue, (wake_ns, counter[0], task))
+
+    def create_task(coro):
+        task = Task(coro)
+        schedule(task, sim.now_ns)
+        return task
+
+    async def gather(*awaitables):
+        return [await awaitable for awaitable in awaitables]
+
+    def run(coro):
+        queue.clear()
+        main = create_task(coro)
+        while not main.done:
+            wake_ns, _, task = heapq.heappop(queue)
+            if wake_ns > sim.now_ns:
+                sim.sleep((wake_ns - sim.now_ns) / 1e9)
+            sim.cost()
+            try:
+                waiting_on = task.coro.send(None)
+            except StopIteration as stop:
+                task.done = True
+                task.result = stop.value
+                for waiter in task.waiters:
+                    schedule(waiter, sim.now_ns)
+                continue
+            if isinstance(waiting_on, Task):
+                waiting_on.waiters.append(task)
+            else:
+                schedule(task, sim.now_ns + int(waiting_on.seconds * 1e9))
+        return main.result
+
+    asyncio.sleep = Sleep
+    asyncio.create_task = create_task
+    asyncio.gather = gather
+    asyncio.run = run
+    return asyncio
+
+
+@contextlib.contextmanager
+def installed(sim, script_dir=None):
+    """Put the simulated modules, and this repo's lib folder, in place of the real ones."""
+    modules = _make_modules(sim)
+    saved_modules = {name: sys.modules.get(name) for name in modules}
+    saved_path = list(sys.path)
+    lib_modules = [name[:-3] for name in os.listdir(LIB_DIR) if name.endswith(".py")]
+
+    # Make sure the lib modules are imported again, so they pick up the simulated time
+    for name in lib_modules:
+        sys.modules.pop(name, None)
+    sys.modules.update(modules)
+    sys.path[:0] = [path for path in (script_dir, LIB_DIR) if path]
+    try:
+        yield sim
+    finally:
+        for name, module in saved_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        for name in lib_modules:
+            sys.modules.pop(name, None)
+        sys.path[:] = saved_path
+
+
+def run(script, sim, quiet=False, init_globals=None, prepare=None):
+    """Run an example against the simulation, returning the globals it finished with.
+
+    If given, prepare() is called once the simulated modules are in place, just
+    before the example starts, such as to wrap parts of them for measuring.
+    """
+    script = os.path.abspath(script)
+    output = io.StringIO() if quiet else None
+    result = {}
+    with installed(sim, os.path.dirname(script)):
+        if prepare is not None:
+            prepare()
+        with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+            try:
+                result = runpy.run_path(script, init_globals=init_globals, run_name="__main__")
+            except SimulationEnd:
+                pass
+    return result
+
+
+def model_from_args(args):
+    return MotorModel(gear_ratio=args.gear_ratio, supply_voltage=args.supply_voltage,
+                      load_inertia=args.load_inertia, load_torque=args.load_torque)
+
+
+def add_model_arguments(parser):
+    parser.add_argument("--gear-ratio", type=float, default=50, help="gear ratio of each motor")
+    parser.add_argument("--supply-voltage", type=float, default=5.0, help="motor supply voltage")
+    parser.add_argument("--load-inertia", type=float, default=0.0, help="inertia on each output shaft, in kg.m^2")
+    parser.add_argument("--load-torque", type=float, default=0.0, help="friction torque on each output shaft, in Nm")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("script", help="the example to run")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of simulated time to run for")
+    parser.add_argument("--quiet", action="store_true", help="hide what the example prints")
+    parser.add_argument("--trace", help="write the state of every motor to this CSV file after each sleep")
+    parser.add_argument("--serial", help="enable usb_cdc.data and write whatever the example sends over usb_cdc to "
+                                         "this file")
+    parser.add_argument("--input", help="enable usb_cdc.data and have it read from this file, such as one saved by "
+                                        "motion_stream.py's --output option")
+    parser.add_argument("--nvm", help="load microcontroller.nvm from this file if it exists, and save it back after")
+    add_model_arguments(parser)
+    args = parser.parse_args()
+
+    sim = Simulation(args.duration, model_from_args(args))
+    trace_file = None
+    if args.trace:
+        trace_file = open(args.trace, "w")
+        trace_file.write("time,motor,output_speed,output_revs,current\n")
+
+        def write_trace(sim):
+            for plant in sim.plants.values():
+                trace_file.write("%.6f,%s,%.5f,%.5f,%.4f\n" % (
+                    sim.now_ns / 1e9, plant.name, plant.output_speed, plant.output_revs, plant.current))
+
+        sim.listeners.append(write_trace)
+
+    if args.serial:
+        sim.serial = open(args.serial, "wb")
+    if args.input:
+        sim.serial_input = open(args.input, "rb")
+    if args.nvm and os.path.exists(args.nvm):
+        with open(args.nvm, "rb") as file:
+            sim.nvm[:] = file.read(NVM_SIZE).ljust(NVM_SIZE, b"\xff")
+
+    start = _host_time.perf_counter()
+    run(args.script, sim, quiet=args.quiet)
+    elapsed = _host_time.perf_counter() - start
+    if trace_file is not None:
+        trace_file.close()
+    if sim.serial is not None:
+        sim.serial.close()
+    if sim.serial_input is not None:
+        sim.serial_input.close()
+    if args.nvm:
+        with open(args.nvm, "wb") as file:
+            file.write(sim.nvm)
+
+    simulated = sim.now_ns / 1e9
+    print("Simulated %.2fs in %.3fs (%.0fx real time)" % (simulated, elapsed, simulated / max(elapsed, 1e-9)),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
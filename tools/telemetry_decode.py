@@ -0,0 +1,168 @@
+# SPDX-License-Identifier: MIT
+
+"""
+Decode the binary telemetry sent by lib/telemetry.py back into text.
+
+Each sample is printed the way the examples used to print it, so the output
+can be plotted the same way, such as by Thonny's plotter:
+
+    Vel = 1.25, Vel SP = 1.3, Accel = 0.021, Speed = 1.41
+
+The telemetry can be read from a serial port (this needs pyserial), from a
+file such as one saved by motor_sim.py's --serial option, or from stdin:
+
+    python tools/telemetry_decode.py --port /dev/ttyACM0
+    python tools/telemetry_decode.py capture.bin --csv capture.csv
+"""
+
+import argparse
+import struct
+import sys
+
+SYNC = b"\xa5\x5a"
+HEADER_FLAG = 0x80
+FRAME_START = "<2sBH"
+FRAME_START_SIZE = struct.calcsize(FRAME_START)
+
+
+class Decoder:
+    """Turns a stream of bytes back into samples, resynchronising after any corruption."""
+
+    def __init__(self):
+        self.names = None
+        self.samples = 0
+        self.lost = 0
+        self.skipped_bytes = 0
+        self._buffer = bytearray()
+        self._chunks = {}
+        self._last_sequence = None
+
+    def feed(self, data, final=False):
+        """Add bytes from the stream, and return a list of the (sequence, values) decoded."""
+        self._buffer += data
+        decoded = []
+        buffer = self._buffer
+        while True:
+            start = buffer.find(SYNC)
+            if start < 0:
+                # Keep a trailing byte in case it is the start of the next sync
+                keep = 1 if buffer[-1:] == SYNC[:1] else 0
+                self.skipped_bytes += len(buffer) - keep
+                del buffer[:len(buffer) - keep]
+                break
+            if start > 0:
+                self.skipped_bytes += start
+                del buffer[:start]
+            if len(buffer) < FRAME_START_SIZE:
+                break
+
+            _, kind, sequence = struct.unpack_from(FRAME_START, buffer)
+            count = kind & ~HEADER_FLAG
+            size = FRAME_START_SIZE + (4 * count)
+            if count == 0:
+                self._skip()
+                continue
+            if len(buffer) < size + len(SYNC) and not final:
+                break
+            # Make sure the next frame starts where this one ends, in case these sync
+            # bytes were really part of some values
+            if len(buffer) >= size + len(SYNC) and buffer[size:size + len(SYNC)] != SYNC:
+                self._skip()
+                continue
+            if len(buffer) < size:
+                break
+
+            payload = bytes(buffer[FRAME_START_SIZE:size])
+            del buffer[:size]
+            if kind & HEADER_FLAG:
+                self._header(sequence, payload)
+            else:
+                decoded.append((sequence, struct.unpack("<%df" % count, payload)))
+                self._count(sequence)
+        return decoded
+
+    def _skip(self):
+        self.skipped_bytes += 1
+        del self._buffer[:1]
+
+    def _header(self, index, payload):
+        if index == 0:
+            self._chunks = {}
+        self._chunks[index] = payload
+        if b"\n" in payload and all(i in self._chunks for i in range(index + 1)):
+            text = b"".join(self._chunks[i] for i in range(index + 1))
+            self.names = text.split(b"\n")[0].decode().split(",")
+            self._chunks = {}
+
+    def _count(self, sequence):
+        if self._last_sequence is not None:
+            self.lost += (sequence - self._last_sequence - 1) & 0xFFFF
+        self._last_sequence = sequence
+        self.samples += 1
+
+    def format(self, values):
+        names = self.names if self.names and len(self.names) == len(values) else \
+            ["V%d" % i for i in range(len(values))]
+        return ", ".join("%s = %s" % (name, value) for name, value in zip(names, values))
+
+
+def _open_source(args):
+    if args.port:
+        try:
+            import serial
+        except ImportError:
+            sys.exit("Reading from a serial port needs pyserial: pip install pyserial")
+        port = serial.Serial(args.port, args.baud, timeout=0.1)
+        return port.read, port.close
+    if args.input in (None, "-"):
+        return sys.stdin.buffer.read1, lambda: None
+    file = open(args.input, "rb")
+    return file.read1, file.close
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", nargs="?", help="a file to decode, or - for stdin")
+    parser.add_argument("--port", help="a serial port to read from instead, such as /dev/ttyACM0 or COM3")
+    parser.add_argument("--baud", type=int, default=115200, help="the baud rate of the serial port")
+    parser.add_argument("--csv", help="write the samples to this CSV file rather than printing them")
+    args = parser.parse_args()
+
+    read, close = _open_source(args)
+    decoder = Decoder()
+    csv_file = open(args.csv, "w") if args.csv else None
+    header_written = False
+
+    try:
+        while True:
+            data = read(4096)
+            if not data and not args.port:
+                samples = decoder.feed(b"", final=True)
+            else:
+                samples = decoder.feed(data)
+
+            for sequence, values in samples:
+                if csv_file is not None:
+                    if not header_written:
+                        names = decoder.names or ["V%d" % i for i in range(len(values))]
+                        csv_file.write("sequence," + ",".join(names) + "\n")
+                        header_written = True
+                    csv_file.write("%d,%s\n" % (sequence, ",".join(repr(value) for value in values)))
+                else:
+                    print(decoder.format(values), flush=bool(args.port))
+
+            if not data and not args.port:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close()
+        if csv_file is not None:
+            csv_file.close()
+
+    print("Decoded %d samples, %d lost, %d bytes skipped" % (decoder.samples, decoder.lost, decoder.skipped_bytes),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
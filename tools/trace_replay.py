@@ -0,0 +1,424 @@
+# SPDX-License-Identifier: MIT
+
+"""
+Replay and compare the traces of every update recorded by lib/loop_trace.py.
+
+A trace holds the time, encoder counts, setpoints and throttles of every
+update of a control loop. It can be recorded on the board by reading the
+USB serial into a file, or in the simulator:
+
+    python tools/motor_sim.py motor2040/velocity_control.py --serial before.bin
+
+(with TRACE = True in the example). Then, after changing the example, either
+record again and diff the two traces update by update:
+
+    python tools/trace_replay.py diff before.bin after.bin
+
+or feed the counts and setpoints recorded back through the velocity PID,
+with the gains being tried, and diff the throttles it gives against those
+recorded:
+
+    python tools/trace_replay.py replay before.bin --kp 25 --kd 0.5
+
+Replaying is open-loop: the motors do not respond to the new throttles, so it
+shows where and by how much the new gains would have acted differently,
+rather than what the motors would then have done. The velocities are found
+from the change in counts, as quad_velocity_sequence.py does, or with
+--estimate by lib/velocity_estimator.py, as velocity_control.py does.
+Throttles are clamped to +/-1.0, so any that the example held back further
+(such as for current limiting) show up as differences.
+
+Traces are decoded a chunk at a time, so ones of millions of updates can be
+replayed without reading them into memory. Each command exits with status 1
+if any throttle differs by more than --tolerance, for use in scripts.
+"""
+
+import argparse
+import math
+import os
+import struct
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "lib"))
+
+from pid import MultiPID    # noqa: E402
+from velocity_estimator import VelocityEstimator    # noqa: E402
+
+SYNC = b"\xa5\x5b"
+THROTTLE_SCALE = 32767
+RECORD_START = "<2sBHI"
+RECORD_START_SIZE = struct.calcsize(RECORD_START)
+CHUNK_SIZE = 1 << 16
+
+
+class Record:
+    """The time (in microseconds), counts, setpoints and throttles of one update."""
+
+    __slots__ = ("sequence", "time_us", "counts", "setpoints", "throttles")
+
+    def __init__(self, sequence, time_us, counts, setpoints, throttles):
+        self.sequence = sequence
+        self.time_us = time_us
+        self.counts = counts
+        self.setpoints = setpoints
+        self.throttles = throttles
+
+
+class Decoder:
+    """Turns a stream of bytes back into records, resynchronising after any corruption."""
+
+    def __init__(self):
+        self.records = 0
+        self.lost = 0
+        self.skipped_bytes = 0
+        self._buffer = bytearray()
+        self._last_sequence = None
+        self._last_time = None
+        self._time_base = 0
+        self._formats = {}
+
+    def feed(self, data, final=False):
+        """Add bytes from the stream, and return a list of the records decoded."""
+        buffer = self._buffer
+        buffer += data
+        decoded = []
+        offset = 0
+        end = len(buffer)
+        while True:
+            start = buffer.find(SYNC, offset)
+            if start < 0:
+                # Keep a trailing byte in case it is the start of the next sync
+                keep = 1 if buffer[-1:] == SYNC[:1] else 0
+                self.skipped_bytes += end - keep - offset
+                offset = end - keep
+                break
+            self.skipped_bytes += start - offset
+            offset = start
+            if end - offset < RECORD_START_SIZE:
+                break
+
+            _, channels, sequence, time_us = struct.unpack_from(RECORD_START, buffer, offset)
+            size = RECORD_START_SIZE + (10 * channels)
+            if channels == 0:
+                offset += 1
+                self.skipped_bytes += 1
+                continue
+            if end - offset < size + len(SYNC) and not final:
+                break
+            # Make sure the next record starts where this one ends, in case these sync
+            # bytes were really part of some values
+            after = offset + size
+            if end >= after + len(SYNC) and buffer[after:after + len(SYNC)] != SYNC:
+                offset += 1
+                self.skipped_bytes += 1
+                continue
+            if end < after:
+                break
+
+            values = struct.unpack_from(self._format(channels), buffer, offset + RECORD_START_SIZE)
+            offset = after
+            decoded.append(Record(sequence, self._unwrap(time_us), values[:channels],
+                                  values[channels:2 * channels],
+                                  [throttle / THROTTLE_SCALE for throttle in values[2 * channels:]]))
+            self._count(sequence)
+
+        del buffer[:offset]
+        return decoded
+
+    def _format(self, channels):
+        if channels not in self._formats:
+            self._formats[channels] = "<%dl%df%dh" % (channels, channels, channels)
+        return self._formats[channels]
+
+    def _unwrap(self, time_us):
+        # The time is sent as 32 bits, so carry on counting when it wraps
+        if self._last_time is not None and time_us < self._last_time:
+            self._time_base += 1 << 32
+        self._last_time = time_us
+        return self._time_base + time_us
+
+    def _count(self, sequence):
+        if self._last_sequence is not None:
+            self.lost += (sequence - self._last_sequence - 1) & 0xFFFF
+        self._last_sequence = sequence
+        self.records += 1
+
+
+def read_trace(path, decoder):
+    """Yield each record of a trace file (or stdin if path is -) in turn, reading it a chunk at a time."""
+    file = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while True:
+            data = file.read(CHUNK_SIZE)
+            yield from decoder.feed(data, final=not data)
+            if not data:
+                break
+    finally:
+        if file is not sys.stdin.buffer:
+            file.close()
+
+
+def channel_name(index):
+    return chr(ord("A") + index) if index < 26 else "Ch%d" % index
+
+
+class Comparison:
+    """Keeps how far apart two sets of throttles have been, one update at a time."""
+
+    def __init__(self, tolerance):
+        self.tolerance = tolerance
+        self.updates = 0
+        self.max_diffs = []
+        self.max_times = []
+        self.sums = []
+        self.first_over = None
+
+    def add(self, time_us, expected, actual):
+        if len(self.max_diffs) < len(expected):
+            extra = len(expected) - len(self.max_diffs)
+            self.max_diffs += [0.0] * extra
+            self.max_times += [0] * extra
+            self.sums += [0.0] * extra
+
+        for i in range(min(len(expected), len(actual))):
+            diff = abs(actual[i] - expected[i])
+            self.sums[i] += diff * diff
+            if diff > self.max_diffs[i]:
+                self.max_diffs[i] = diff
+                self.max_times[i] = time_us
+            if diff > self.tolerance and self.first_over is None:
+                self.first_over = (time_us, i, expected[i], actual[i])
+        self.updates += 1
+
+    @property
+    def passed(self):
+        return self.first_over is None
+
+    def report(self, expected_name, actual_name):
+        print("Compared %d updates" % self.updates)
+        for i in range(len(self.max_diffs)):
+            rms = math.sqrt(self.sums[i] / self.updates) if self.updates else 0.0
+            print("%s: max throttle diff = %.5f at %.3fs, rms = %.5f" % (
+                channel_name(i), self.max_diffs[i], self.max_times[i] / 1e6, rms))
+        if self.first_over is None:
+            print("All throttles within %g" % self.tolerance)
+        else:
+            time_us, channel, expected, actual = self.first_over
+            print("First over %g at %.3fs on %s: %s = %.5f, %s = %.5f" % (
+                self.tolerance, time_us / 1e6, channel_name(channel), expected_name, expected, actual_name, actual))
+
+
+class VelocityReplay:
+    """Feeds recorded counts and setpoints through the velocity PID path of the motor2040 examples."""
+
+    def __init__(self, channels, kp, ki, kd, speed_scale, counts_per_rev, estimate=False, min_counts=4,
+                 window=0.25):
+        self.speed_scale = speed_scale
+        self.revs_per_count = 1 / counts_per_rev
+        self.pids = MultiPID(channels, kp, ki, kd, 0.01)
+        self.estimators = None
+        if estimate:
+            self.estimators = [VelocityEstimator(self.revs_per_count, min_counts, window) for _ in range(channels)]
+        self.throttles = [0.0] * channels
+        self.velocities = [0.0] * channels
+        self._last = None
+        self._primed = False
+
+    def seed(self, record):
+        """Start again from a record, such as the first or the one after a gap."""
+        self._last = record
+        self._primed = False
+        if self.estimators is not None:
+            for i, estimator in enumerate(self.estimators):
+                estimator.reset(record.counts[i], record.time_us * 1000)
+
+    def update(self, record):
+        """Work out the throttles for a record, returning them, or None while still starting up."""
+        last = self._last
+        self._last = record
+        dt = (record.time_us - last.time_us) / 1e6
+        if dt <= 0:
+            return None
+
+        velocities = self.velocities
+        for i in range(len(velocities)):
+            if self.estimators is not None:
+                velocities[i] = self.estimators[i].update(record.counts[i], record.time_us * 1000)
+            else:
+                velocities[i] = (record.counts[i] - last.counts[i]) * self.revs_per_count / dt
+            self.pids.setpoints[i] = record.setpoints[i]
+
+        # The first update only gives the PID its starting velocities, with the throttles as recorded
+        if not self._primed:
+            self.pids.reset()
+            self.pids.calculate(velocities, dt)
+            self.throttles[:] = record.throttles
+            self._primed = True
+            return None
+
+        accels = self.pids.calculate(velocities, dt)
+        accel_scale = dt / self.speed_scale
+        for i in range(len(velocities)):
+            self.throttles[i] = max(min(self.throttles[i] + (accels[i] * accel_scale), 1.0), -1.0)
+        return self.throttles
+
+
+class CsvWriter:
+    """Writes each pair of throttles compared to a CSV file, a row at a time."""
+
+    def __init__(self, path, expected_name, actual_name):
+        self.file = open(path, "w") if path else None
+        self.expected_name = expected_name
+        self.actual_name = actual_name
+        self._header_written = False
+
+    def write(self, time_us, expected, actual):
+        if self.file is None:
+            return
+        if not self._header_written:
+            names = []
+            for i in range(len(expected)):
+                names += ["%s %s" % (channel_name(i), self.expected_name), "%s %s" % (channel_name(i), self.actual_name)]
+            self.file.write("time," + ",".join(names) + "\n")
+            self._header_written = True
+        values = []
+        for i in range(len(expected)):
+            values += [repr(expected[i]), repr(actual[i])]
+        self.file.write("%.6f,%s\n" % (time_us / 1e6, ",".join(values)))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def report_decoder(name, decoder):
+    print("%s: %d records, %d lost, %d bytes skipped" % (name, decoder.records, decoder.lost, decoder.skipped_bytes),
+          file=sys.stderr)
+
+
+def decode(args):
+    decoder = Decoder()
+    csv_file = open(args.csv, "w") if args.csv else None
+    try:
+        for record in read_trace(args.trace, decoder):
+            if csv_file is not None:
+                if decoder.records == 1:
+                    names = []
+                    for kind in ("count", "setpoint", "throttle"):
+                        names += ["%s %s" % (channel_name(i), kind) for i in range(len(record.counts))]
+                    csv_file.write("sequence,time," + ",".join(names) + "\n")
+                values = list(record.counts) + list(record.setpoints) + record.throttles
+                csv_file.write("%d,%.6f,%s\n" % (record.sequence, record.time_us / 1e6,
+                                                 ",".join(repr(value) for value in values)))
+            else:
+                print("Time = %.6f, Counts = %s, Setpoints = %s, Throttles = %s" % (
+                    record.time_us / 1e6, list(record.counts), [round(value, 5) for value in record.setpoints],
+                    [round(value, 5) for value in record.throttles]))
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+    report_decoder(args.trace, decoder)
+    return True
+
+
+def diff(args):
+    decoders = (Decoder(), Decoder())
+    comparison = Comparison(args.tolerance)
+    csv = CsvWriter(args.csv, "before", "after")
+    count_diffs = []
+    try:
+        for before, after in zip(read_trace(args.before, decoders[0]), read_trace(args.after, decoders[1])):
+            comparison.add(before.time_us, before.throttles, after.throttles)
+            csv.write(before.time_us, before.throttles, after.throttles)
+            if len(count_diffs) < len(before.counts):
+                count_diffs += [0] * (len(before.counts) - len(count_diffs))
+            for i in range(min(len(before.counts), len(after.counts))):
+                count_diffs[i] = max(count_diffs[i], abs(after.counts[i] - before.counts[i]))
+    finally:
+        csv.close()
+
+    report_decoder(args.before, decoders[0])
+    report_decoder(args.after, decoders[1])
+    comparison.report("before", "after")
+    for i in range(len(count_diffs)):
+        print("%s: max count diff = %d" % (channel_name(i), count_diffs[i]))
+    return comparison.passed
+
+
+def replay(args):
+    decoder = Decoder()
+    comparison = Comparison(args.tolerance)
+    csv = CsvWriter(args.csv, "recorded", "replayed")
+    replayer = None
+    last_sequence = None
+    seeds = 0
+    try:
+        for record in read_trace(args.trace, decoder):
+            if replayer is None:
+                replayer = VelocityReplay(len(record.counts), args.kp, args.ki, args.kd, args.speed_scale,
+                                          args.counts_per_rev, args.estimate, args.min_counts, args.window)
+
+            # Start again after any records were lost, as the counts in between are unknown
+            if last_sequence is None or (record.sequence - last_sequence) & 0xFFFF != 1:
+                replayer.seed(record)
+                seeds += 1
+                throttles = None
+            else:
+                throttles = replayer.update(record)
+            last_sequence = record.sequence
+
+            if throttles is not None:
+                comparison.add(record.time_us, record.throttles, throttles)
+                csv.write(record.time_us, record.throttles, throttles)
+    finally:
+        csv.close()
+
+    report_decoder(args.trace, decoder)
+    if seeds > 1:
+        print("Started again %d times after lost records" % (seeds - 1))
+    comparison.report("recorded", "replayed")
+    return comparison.passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_decode = commands.add_parser("decode", help="print the records of a trace")
+    parser_decode.add_argument("trace", help="the trace to decode, or - for stdin")
+    parser_decode.add_argument("--csv", help="write the records to this CSV file rather than printing them")
+    parser_decode.set_defaults(handler=decode)
+
+    parser_diff = commands.add_parser("diff", help="compare two traces update by update")
+    parser_diff.add_argument("before", help="the trace to compare against")
+    parser_diff.add_argument("after", help="the trace to compare")
+    parser_diff.set_defaults(handler=diff)
+
+    parser_replay = commands.add_parser("replay", help="feed a trace back through the velocity PID and compare")
+    parser_replay.add_argument("trace", help="the trace to replay, or - for stdin")
+    parser_replay.add_argument("--kp", type=float, default=30.0, help="velocity proportional (P) gain")
+    parser_replay.add_argument("--ki", type=float, default=0.0, help="velocity integral (I) gain")
+    parser_replay.add_argument("--kd", type=float, default=0.4, help="velocity derivative (D) gain")
+    parser_replay.add_argument("--speed-scale", type=float, default=5.4,
+                               help="the speed of each motor at full throttle, in revolutions per second")
+    parser_replay.add_argument("--counts-per-rev", type=float, default=600,
+                               help="the encoder counts per revolution of each output shaft")
+    parser_replay.add_argument("--estimate", action="store_true",
+                               help="estimate the velocities with lib/velocity_estimator.py")
+    parser_replay.add_argument("--min-counts", type=int, default=4, help="the estimator's fewest counts")
+    parser_replay.add_argument("--window", type=float, default=0.25, help="the estimator's window, in seconds")
+    parser_replay.set_defaults(handler=replay)
+
+    for command in (parser_diff, parser_replay):
+        command.add_argument("--tolerance", type=float, default=0.01,
+                             help="the largest throttle difference to count as the same")
+        command.add_argument("--csv", help="write the throttles compared to this CSV file")
+
+    args = parser.parse_args()
+    if not args.handler(args):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# SPDX-License-Identifier: MIT
+
+"""
+Compare how closely the position examples follow their moves.
+
+motor2040/position_control.py and motor2040/position_on_velocity_control.py
+are each run against motor_sim.py's simulated motor, from the same random seed
+so they are given the same moves. The error between the position PID's
+setpoint and the motor's angle is recorded every time the PID is calculated,
+which is 100 times a second in both, and its RMS and worst are printed:
+
+    python tools/tracking_benchmark.py --duration 30
+
+The simulated motor is only a model, so use this to compare the two, rather
+than to predict the error of a real motor.
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+
+import motor_sim
+
+SCRIPTS = [
+    "motor2040/position_control.py",
+    "motor2040/position_on_velocity_control.py",
+]
+
+
+def run(script, duration, model=None, seed=0):
+    """Run one example, returning the position PID's error in degrees each time it was calculated."""
+    sim = motor_sim.Simulation(duration, model)
+    errors = []
+
+    def prepare():
+        import pid
+        calculate = pid.PID.calculate
+
+        def recording(self, value, dt=None):
+            if self is sys._getframe(1).f_globals.get("pos_pid"):
+                errors.append(self.setpoint - value)
+            return calculate(self, value, dt)
+
+        pid.PID.calculate = recording
+
+    random.seed(seed)
+    motor_sim.run(os.path.join(motor_sim.REPO_DIR, script), sim, quiet=True, prepare=prepare)
+    return errors
+
+
+def _rms(values):
+    return math.sqrt(sum(value * value for value in values) / len(values)) if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scripts", nargs="*", default=SCRIPTS, help="the examples to compare (default: both)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of simulated time to run each for")
+    parser.add_argument("--seed", type=int, default=0, help="the random seed the moves are picked from")
+    motor_sim.add_model_arguments(parser)
+    args = parser.parse_args()
+
+    model = motor_sim.model_from_args(args)
+    results = {}
+    for script in args.scripts:
+        errors = run(script, args.duration, model, args.seed)
+        if not errors:
+            sys.exit("%s made no position PID calculations" % script)
+        results[script] = (_rms(errors), max(abs(error) for error in errors))
+        print("%-45s %7.3f degrees RMS, %7.3f worst (%d updates)" % (script, results[script][0],
+                                                                      results[script][1], len(errors)))
+
+    if len(results) == 2:
+        (first_rms, first_worst), (second_rms, second_worst) = results.values()
+        if second_rms > 0 and second_worst > 0:
+            print("The second follows %.1f times more closely by RMS, %.1f times by worst" % (
+                first_rms / second_rms, first_worst / second_worst))
+
+
+if __name__ == "__main__":
+    main()